@@ -0,0 +1,108 @@
+'''
+Benchmark the book sides on random deltas at a realistic depth and ratio of deletes.
+
+    python -m benchmarks.bench_bookcore --depth 400 --deletes 0.6 --deltas 200000
+    python -m benchmarks.bench_bookcore --batch 100    # apply the deltas of a step at once with `set_many`
+'''
+import argparse
+import bisect
+import random
+import time
+from typing import List, Tuple
+
+from src.bookcore import ArrayAsks, ArrayBids, Asks, Bids, BookLevel, DepthLimitedSide
+
+
+class LinearAsks(Asks):
+    '''
+    The previous `Asks.set`: linear membership test and `list.remove` for the deletes, full list copy on truncation.
+    '''
+    def set(self, price: float, amount: float, count: int) -> None:
+        new_level = BookLevel(price, amount, count)
+        if amount == 0: # remove the level
+            if new_level in self._asks:
+                self._asks.remove(new_level)
+        else:
+            idx = bisect.bisect_left(self._asks, new_level)
+            if 0 <= idx < len(self._asks):
+                if self._asks[idx] == new_level:  # update
+                    self._asks[idx] = new_level
+                else:                             # insert new book_level
+                    self._asks.insert(idx, new_level)
+                    self._asks[:] = self._asks[:self.max_depth]
+            elif len(self._asks) < self.max_depth: # append new book_level
+                    self._asks.append(new_level)
+
+    def set_many(self, prices, amounts, counts) -> None:
+        for price, amount, count in zip(prices, amounts, counts):
+            self.set(price, amount, count)
+
+
+def make_deltas(depth: int, deletes: float, num: int, tick: float = 0.1, seed: int = 0) -> List[Tuple[float, float, int]]:
+    '''
+    Deltas around a book of `depth` levels, a `deletes` fraction of which remove a level.
+    '''
+    rng = random.Random(seed)
+    deltas = []
+    for _ in range(num):
+        price = round(1000 + tick * int(rng.triangular(0, depth * 1.2, 0)), 1)
+        if rng.random() < deletes:
+            deltas.append((price, 0.0, 0))
+        else:
+            deltas.append((price, float(rng.randint(1, 100)), rng.randint(1, 10)))
+    return deltas
+
+
+def bench(side, deltas: List[Tuple[float, float, int]], depth: int) -> float:
+    for i in range(depth):
+        side.set(round(1000 + 0.1 * i, 1), 1.0, 1)
+    start = time.perf_counter()
+    for price, amount, count in deltas:
+        side.set(price, amount, count)
+    return time.perf_counter() - start
+
+
+def bench_batches(side, deltas: List[Tuple[float, float, int]], depth: int, batch: int) -> float:
+    for i in range(depth):
+        side.set(round(1000 + 0.1 * i, 1), 1.0, 1)
+    batches = [tuple(zip(*deltas[i:i+batch])) for i in range(0, len(deltas), batch)]
+    start = time.perf_counter()
+    for prices, amounts, counts in batches:
+        side.set_many(prices, amounts, counts)
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--depth', type=int, default=400)
+    parser.add_argument('--deletes', type=float, default=0.6, help='the fraction of the deltas removing a level')
+    parser.add_argument('--deltas', type=int, default=200_000)
+    parser.add_argument('--batch', type=int, default=0, help='apply the deltas in batches of this size with `set_many`')
+    args = parser.parse_args()
+
+    deltas = make_deltas(args.depth, args.deletes, args.deltas)
+    results = {}
+    sides = (
+        ('linear scan Asks', LinearAsks(args.depth)),
+        ('Asks', Asks(args.depth)),
+        ('Bids', Bids(args.depth)),
+        ('Asks (ticks)', Asks(args.depth, tick_size=0.1)),
+        ('ArrayAsks', ArrayAsks(args.depth)),
+        ('ArrayBids', ArrayBids(args.depth)),
+        ('ArrayAsks (ticks)', ArrayAsks(args.depth, tick_size=0.1)),
+        ('Asks (top 20)', DepthLimitedSide(Asks, 20)),
+        ('ArrayAsks (top 20)', DepthLimitedSide(ArrayAsks, 20)),
+    )
+    for name, side in sides:
+        if args.batch:
+            results[name] = bench_batches(side, deltas, args.depth, args.batch)
+        else:
+            results[name] = bench(side, deltas, args.depth)
+    baseline = results['linear scan Asks']
+    print(f'depth={args.depth} deletes={args.deletes} deltas={args.deltas} batch={args.batch}')
+    for name, elapsed in results.items():
+        print(f'{name:>18}: {elapsed:7.3f}s  {args.deltas / elapsed / 1e3:8.1f}k deltas/s  x{baseline / elapsed:.1f}')
+
+
+if __name__ == '__main__':
+    main()
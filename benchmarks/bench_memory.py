@@ -0,0 +1,71 @@
+'''
+Measure the memory per object of the high-volume value types, slotted against dict-backed.
+
+    python -m benchmarks.bench_memory --num 100000
+'''
+import argparse
+import gc
+import tracemalloc
+from typing import Callable
+
+from src.bookcore import BookLevel
+from src.contract import Contract, ContRole
+from src.instrument import Instrument, InstType, Pair
+from src.order import Order, TransDetail, orderSide, orderType
+from src.simTime import SimTime
+
+
+TARGET = 0.5    # the reduction of the memory per object aimed at
+
+def with_dict(cls: type) -> type:
+    '''
+    A subclass of `cls` without `__slots__`, i.e. with a `__dict__` per object as before.
+    '''
+    return type(f'Dict{cls.__name__}', (cls,), {})
+
+
+def measure(factory: Callable[[], object], num: int) -> float:
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    objects = [factory() for _ in range(num)]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    size = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    del objects
+    return (size - 8 * num) / num  # without the list of the objects
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--num', type=int, default=100_000)
+    args = parser.parse_args()
+
+    inst = Instrument(Pair('BTC', 'USDT'), 'BTC-USDT-SWAP', InstType.FUTURES, contract_size=0.01, tick_size=0.1)
+    simTime = SimTime(0, 1000)
+    types = (
+        ('BookLevel', BookLevel, lambda cls: cls(100.0, 1.0, 1)),
+        ('TransDetail', TransDetail, lambda cls: cls(0, 100.0, 1.0, 0.01)),
+        ('Contract', Contract, lambda cls: cls(inst, ContRole.BUYER)),
+        ('Order', Order, lambda cls: cls(inst, orderType.MARKET, orderSide.BUYLONG, simTime, 1.0)),
+        ('Instrument', Instrument, lambda cls: cls(Pair('BTC', 'USDT'), 'BTC-USDT-SWAP', InstType.FUTURES, contract_size=0.01)),
+    )
+    print(f'bytes per object, {args.num} objects, target {TARGET:.0%} less')
+    missed = []
+    for name, cls, make in types:
+        dict_cls = with_dict(cls)
+        slotted = measure(lambda: make(cls), args.num)
+        dict_backed = measure(lambda: make(dict_cls), args.num)
+        saved = 1 - slotted / dict_backed
+        if saved < TARGET:
+            missed.append(name)
+        print(f'{name:>12}: {slotted:7.1f} slotted  {dict_backed:7.1f} with __dict__  {saved:5.1%} less')
+    if missed:
+        # NOTICE: Since CPython 3.11 the attributes of an object without slots are stored inline as well,
+        #         so the slots only save the ~40 bytes of the dict header per object.
+        print(f'target not reached for {", ".join(missed)}: the slots save a fixed size per object on CPython 3.11+, '
+              'and an Order still holds its uuid4, which is its public id')
+
+
+if __name__ == '__main__':
+    main()
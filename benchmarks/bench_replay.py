@@ -0,0 +1,85 @@
+'''
+Benchmark a full book replay on a synthetic chunk, stepping the simulation time like a backtest.
+
+    python -m benchmarks.bench_replay --timestamps 20000 --depth 400
+    python -m benchmarks.bench_replay --profile 15    # print the functions taking the most time
+
+With the columnar chunks, the replay itself (searchsorted, slicing the columns) is a small part of the time;
+the rest is spent applying the deltas to the level store, one Python call per row:
+building a `BookLevel` per delta and the sorted-list bookkeeping of `Asks.set`/`Bids.set`.
+Replaying faster needs fewer Python objects per delta, e.g. the array-backed sides (`array_sides=True`).
+'''
+import argparse
+import cProfile
+from pathlib import Path
+import pstats
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.books import Book
+from src.simTime import SimTime
+
+
+def make_chunk(path: Path, timestamps: int, depth: int, per_ts: int, deletes: float, step: int = 100, seed: int = 1) -> int:
+    '''
+    Write a chunk of `timestamps` timestamps `step` ms apart, starting with a snapshot of `depth` levels per side,
+    then `per_ts` deltas per timestamp around a drifting mid price; return the last timestamp.
+    '''
+    rng = np.random.default_rng(seed)
+    tick, mid = 0.1, 30000.0
+    rows = []
+    for side, sign in (('ask', 1), ('bid', -1)):
+        for i in range(depth):
+            rows.append((round(mid + sign * tick * (i + 1), 1), float(rng.integers(1, 50)), 1, side, 'snapshot', 0))
+    for k in range(1, timestamps):
+        mid += rng.normal(0, 0.3)
+        for _ in range(per_ts):
+            side = 'ask' if rng.random() < 0.5 else 'bid'
+            offset = (int(abs(rng.normal(0, 60))) + 1) * (1 if side == 'ask' else -1)
+            size = 0.0 if rng.random() < deletes else float(rng.integers(1, 50))
+            rows.append((round(round(mid / tick) * tick + offset * tick, 1), size, int(rng.integers(1, 5)), side, 'update', k * step))
+    df = pd.DataFrame(rows, columns=['price', 'size', 'numOrders', 'side', 'action', 'timestamp'])
+    df['instId'] = 'BTC-USDT-SWAP'
+    end = int(df['timestamp'].max())
+    df.to_parquet(path/f'part-0-0-{end}.parquet', index=False)
+    return end
+
+
+def replay(path: Path, end: int, eval_step: int, array_sides: bool) -> float:
+    simTime = SimTime(0, end)
+    start = time.perf_counter()
+    book = Book('BTC-USDT-SWAP', simTime, path, max_interval=10000, array_sides=array_sides)
+    for ts in range(eval_step, end, eval_step):
+        simTime.set(ts)
+        book.update()
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--timestamps', type=int, default=20_000)
+    parser.add_argument('--depth', type=int, default=400)
+    parser.add_argument('--per-ts', type=int, default=10, help='the number of deltas per timestamp')
+    parser.add_argument('--deletes', type=float, default=0.55, help='the fraction of the deltas removing a level')
+    parser.add_argument('--eval-step', type=int, default=1000)
+    parser.add_argument('--profile', type=int, default=0, help='print this many functions by their own time')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp)
+        end = make_chunk(path, args.timestamps, args.depth, args.per_ts, args.deletes)
+        print(f'timestamps={args.timestamps} depth={args.depth} per_ts={args.per_ts} deletes={args.deletes} eval_step={args.eval_step}')
+        for name, array_sides in (('Asks/Bids', False), ('ArrayAsks/ArrayBids', True)):
+            print(f'{name:>20}: {replay(path, end, args.eval_step, array_sides):7.3f}s')
+
+        if args.profile:
+            profiler = cProfile.Profile()
+            profiler.runcall(replay, path, end, args.eval_step, False)
+            pstats.Stats(profiler).sort_stats('tottime').print_stats(args.profile)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,30 +1,31 @@
 
-import glob
-import os
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Dict, Optional
 
-import pandas as pd
+import numpy as np
 
+from src.catalog import Catalog
+from src.chunkcache import ChunkCache, read_chunk
+from src.chunkindex import ChunkIndex
+from src.dataconfig import DataConfig
+from src.gaps import GapPolicy, handle_gap, validate_gap_policy
 from src.instrument import Instrument
 from src.simTime import SimTime
 
 
 class IdxPrice:
-    def __init__(self, inst: Instrument, simTime: SimTime, path: Path, max_interval: int = 2000) -> None:
+    def __init__(self, inst: Instrument, simTime: SimTime, path: Path, max_interval: int = 2000, cache: Optional[ChunkCache] = None, index: Optional[ChunkIndex] = None, gap_policy: GapPolicy = 'raise') -> None:
+        validate_gap_policy(gap_policy)
         self.inst = inst
         self.simTime = simTime
         self.path = path
         self.max_interval = max_interval
+        self.cache = cache
+        self.gap_policy = gap_policy
+        self._stale = False
         
         # initialize the index
-        self.index_files: List[str] = glob.glob(os.path.join(self.path, 'part-*-*-*.parquet'))
-        if len(self.index_files) == 0:
-            raise Exception('No index files found.')
-        self.index_timePeriods: List[Tuple[int, int]] = []
-        for file in self.index_files:
-            start, end = os.path.splitext(os.path.basename(file))[0].split('-')[2:]
-            self.index_timePeriods.append((int(start), int(end)))
+        self.index = index if index is not None else ChunkIndex(self.path, self.max_interval)
         
         self.current_index = -1
         
@@ -40,16 +41,12 @@ class IdxPrice:
 
 
     def _update_index(self) -> bool:
-        for i, (start, end) in enumerate(self.index_timePeriods):
-            if start <= self.simTime <= end:
-                if self.current_index != i:
-                    self.current_index = i
-                    return True
+        index = self.index.seek(int(self.simTime), self.current_index)
+        if index == self.current_index:
+            return False
         
-        if self.current_index == -1:
-            raise Exception(f'Can not find a chunk files for the simTime {int(self.simTime)}')
-        
-        return False
+        self.current_index = index
+        return True
 
 
     def update(self):
@@ -57,32 +54,44 @@ class IdxPrice:
             return
         
         if self._update_index():
-            self.chunked_data = pd.read_parquet(self.index_files[self.current_index])
+            self.chunked_data = read_chunk(self.index.files[self.current_index], self.cache, int(self.simTime), self.simTime.end).to_pandas()
+            self._timestamp = self.chunked_data['timestamp'].to_numpy(dtype='int64')
+            self._prices = self.chunked_data['idxPx'].to_numpy(dtype='float64', na_value=np.nan)
 
         if self.simTime < self.current_ts:
             raise Exception('Current chunked data is ahead of the simulation time.')
         
         # Find the row with a timestamp that is not greater than and closest to simTime
-        index = self.chunked_data['timestamp'].searchsorted(int(self.simTime), side='right')
-        if index == 0 or index > len(self.chunked_data):
+        index = int(self._timestamp.searchsorted(int(self.simTime), side='right'))
+        if index == 0 or index > len(self._timestamp):
             raise Exception(f'Current chunked data has no data point with a timestamp smaller than current simTime {int(self.simTime)}')
-        closest_row = self.chunked_data.iloc[index - 1]
+        closest_ts = int(self._timestamp[index - 1])
         
-        if self.simTime - closest_row['timestamp'] > self.max_interval:
-            raise Exception(f'The time interval between two consecutive rows {(closest_row["timestamp"], int(self.simTime))} exceeds the maximum interval.')
+        self._stale = False
+        if self.simTime - closest_ts > self.max_interval:
+            self._stale = handle_gap(self.gap_policy, f'The time interval between two consecutive rows {(closest_ts, int(self.simTime))} exceeds the maximum interval.')
+            if self.gap_policy == 'skip': # no price inside the gap
+                self._idxPx = float('nan')
+                self.current_ts = int(self.simTime)
+                return
         
-        self.__set(closest_row)
+        self.__set(closest_ts, self._prices[index - 1])
         self.current_ts = int(self.simTime)
 
 
-    def __set(self, row: pd.Series) -> None:
-        if pd.notnull(row['idxPx']):
-            self._idxPx = float(row['idxPx'])
+    def __set(self, ts: int, price: float) -> None:
+        if not np.isnan(price):
+            self._idxPx = float(price)
         else:
-            ts = row['timestamp']
             raise Exception(f'the idxPx is null at ts {ts}')
 
 
+    @property
+    def stale(self) -> bool:
+        self.update()
+        return self._stale
+
+
     @property
     def now(self) -> float:
         self.update()
@@ -165,12 +174,14 @@ class IdxPrice:
 
 
 class IdxPrices:
-    def __init__(self, path: Path, simTime: SimTime, max_interval: int = 10000) -> None:
+    def __init__(self, path: Path, simTime: SimTime, max_interval: int = 10000, config: Optional[DataConfig] = None, catalog: Optional[Catalog] = None) -> None:
         self._path = path
         self._simTime = simTime
         self._max_interval = max_interval
+        self._config = config if config is not None else DataConfig()
+        self._catalog = catalog
         
-        self._idxPxs: Dict[str, IdxPrice]
+        self._idxPxs: Dict[str, IdxPrice] = {}
     
     
     def __getitem__(self, inst: Instrument) -> IdxPrice:
@@ -182,6 +193,9 @@ class IdxPrices:
                 self._simTime,
                 idxPrice_path,
                 self._max_interval,
+                self._config.cache,
+                self._catalog.index(self._path.name, instId, self._max_interval) if self._catalog is not None else None,
+                self._config.gap_policy,
             )
         
         return self._idxPxs[instId]
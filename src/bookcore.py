@@ -1,16 +1,62 @@
 import bisect
 from copy import copy, deepcopy
-from typing import List, Union
+from decimal import Decimal
+import heapq
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+# the codes of the `side` column in the compact layout of the chunked data
+SIDE_ASK = 0
+SIDE_BID = 1
+SIDES = ('ask', 'bid')
+
+NAN = float('nan')
+
+
+def tick_decimals(tick_size: float) -> int:
+    '''
+    The number of decimals of the prices on a grid of `tick_size`.
+    '''
+    exponent = Decimal(str(tick_size)).normalize().as_tuple().exponent
+    return max(0, -int(exponent))
+
+
+def tick_units(tick_size: float) -> Tuple[int, int]:
+    '''
+    Return `(scale, units)` such that `tick_size == units / scale` exactly, with `scale` a power of 10.
+    '''
+    scale = 10 ** tick_decimals(tick_size)
+    return scale, round(tick_size * scale)
+
+
+def to_ticks(price: float, tick_size: float, scale: int, units: int) -> Tuple[int, float]:
+    '''
+    Return the number of ticks of `price` and the price rounded to the tick grid.
+    '''
+    # NOTICE: The division of two exact integers is correctly rounded, so it gives `round(ticks * tick_size, decimals)`
+    #         without the decimal rounding of `round`, which costs more than the rest of a delta.
+    ticks = round(price / tick_size)
+    return ticks, ticks * units / scale
 
 class BookLevel:
+    '''
+    A price level of the book; it is immutable, so that the levels can be shared by the snapshots of a book side.
+    '''
+    __slots__ = ('price', 'amount', 'count')
+    
     def __init__(self, price: float, amount: float, count: int):
         self._validate_price(price)
         self._validate_amount(amount)
         self._validate_count(count)
         
-        self.price = float(price)
-        self.amount = float(amount)
-        self.count = int(count)
+        object.__setattr__(self, 'price', float(price))
+        object.__setattr__(self, 'amount', float(amount))
+        object.__setattr__(self, 'count', int(count))
+    
+    
+    def __setattr__(self, name, value) -> None:
+        raise AttributeError(f"BookLevel is immutable, can not set {name}.")
     
     
     def _validate_price(self, price):
@@ -65,7 +111,10 @@ class BookLevel:
             raise TypeError("Unsupported type for comparison.")
     
     def __deepcopy__(self, memo):
-        return BookLevel(self.price, self.amount, self.count)
+        return self # immutable
+
+    def __reduce__(self):
+        return (BookLevel, (self.price, self.amount, self.count))
 
     def __str__(self) -> str:
         return f'(p: {self.price}, a: {self.amount}, c: {self.count})'
@@ -77,27 +126,148 @@ class BookLevel:
         return self.price == other.price and self.amount == other.amount and self.count == other.count
 
 
-class Asks:
-    def __init__(self, max_depth: int = 400) -> None:
+class CumulativeDepth:
+    '''
+    The cumulative amount and notional of a book side from its best level,
+    computed lazily and invalidated by every `set`, to resolve a market order in one `searchsorted`.
+    '''
+    _cum: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]] = None
+    sign = 1    # the levels are sorted by `sign * price` ascending
+    
+    def _level_arrays(self) -> Tuple[np.ndarray, np.ndarray]:
+        raise NotImplementedError()
+    
+    
+    def _depth_arrays(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        if self._cum is None:
+            prices, amounts = self._level_arrays()
+            self._cum = (prices, amounts, np.cumsum(amounts), np.cumsum(prices * amounts))
+        return self._cum
+    
+    
+    def fills(self, amount: float) -> Tuple[np.ndarray, np.ndarray]:
+        '''
+        Return the prices and amounts filled level by level by a market order of `amount`, from the best level.
+        The amounts are `min(left amount, level amount)` as when walking the levels one by one.
+        '''
+        prices, amounts, cum_amounts, _ = self._depth_arrays()
+        if amount <= 0:
+            return prices[:0].copy(), amounts[:0].copy()
+        n = min(int(cum_amounts.searchsorted(amount)) + 1, len(amounts))
+        filled = np.empty(n, dtype=np.float64)
+        filled[0:1] = 0.0
+        filled[1:] = cum_amounts[:n-1]
+        exec_amounts = np.minimum(amount - filled, amounts[:n])
+        done = np.flatnonzero(exec_amounts < amounts[:n])   # the order is filled at the first partially consumed level
+        if len(done):
+            n = int(done[0]) + 1
+        return prices[:n].copy(), exec_amounts[:n]
+    
+    
+    def cost_to_trade(self, amount: float) -> Tuple[float, float]:
+        '''
+        Return the amount which can be filled by a market order of `amount` and its notional (`price * amount`) without fees.
+        The VWAP is `notional / filled`.
+        '''
+        prices, _, cum_amounts, cum_notional = self._depth_arrays()
+        k = int(cum_amounts.searchsorted(amount))
+        if k >= len(cum_amounts): # not enough liquidity
+            return (float(cum_amounts[-1]), float(cum_notional[-1])) if k else (0.0, 0.0)
+        prev_amount = float(cum_amounts[k-1]) if k else 0.0
+        prev_notional = float(cum_notional[k-1]) if k else 0.0
+        return amount, prev_notional + (amount - prev_amount) * float(prices[k])
+    
+    
+    def depth_at(self, price: float) -> float:
+        '''
+        Return the amount of the levels at `price` or better, i.e. which a limit order at `price` can take.
+        '''
+        prices, _, cum_amounts, _ = self._depth_arrays()
+        n = int(np.searchsorted(self.sign * prices, self.sign * price, side='right'))
+        return float(cum_amounts[n-1]) if n else 0.0
+
+
+class Asks(CumulativeDepth):
+    merge_ratio = 1 # merge a batch of at least `len(self) / merge_ratio` deltas at once
+    
+    def __init__(self, max_depth: int = 400, tick_size: Optional[float] = None) -> None:
         self._asks: List[BookLevel] = []
+        # the prices of `_asks`, or their int tick counts with `tick_size`, to bisect without calling `BookLevel` comparisons
+        self._keys: List[Union[float, int]] = []
         self.max_depth = max_depth
+        self.tick_size = tick_size
+        self._scale, self._units = tick_units(tick_size) if tick_size is not None else (1, 1)
+        self._shared = False    # the lists are shared with a snapshot, copy them before writing
+        self._readonly = False
+        self.top_version = 0    # incremented whenever the best level may change
     
     
     def set(self, price: float, amount: float, count: int) -> None:
-        new_level = BookLevel(price, amount, count)
+        if self._shared:
+            self._own()
+        self._cum = None
+        if self.tick_size is not None:
+            key, price = to_ticks(price, self.tick_size, self._scale, self._units)
+            new_level = BookLevel(price, amount, count)
+        else:
+            new_level = BookLevel(price, amount, count)
+            key = new_level.price
+        idx = bisect.bisect_left(self._keys, key)
+        found = idx < len(self._keys) and self._keys[idx] == key
+        if idx == 0:
+            self.top_version += 1
         if amount == 0: # remove the level
-            if new_level in self._asks:
-                self._asks.remove(new_level)
-        else:
-            idx = bisect.bisect_left(self._asks, new_level)
-            if 0 <= idx < len(self._asks):
-                if self._asks[idx] == new_level:  # update
-                    self._asks[idx] = new_level
-                else:                             # insert new book_level
-                    self._asks.insert(idx, new_level)
-                    self._asks[:] = self._asks[:self.max_depth]
+            if found:
+                del self._asks[idx]
+                del self._keys[idx]
+        else:
+            if found:                              # update
+                self._asks[idx] = new_level
+            elif idx < len(self._asks):            # insert new book_level
+                self._asks.insert(idx, new_level)
+                self._keys.insert(idx, key)
+                if len(self._asks) > self.max_depth:
+                    del self._asks[self.max_depth:]
+                    del self._keys[self.max_depth:]
             elif len(self._asks) < self.max_depth: # append new book_level
                     self._asks.append(new_level)
+                    self._keys.append(key)
+
+    def set_many(self, prices: Sequence[float], amounts: Sequence[float], counts: Sequence[int]) -> None:
+        '''
+        Apply a batch of deltas in order. A large batch is merged into the levels at once,
+        unless a level could be truncated by `max_depth` in between, where the deltas are applied one by one.
+        '''
+        if len(prices) * self.merge_ratio < len(self._asks) or not self._merge(prices, amounts, counts):
+            for price, amount, count in zip(prices, amounts, counts):
+                self.set(price, amount, count)
+
+    def _merge(self, prices: Sequence[float], amounts: Sequence[float], counts: Sequence[int]) -> bool:
+        levels = dict(zip(self._keys, self._asks))
+        seen = len(levels)  # an upper bound of the depth while applying the batch one by one
+        for price, amount, count in zip(prices, amounts, counts):
+            if self.tick_size is not None:
+                key, price = to_ticks(price, self.tick_size, self._scale, self._units)
+                new_level = BookLevel(price, amount, count)
+            else:
+                new_level = BookLevel(price, amount, count)
+                key = new_level.price
+            if amount == 0:
+                levels.pop(key, None)
+            else:
+                if key not in levels:
+                    seen += 1
+                levels[key] = new_level
+        if seen > self.max_depth: # a level may have been truncated in between
+            return False
+
+        if self._shared:
+            self._own()
+        self._cum = None
+        self.top_version += 1
+        self._keys = sorted(levels)
+        self._asks = [levels[key] for key in self._keys]
+        return True
 
     def __getitem__(self, key) -> Union[BookLevel, List[BookLevel]]:
         if isinstance(key, slice):
@@ -126,10 +296,42 @@ class Asks:
     def __iter__(self):
         return iter(self._asks)
 
-    def __deepcopy__(self, memo):
-        new_asks = Asks(self.max_depth)
-        new_asks._asks = deepcopy(self._asks)
+    def top(self) -> Tuple[float, float]:
+        '''
+        Return the price and amount of the best level, or NaNs if the side is empty.
+        '''
+        if self._asks:
+            return self._asks[0].price, self._asks[0].amount
+        return NAN, NAN
+
+    def _level_arrays(self) -> Tuple[np.ndarray, np.ndarray]:
+        return np.array([level.price for level in self._asks], dtype=np.float64), np.array([level.amount for level in self._asks], dtype=np.float64)
+
+    def _own(self) -> None:
+        if self._readonly:
+            raise Exception("Can not modify a read-only snapshot of the book; use copy() to get a mutable copy.")
+        self._asks = self._asks.copy()
+        self._keys = self._keys.copy()
+        self._shared = False
+
+    def snapshot(self) -> 'Asks':
+        '''
+        Return a read-only snapshot sharing the levels; the side copies them on its next write.
+        '''
+        new_asks = copy(self)
+        new_asks._readonly = True
+        new_asks._shared = self._shared = True
+        return new_asks
+
+    def copy(self) -> 'Asks':
+        new_asks = Asks(self.max_depth, self.tick_size)
+        new_asks._asks = self._asks.copy() # the levels are immutable
+        new_asks._keys = self._keys.copy()
+        new_asks.top_version = self.top_version
         return new_asks
+
+    def __deepcopy__(self, memo):
+        return self.copy()
     
     def __str__(self) -> str:
         return str(self._asks)
@@ -138,27 +340,91 @@ class Asks:
         return self.__str__()
 
 
-class Bids:
-    def __init__(self, max_depth: int = 400) -> None:
+class Bids(CumulativeDepth):
+    sign = -1
+    merge_ratio = 1 # merge a batch of at least `len(self) / merge_ratio` deltas at once
+    
+    def __init__(self, max_depth: int = 400, tick_size: Optional[float] = None) -> None:
         self._bids: List[BookLevel] = []
+        # the negated prices of `_bids`, or their negated int tick counts with `tick_size`, sorted ascending for bisect
+        self._keys: List[Union[float, int]] = []
         self.max_depth = max_depth
+        self.tick_size = tick_size
+        self._scale, self._units = tick_units(tick_size) if tick_size is not None else (1, 1)
+        self._shared = False    # the lists are shared with a snapshot, copy them before writing
+        self._readonly = False
+        self.top_version = 0    # incremented whenever the best level may change
     
     
     def set(self, price: float, amount: float, count: int) -> None:
-        new_level = BookLevel(price, amount, count)
+        if self._shared:
+            self._own()
+        self._cum = None
+        if self.tick_size is not None:
+            ticks, price = to_ticks(price, self.tick_size, self._scale, self._units)
+            new_level = BookLevel(price, amount, count)
+            key = -ticks
+        else:
+            new_level = BookLevel(price, amount, count)
+            key = -new_level.price
+        idx = bisect.bisect_left(self._keys, key)
+        found = idx < len(self._keys) and self._keys[idx] == key
+        if idx == 0:
+            self.top_version += 1
         if amount == 0: # remove the level
-            if new_level in self._bids:
-                self._bids.remove(new_level)
+            if found:
+                del self._bids[idx]
+                del self._keys[idx]
         else:    
-            idx = bisect.bisect_left(self._bids, -1*new_level.price, key=lambda x: -1*x.price)
-            if 0 <= idx < len(self._bids):
-                if self._bids[idx] == new_level:  # update
-                    self._bids[idx] = new_level
-                else:                             # insert new book_level
-                    self._bids.insert(idx, new_level)
-                    self._bids[:] = self._bids[:self.max_depth]
+            if found:                              # update
+                self._bids[idx] = new_level
+            elif idx < len(self._bids):            # insert new book_level
+                self._bids.insert(idx, new_level)
+                self._keys.insert(idx, key)
+                if len(self._bids) > self.max_depth:
+                    del self._bids[self.max_depth:]
+                    del self._keys[self.max_depth:]
             elif len(self._bids) < self.max_depth: # append new book_level
                     self._bids.append(new_level)
+                    self._keys.append(key)
+
+
+    def set_many(self, prices: Sequence[float], amounts: Sequence[float], counts: Sequence[int]) -> None:
+        '''
+        Apply a batch of deltas in order. A large batch is merged into the levels at once,
+        unless a level could be truncated by `max_depth` in between, where the deltas are applied one by one.
+        '''
+        if len(prices) * self.merge_ratio < len(self._bids) or not self._merge(prices, amounts, counts):
+            for price, amount, count in zip(prices, amounts, counts):
+                self.set(price, amount, count)
+
+    def _merge(self, prices: Sequence[float], amounts: Sequence[float], counts: Sequence[int]) -> bool:
+        levels = dict(zip(self._keys, self._bids))
+        seen = len(levels)  # an upper bound of the depth while applying the batch one by one
+        for price, amount, count in zip(prices, amounts, counts):
+            if self.tick_size is not None:
+                ticks, price = to_ticks(price, self.tick_size, self._scale, self._units)
+                new_level = BookLevel(price, amount, count)
+                key = -ticks
+            else:
+                new_level = BookLevel(price, amount, count)
+                key = -new_level.price
+            if amount == 0:
+                levels.pop(key, None)
+            else:
+                if key not in levels:
+                    seen += 1
+                levels[key] = new_level
+        if seen > self.max_depth: # a level may have been truncated in between
+            return False
+
+        if self._shared:
+            self._own()
+        self._cum = None
+        self.top_version += 1
+        self._keys = sorted(levels)
+        self._bids = [levels[key] for key in self._keys]
+        return True
 
 
     def __getitem__(self, key) -> Union[BookLevel, List[BookLevel]]:
@@ -187,12 +453,44 @@ class Bids:
 
     def __iter__(self):
         return iter(self._bids)
+
+    def top(self) -> Tuple[float, float]:
+        '''
+        Return the price and amount of the best level, or NaNs if the side is empty.
+        '''
+        if self._bids:
+            return self._bids[0].price, self._bids[0].amount
+        return NAN, NAN
     
-    def __deepcopy__(self, memo):
-        new_bids = Bids(self.max_depth)
-        new_bids._bids = deepcopy(self._bids)
+    def _level_arrays(self) -> Tuple[np.ndarray, np.ndarray]:
+        return np.array([level.price for level in self._bids], dtype=np.float64), np.array([level.amount for level in self._bids], dtype=np.float64)
+
+    def _own(self) -> None:
+        if self._readonly:
+            raise Exception("Can not modify a read-only snapshot of the book; use copy() to get a mutable copy.")
+        self._bids = self._bids.copy()
+        self._keys = self._keys.copy()
+        self._shared = False
+
+    def snapshot(self) -> 'Bids':
+        '''
+        Return a read-only snapshot sharing the levels; the side copies them on its next write.
+        '''
+        new_bids = copy(self)
+        new_bids._readonly = True
+        new_bids._shared = self._shared = True
         return new_bids
 
+    def copy(self) -> 'Bids':
+        new_bids = Bids(self.max_depth, self.tick_size)
+        new_bids._bids = self._bids.copy() # the levels are immutable
+        new_bids._keys = self._keys.copy()
+        new_bids.top_version = self.top_version
+        return new_bids
+
+    def __deepcopy__(self, memo):
+        return self.copy()
+
     def __str__(self) -> str:
         return str(self._bids)
     
@@ -200,12 +498,375 @@ class Bids:
         return self.__str__()
 
 
+class ArraySide(CumulativeDepth):
+    '''
+    A side of the book stored in preallocated numpy arrays of `max_depth` levels, sorted from the best level.
+
+    It has the same API as `Asks`/`Bids`, but a delta does not allocate a `BookLevel`
+    and an insert shifts the arrays in place instead of copying the whole list.
+    The levels are sorted by `sign * price` ascending, i.e. `sign` is 1 for the asks and -1 for the bids.
+    '''
+    sign = 1
+    merge_ratio = 16 # merge a batch of at least `len(self) / merge_ratio` deltas at once
+    
+    def __init__(self, max_depth: int = 400, tick_size: Optional[float] = None) -> None:
+        self.max_depth = max_depth
+        self.tick_size = tick_size
+        self._scale, self._units = tick_units(tick_size) if tick_size is not None else (1, 1)
+        # sign * price, or sign * ticks with `tick_size`
+        self._keys = np.empty(max_depth, dtype=np.float64 if tick_size is None else np.int64)
+        self._prices = np.empty(max_depth, dtype=np.float64)
+        self._amounts = np.empty(max_depth, dtype=np.float64)
+        self._counts = np.empty(max_depth, dtype=np.int64)
+        self._depth = 0
+        self._shared = False    # the arrays are shared with a snapshot, copy them before writing
+        self._readonly = False
+        self.top_version = 0    # incremented whenever the best level may change
+    
+    
+    def set(self, price: float, amount: float, count: int) -> None:
+        if self._shared:
+            self._own()
+        self._cum = None
+        if price <= 0:
+            raise ValueError("Price must be greater than zero.")
+        if amount < 0:
+            raise ValueError("Amount must be greater than or equal to zero.")
+        if count < 0:
+            raise ValueError("Count must be greater than or equal to zero.")
+        
+        depth = self._depth
+        if self.tick_size is not None:
+            ticks, price = to_ticks(price, self.tick_size, self._scale, self._units)
+            key = self.sign * ticks
+        else:
+            key = self.sign * price
+        idx = int(self._keys[:depth].searchsorted(key))
+        found = idx < depth and self._keys[idx] == key
+        if idx == 0:
+            self.top_version += 1
+        if amount == 0: # remove the level
+            if found:
+                for array in (self._keys, self._prices, self._amounts, self._counts):
+                    array[idx:depth-1] = array[idx+1:depth]
+                self._depth = depth - 1
+        elif found:                         # update
+            self._amounts[idx] = amount
+            self._counts[idx] = count
+        elif idx < depth or depth < self.max_depth: # insert new level; the worst level is dropped when the side is full
+            end = min(depth + 1, self.max_depth)
+            for array in (self._keys, self._prices, self._amounts, self._counts):
+                array[idx+1:end] = array[idx:end-1]
+            self._keys[idx] = key
+            self._prices[idx] = price
+            self._amounts[idx] = amount
+            self._counts[idx] = count
+            self._depth = end
+
+
+    def set_many(self, prices: Sequence[float], amounts: Sequence[float], counts: Sequence[int]) -> None:
+        '''
+        Apply a batch of deltas in order. A large batch is merged into the arrays at once,
+        unless a level could be truncated by `max_depth` in between, where the deltas are applied one by one.
+        '''
+        if len(prices) * self.merge_ratio < self._depth or not self._merge(prices, amounts, counts):
+            for price, amount, count in zip(prices, amounts, counts):
+                self.set(price, amount, count)
+
+
+    def _merge(self, prices: Sequence[float], amounts: Sequence[float], counts: Sequence[int]) -> bool:
+        new_prices = np.asarray(prices, dtype=np.float64)
+        new_amounts = np.asarray(amounts, dtype=np.float64)
+        new_counts = np.asarray(counts, dtype=np.int64)
+        if (new_prices <= 0).any():
+            raise ValueError("Price must be greater than zero.")
+        if (new_amounts < 0).any():
+            raise ValueError("Amount must be greater than or equal to zero.")
+        if (new_counts < 0).any():
+            raise ValueError("Count must be greater than or equal to zero.")
+        if self.tick_size is not None:
+            ticks = [to_ticks(price, self.tick_size, self._scale, self._units) for price in new_prices.tolist()]
+            new_keys = self.sign * np.array([tick for tick, _ in ticks], dtype=np.int64)
+            new_prices = np.array([price for _, price in ticks], dtype=np.float64)
+        else:
+            new_keys = self.sign * new_prices
+
+        depth = self._depth
+        if len(np.union1d(self._keys[:depth], new_keys[new_amounts != 0])) > self.max_depth:
+            return False # a level may have been truncated in between
+
+        keys = np.concatenate((self._keys[:depth], new_keys))
+        all_amounts = np.concatenate((self._amounts[:depth], new_amounts))
+        # the last delta of every key, sorted by key
+        _, last = np.unique(keys[::-1], return_index=True)
+        last = len(keys) - 1 - last
+        last = last[all_amounts[last] != 0]
+
+        if self._shared:
+            self._own()
+        self._cum = None
+        self.top_version += 1
+        n = len(last)
+        all_prices = np.concatenate((self._prices[:depth], new_prices))
+        all_counts = np.concatenate((self._counts[:depth], new_counts))
+        self._keys[:n] = keys[last]
+        self._prices[:n] = all_prices[last]
+        self._amounts[:n] = all_amounts[last]
+        self._counts[:n] = all_counts[last]
+        self._depth = n
+        return True
+
+
+    def _level(self, i: int) -> BookLevel:
+        return BookLevel(float(self._prices[i]), float(self._amounts[i]), int(self._counts[i]))
+    
+    
+    def __getitem__(self, key) -> Union[BookLevel, List[BookLevel]]:
+        if isinstance(key, slice):
+            return [self._level(i) for i in range(*key.indices(self._depth))]
+        elif isinstance(key, int):
+            if key < 0:
+                key += self._depth
+            if not 0 <= key < self._depth:
+                raise IndexError("Book level index out of range.")
+            return self._level(key)
+        else:
+            raise TypeError("Invalid key type. Key must be an integer or a slice.")
+    
+    
+    def prices(self, n: Optional[int] = None) -> np.ndarray:
+        '''
+        Return a copy of the prices of the best `n` levels (all the levels by default).
+        '''
+        return self._prices[:self._top(n)].copy()
+    
+    
+    def amounts(self, n: Optional[int] = None) -> np.ndarray:
+        return self._amounts[:self._top(n)].copy()
+    
+    
+    def counts(self, n: Optional[int] = None) -> np.ndarray:
+        return self._counts[:self._top(n)].copy()
+    
+    
+    def _top(self, n: Optional[int]) -> int:
+        return self._depth if n is None else min(n, self._depth)
+    
+    
+    def __len__(self) -> int:
+        return self._depth
+    
+    
+    def __eq__(self, other) -> bool:
+        if len(self) != len(other):
+            return False
+        for i, level in enumerate(self):
+            if not level.true_eq(other[i]):
+                return False
+        
+        return True
+    
+    
+    def __iter__(self):
+        return (self._level(i) for i in range(self._depth))
+    
+    
+    def top(self) -> Tuple[float, float]:
+        '''
+        Return the price and amount of the best level, or NaNs if the side is empty.
+        '''
+        if self._depth:
+            return float(self._prices[0]), float(self._amounts[0])
+        return NAN, NAN
+    
+    
+    def _level_arrays(self) -> Tuple[np.ndarray, np.ndarray]:
+        # copies, since the arrays are updated in place
+        return self._prices[:self._depth].copy(), self._amounts[:self._depth].copy()
+    
+    
+    def _own(self) -> None:
+        if self._readonly:
+            raise Exception("Can not modify a read-only snapshot of the book; use copy() to get a mutable copy.")
+        for name in ('_keys', '_prices', '_amounts', '_counts'):
+            setattr(self, name, getattr(self, name).copy())
+        self._shared = False
+    
+    
+    def snapshot(self) -> 'ArraySide':
+        '''
+        Return a read-only snapshot sharing the arrays; the side copies them on its next write.
+        '''
+        new_side = copy(self)
+        new_side._readonly = True
+        new_side._shared = self._shared = True
+        return new_side
+    
+    
+    def copy(self) -> 'ArraySide':
+        new_side = type(self)(self.max_depth, self.tick_size)
+        for name in ('_keys', '_prices', '_amounts', '_counts'):
+            getattr(new_side, name)[:self._depth] = getattr(self, name)[:self._depth]
+        new_side._depth = self._depth
+        new_side.top_version = self.top_version
+        return new_side
+    
+    
+    def __deepcopy__(self, memo):
+        return self.copy()
+    
+    
+    def __str__(self) -> str:
+        return str(list(self))
+    
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+class ArrayAsks(ArraySide):
+    sign = 1
+
+
+class ArrayBids(ArraySide):
+    sign = -1
+
+
+class DepthLimitedSide:
+    '''
+    A side of the book which only maintains its best `depth` levels.
+
+    Every delta updates a shadow dict of all the levels, which costs a dict write,
+    but only the deltas within the visible levels reach the sorted side.
+    When a visible level is removed, the visible side is refilled from the shadow store before it is read next.
+    The other attributes are those of the visible side (`Asks`/`Bids`/`ArrayAsks`/`ArrayBids`).
+    '''
+    def __init__(self, side_type: type, depth: int, tick_size: Optional[float] = None) -> None:
+        self.side_type = side_type
+        self.depth = depth
+        self.sign = side_type.sign
+        self.tick_size = tick_size
+        self._scale, self._units = tick_units(tick_size) if tick_size is not None else (1, 1)
+        self._visible = side_type(depth, tick_size)
+        self._shadow: Dict[Union[float, int], Tuple[float, float, int]] = {}   # signed key -> (price, amount, count)
+        self._short = False # the visible side misses some levels of the shadow store
+
+
+    def set(self, price: float, amount: float, count: int) -> None:
+        if price <= 0 or amount < 0 or count < 0:
+            BookLevel(price, amount, count) # raise the same errors as the sides
+        if self.tick_size is not None:
+            key = self.sign * to_ticks(price, self.tick_size, self._scale, self._units)[0]
+        else:
+            key = self.sign * price
+        if amount == 0:
+            self._shadow.pop(key, None)
+        else:
+            self._shadow[key] = (price, amount, count)
+
+        visible = self._visible
+        n = len(visible)
+        if n < self.depth or key <= visible._keys[n-1]: # the delta is within the visible levels
+            visible.set(price, amount, count)
+            if amount == 0 and len(self._shadow) > len(visible):
+                self._short = True
+
+
+    def set_many(self, prices: Sequence[float], amounts: Sequence[float], counts: Sequence[int]) -> None:
+        for price, amount, count in zip(prices, amounts, counts):
+            self.set(price, amount, count)
+
+
+    def _sync(self) -> None:
+        if not self._short:
+            return
+        levels = [self._shadow[key] for key in heapq.nsmallest(self.depth, self._shadow)]
+        visible = self.side_type(self.depth, self.tick_size)
+        visible.set_many([level[0] for level in levels], [level[1] for level in levels], [level[2] for level in levels])
+        visible.top_version = self._visible.top_version + 1
+        self._visible = visible
+        self._short = False
+
+
+    @property
+    def hidden_levels(self) -> int:
+        '''
+        The number of the levels beyond the visible ones.
+        '''
+        self._sync()
+        return len(self._shadow) - len(self._visible)
+
+
+    def snapshot(self) -> Union[Asks, Bids, ArraySide]:
+        '''
+        Return a read-only snapshot of the visible levels.
+        '''
+        self._sync()
+        return self._visible.snapshot()
+
+
+    def copy(self) -> 'DepthLimitedSide':
+        self._sync()
+        new_side = copy(self)
+        new_side._visible = self._visible.copy()
+        new_side._shadow = self._shadow.copy()
+        return new_side
+
+
+    def __deepcopy__(self, memo):
+        return self.copy()
+
+
+    def __getattr__(self, name: str):
+        if name.startswith('__') or name in ('_visible', '_short'):
+            raise AttributeError(name)
+        self._sync()
+        return getattr(self._visible, name)
+
+
+    def __getitem__(self, key) -> Union[BookLevel, List[BookLevel]]:
+        self._sync()
+        return self._visible[key]
+
+
+    def __len__(self) -> int:
+        self._sync()
+        return len(self._visible)
+
+
+    def __iter__(self):
+        self._sync()
+        return iter(self._visible)
+
+
+    def __eq__(self, other) -> bool:
+        self._sync()
+        return self._visible == other
+
+
+    def __str__(self) -> str:
+        return str(self._visible)
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
 class BookCore:
-    def __init__(self, instId: str, check_instId: bool = True) -> None:
+    def __init__(self, instId: str, check_instId: bool = True, array_sides: bool = False, tick_size: Optional[float] = None, depth: Optional[int] = None) -> None:
         self.instId = instId
         self.check_instId = check_instId
-        self._asks: Asks = Asks()
-        self._bids: Bids = Bids()
+        self.array_sides = array_sides
+        self.tick_size = tick_size  # match the prices as int tick counts, exactly but not faster than the float prices
+        self.depth = depth          # only maintain the best `depth` levels of each side (see `DepthLimitedSide`)
+        asks_type, bids_type = (ArrayAsks, ArrayBids) if array_sides else (Asks, Bids)
+        if depth is not None:
+            self._asks: Union[Asks, ArrayAsks, DepthLimitedSide] = DepthLimitedSide(asks_type, depth, tick_size)
+            self._bids: Union[Bids, ArrayBids, DepthLimitedSide] = DepthLimitedSide(bids_type, depth, tick_size)
+        else:
+            self._asks = asks_type(tick_size=tick_size)
+            self._bids = bids_type(tick_size=tick_size)
+        # the top of the book, recomputed only when the `top_version` of a side changes
+        self._top_versions = (-1, -1)
+        self._top_values = (NAN,) * 7
     
     
     def set(self, row: dict) -> None:
@@ -218,14 +879,122 @@ class BookCore:
             self._bids.set(row['price'], row['size'], row['numOrders'])
         else:
             raise Exception(f'Invalid side: {row["side"]}')
+    
+    
+    def set_many(self, sides: Sequence[int], prices: List[float], sizes: List[float], counts: List[int]) -> None:
+        '''
+        Apply a run of rows given column by column, with the sides given as `SIDE_ASK`/`SIDE_BID` codes; `instId` is not checked here.
+        '''
+        asks_set = self._asks.set
+        bids_set = self._bids.set
+        for side, price, size, count in zip(sides, prices, sizes, counts):
+            if side == SIDE_ASK:
+                asks_set(price, size, count)
+            elif side == SIDE_BID:
+                bids_set(price, size, count)
+            else:
+                raise Exception(f'Invalid side: {side}')
+
+
+    def apply_batch(self, sides: np.ndarray, prices: np.ndarray, sizes: np.ndarray, counts: np.ndarray) -> None:
+        '''
+        Apply the deltas of a replay step given as columns in the order of `set_many`, with the sides given as `SIDE_ASK`/`SIDE_BID` codes;
+        the deltas of each side are merged into it at once (see `Asks.set_many`). `instId` is not checked here.
+        '''
+        sides = np.asarray(sides)
+        is_ask = sides == SIDE_ASK
+        is_bid = sides == SIDE_BID
+        if not (is_ask | is_bid).all():
+            raise Exception(f'Invalid side: {sides[~(is_ask | is_bid)][0]}')
+        prices, sizes, counts = np.asarray(prices), np.asarray(sizes), np.asarray(counts)
+        for side, mask in ((self._asks, is_ask), (self._bids, is_bid)):
+            if mask.any():
+                side.set_many(prices[mask].tolist(), sizes[mask].tolist(), counts[mask].tolist())
 
     @property
-    def asks(self) -> Asks:
-        return deepcopy(self._asks)
+    def asks(self) -> Union[Asks, ArrayAsks]:
+        '''
+        A read-only snapshot of the asks; use `copy()` on it to get a mutable copy.
+        '''
+        return self._asks.snapshot()
+    
+    @property
+    def bids(self) -> Union[Bids, ArrayBids]:
+        '''
+        A read-only snapshot of the bids; use `copy()` on it to get a mutable copy.
+        '''
+        return self._bids.snapshot()
+    
+    def cost_to_trade(self, side: str, amount: float) -> Tuple[float, float]:
+        '''
+        Return the amount which a market order of `amount` taking the `side` ('ask' to buy, 'bid' to sell) can fill, 
+        and its notional without fees.
+        '''
+        if side == 'ask':
+            return self._asks.cost_to_trade(amount)
+        elif side == 'bid':
+            return self._bids.cost_to_trade(amount)
+        else:
+            raise Exception(f'Invalid side: {side}')
+    
+    def _top(self) -> Tuple[float, float, float, float, float, float, float]:
+        versions = (self._asks.top_version, self._bids.top_version)
+        if versions != self._top_versions:
+            ask, ask_size = self._asks.top()
+            bid, bid_size = self._bids.top()
+            microprice = (bid * ask_size + ask * bid_size) / (ask_size + bid_size)
+            self._top_values = (ask, ask_size, bid, bid_size, (ask + bid) / 2, ask - bid, microprice)
+            self._top_versions = versions
+        return self._top_values
+    
+    @property
+    def best_ask(self) -> float:
+        '''
+        The best ask price, NaN if there is no ask; the top of the book is O(1) and does not copy the sides.
+        '''
+        return self._top()[0]
+    
+    @property
+    def best_ask_size(self) -> float:
+        return self._top()[1]
+    
+    @property
+    def best_bid(self) -> float:
+        return self._top()[2]
+    
+    @property
+    def best_bid_size(self) -> float:
+        return self._top()[3]
+    
+    @property
+    def mid(self) -> float:
+        return self._top()[4]
+    
+    @property
+    def spread(self) -> float:
+        return self._top()[5]
     
     @property
-    def bids(self) -> Bids:
-        return deepcopy(self._bids)
+    def microprice(self) -> float:
+        '''
+        The mid weighted by the size of the opposite best level, `(bid * ask_size + ask * bid_size) / (ask_size + bid_size)`.
+        '''
+        return self._top()[6]
+    
+    def fill_truncated(self, side: str, amount: float, price: Optional[float] = None) -> bool:
+        '''
+        Whether an order of `amount` taking the `side` would go beyond the levels maintained with `depth`,
+        i.e. the levels discarded by the depth limit could have affected its fill.
+        With the limit `price` of a limit order, only the levels at `price` or better are taken.
+        '''
+        book_side = self._asks if side == 'ask' else self._bids
+        if not isinstance(book_side, DepthLimitedSide) or book_side.hidden_levels == 0:
+            return False
+        if price is None:
+            return book_side.cost_to_trade(amount)[0] < amount
+        # the hidden levels are beyond the last visible level, so they matter only if the limit price reaches past it
+        last_price = book_side[len(book_side)-1].price if len(book_side) else price
+        return book_side.depth_at(price) < amount and book_side.sign * price > book_side.sign * last_price
     
     @property
     def depth_asks(self) -> int:
@@ -235,11 +1004,23 @@ class BookCore:
     def depth_bids(self) -> int:
         return len(self._bids)
     
-    def __deepcopy__(self, memo):
-        new_bookcore = BookCore(self.instId, self.check_instId)
-        new_bookcore._asks = deepcopy(self._asks, memo)
-        new_bookcore._bids = deepcopy(self._bids, memo)
+    def snapshot(self) -> 'BookCore':
+        '''
+        Return a read-only snapshot of the book, sharing the levels until the book is updated.
+        '''
+        new_bookcore = copy(self)
+        new_bookcore._asks = self._asks.snapshot()
+        new_bookcore._bids = self._bids.snapshot()
         return new_bookcore
+    
+    def copy(self) -> 'BookCore':
+        new_bookcore = copy(self)
+        new_bookcore._asks = self._asks.copy()
+        new_bookcore._bids = self._bids.copy()
+        return new_bookcore
+    
+    def __deepcopy__(self, memo):
+        return self.copy()
         
     
     def __str__(self) -> str:
@@ -1,103 +1,351 @@
-import glob
-import os
 from pathlib import Path
-from typing import Dict, List, Tuple, Union
-import pandas as pd
+from typing import Callable, Dict, List, Optional, Tuple, Union
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
 
 from pybacktest.src.bookcore import *
+from pybacktest.src.bookschema import ACTION_SNAPSHOT, ACTIONS, decode_codes
+from pybacktest.src.catalog import Catalog
+from pybacktest.src.chunkcache import ChunkCache, read_chunk
+from pybacktest.src.chunkindex import ChunkIndex
+from pybacktest.src.dataconfig import DataConfig
+from pybacktest.src.gaps import GapIndex, GapPolicy, handle_gap, validate_gap_policy
 from pybacktest.src.instrument import Instrument
+from pybacktest.src.keyframes import Keyframes
+from pybacktest.src.prefetch import ChunkPrefetcher, PrefetchConfig
 from pybacktest.src.simTime import SimTime
 
+# the minimum number of rows to replay for a step to jump to a keyframe within the current chunk instead
+KEYFRAME_SEEK_ROWS = 4096
+
+
+class BookChunk:
+    '''
+    The columns of a chunked data file, held as contiguous numpy arrays.
+    '''
+    def __init__(self, table: pa.Table, max_interval: int) -> None:
+        self.timestamp: np.ndarray = self._column(table, 'timestamp', np.int64)
+        self.side: np.ndarray = decode_codes(table.column('side'), SIDES)
+        self.price: np.ndarray = self._column(table, 'price', np.float64)
+        # NOTICE: float32 sizes of the compact layout are kept as they are to save memory.
+        self.size: np.ndarray = self._column(table, 'size', np.float32 if table.schema.field('size').type == pa.float32() else np.float64)
+        self.numOrders: np.ndarray = self._column(table, 'numOrders', np.int32)
+        self.action: np.ndarray = decode_codes(table.column('action'), ACTIONS)
+        # the compact layout drops `instId`; only the distinct values are kept for the legacy layout
+        self.instIds: List[str] = pc.unique(table.column('instId')).to_pylist() if 'instId' in table.column_names else []
+        
+        # the snapshot consists of the leading rows sharing the first timestamp
+        snapshot = (self.action == ACTION_SNAPSHOT) & (self.timestamp == self.timestamp[0]) if len(self.timestamp) else np.empty(0, dtype=bool)
+        self.snapshot_end = len(snapshot) if snapshot.all() else int(snapshot.argmin())
+        self.gaps = GapIndex(self.timestamp, max_interval)
+    
+    
+    @staticmethod
+    def _column(table: pa.Table, name: str, dtype) -> np.ndarray:
+        # zero-copy for the numeric columns of a memory-mapped table with a single chunk
+        return np.asarray(table.column(name).to_numpy(), dtype=dtype)
+    
+    
+    def __len__(self) -> int:
+        return len(self.timestamp)
+    
+    
+    @property
+    def nbytes(self) -> int:
+        return sum(column.nbytes for column in (self.timestamp, self.side, self.price, self.size, self.numOrders, self.action))
+    
+    
+    def searchsorted(self, ts: int) -> int:
+        '''
+        Return the index of the first row whose timestamp is greater than `ts`.
+        '''
+        return int(self.timestamp.searchsorted(ts, side='right'))
+
+
+
 class Book:
-    def __init__(self, instId: str, simTime: SimTime, path: Path, max_interval: int = 2000, check_instId: bool = True) -> None:
+    def __init__(self, instId: str, simTime: SimTime, path: Path, max_interval: int = 2000, check_instId: bool = True, prefetch: Optional[PrefetchConfig] = None, cache: Optional[ChunkCache] = None, index: Optional[ChunkIndex] = None, gap_policy: GapPolicy = 'raise', array_sides: bool = False, tick_size: Optional[float] = None, depth: Optional[int] = None) -> None:
+        validate_gap_policy(gap_policy)
         self.simTime = simTime
         self.path = path
         self.max_interval = max_interval
+        self.cache = cache
+        self.gap_policy = gap_policy
+        self._stale = False
+        self._window: Optional[Tuple[int, int]] = None  # the rows of `chunked_data` applied by the last step
+        self._touches: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self._gap_ts: Optional[int] = None  # the last timestamp before the gap being skipped, with the `skip` gap policy
+        self._keyframes: Optional[Keyframes] = None    # the keyframes of the current chunk
         
         # initialize the index
-        self.index_files: List[str] = glob.glob(os.path.join(self.path, 'part-*-*-*.parquet'))
-        if len(self.index_files) == 0:
-            t = os.path.join(self.path, 'part-*-*-*.parquet')
-            raise Exception(f'No index files found at {t}')
-        self.index_timePeriods: List[Tuple[int, int]] = []
-        for file in self.index_files:
-            start, end = os.path.splitext(os.path.basename(file))[0].split('-')[2:]
-            self.index_timePeriods.append((int(start), int(end)))
+        self.index = index if index is not None else ChunkIndex(self.path, self.max_interval)
+        self._prefetcher: Optional[ChunkPrefetcher[BookChunk]] = None
+        if prefetch is not None:
+            self._prefetcher = ChunkPrefetcher(self._load_chunk, len(self.index), prefetch)
         
         self.current_index = -1
         # self._update_index()
-        # self.chunked_data = pd.read_parquet(self.index_files[self.current_index])
+        # self.chunked_data = pd.read_parquet(self.index.files[self.current_index])
 
         self.current_ts = -1
         self.chunked_index = 0
-        self._core = BookCore(instId, check_instId)
+        self._core = BookCore(instId, check_instId, array_sides, tick_size, depth)
+        self.depth = depth
+        self.truncated_fills = 0    # the fills which the depth limit could have affected
+        self._subscribers: List[Callable[[int, BookCore], None]] = []
         
         self.update()
 
 
+    def subscribe(self, callback: Callable[[int, BookCore], None]) -> None:
+        '''
+        Register a callback invoked with `(timestamp, core)` after all the rows of a timestamp have been replayed.
+        '''
+        self._subscribers.append(callback)
+
+
     def _update_index(self) -> bool:
-        for i, (start, end) in enumerate(self.index_timePeriods):
-            if start <= self.simTime <= end:
-                if self.current_index != i:
-                    self.current_index = i
-                    return True
-        
-        if self.current_index == -1:
-            raise Exception(f'Can not find a chunk files for the simTime {int(self.simTime)}')
+        index = self.index.seek(int(self.simTime), self.current_index)
+        if index == self.current_index:
+            return False
         
-        return False
+        self.current_index = index
+        return True
+
+
+    def _load_chunk(self, index: int, start: Optional[int] = None) -> BookChunk:
+        # only read the rows needed to replay the book from `start` (the chunk snapshot by default) to the end of the simulation
+        return BookChunk(read_chunk(self.index.files[index], self.cache, start, self.simTime.end, keep_first=True), self.max_interval)
 
 
     def update(self):
         if self.current_ts == self.simTime:
             return
         
+        self._stale = False
+        self._window = None
+        self._touches = {}
         if self._update_index(): # update the chunked data; reset the book
-            self.chunked_data = pd.read_parquet(self.index_files[self.current_index])
+            self._keyframes = Keyframes.load(self.index.files[self.current_index], self.cache, self.index.num_rows[self.current_index])
+            keyframe = self._find_keyframe()
+            if keyframe is not None:
+                keyframes, i = keyframe
+                self.chunked_data = self._load_chunk(self.current_index, keyframes.timestamps[i])
+                if self._prefetcher is not None:
+                    self._prefetcher.schedule(self.current_index)
+            elif self._prefetcher is not None:
+                self.chunked_data = self._prefetcher.get(self.current_index)
+            else:
+                self.chunked_data = self._load_chunk(self.current_index)
             
             # ensure the `action` field is correct in the first row
             # NOTICE: MUST ensure that each chunked data file have a snapshot at the beginning.
-            if self.chunked_data.iloc[0]['action'] != 'snapshot':
+            if len(self.chunked_data) == 0 or self.chunked_data.action[0] != ACTION_SNAPSHOT:
                 raise Exception('The first row of the chunked data must be a snapshot.')
+            if self._core.check_instId:
+                for row_instId in self.chunked_data.instIds:
+                    if row_instId != self._core.instId:
+                        raise Exception(f'set {row_instId} row with {self._core.instId}')
             
-            initial_ts: int = self.chunked_data.iloc[0]['timestamp']
-            
-            # load snapshot; iterate through each row and update the book
-            self.chunked_index = 0
-            for _, row in self.chunked_data.iterrows():
-                if row['action'] != 'snapshot' or row['timestamp'] != initial_ts: # finish loading the snapshot
-                    break
-                
-                self._core.set(dict(row))
-                
-                self.chunked_index += 1
-        
-            self.current_ts = initial_ts
+            # load snapshot (which replaces the book, e.g. at the beginning of another dump), or jump to the latest keyframe
+            self.chunked_index = self.chunked_data.snapshot_end
+            self._gap_ts = None
+            self._core = self._empty_core()
+            if keyframe is not None:
+                self._load_keyframe(*keyframe)
+            else:
+                self._apply(0, self.chunked_index)
+                self.current_ts = int(self.chunked_data.timestamp[0])
+            start = self.chunked_index
+        
+        else:
+            start = self.chunked_index
+            if self._gap_ts is None: # a long seek within the chunk jumps to the latest keyframe
+                self._seek_keyframe()
         
         if self.simTime < self.current_ts:
             raise Exception('Current chunked data is ahead of the simulation time.')
         
-        # iterate through each row and update the book until the simulation time is reached
-        while self.simTime >= self.current_ts:
-            if self.chunked_index >= len(self.chunked_data):
+        # replay all the rows not later than the simulation time
+        end = self.chunked_data.searchsorted(int(self.simTime))
+        while True:
+            if self._gap_ts is not None and not self._resume_after_gap(end):
                 break
-            row = self.chunked_data.iloc[self.chunked_index]
-            if row['timestamp'] > self.simTime:
+            if end <= self.chunked_index:
                 break
-
-            if abs(row['timestamp'] - self.current_ts) > self.max_interval and self.current_ts != -1:
-                time_interval = abs(row['timestamp'] - self.current_ts)
-                raise Exception(f'The time interval {time_interval} between two consecutive rows {(self.current_ts, row["timestamp"])} exceeds the maximum interval {self.max_interval}.')
-            
-            self._core.set(dict(row))
-            if row['timestamp'] != self.current_ts:
-                self.current_ts = row['timestamp']
-            self.chunked_index += 1
+            row, message = self._check_interval(self.chunked_index, end)
+            if row != -1:
+                self._stale = handle_gap(self.gap_policy, message)
+            if row == -1 or self.gap_policy != 'skip':
+                self._apply(self.chunked_index, end)
+                self.chunked_index = end
+                break
+            self._apply(self.chunked_index, row)
+            self._skip_gap(int(self.chunked_data.timestamp[row-1]), row)
+        if end > start:
+            self._window = (start, end)
+        
+        # NOTICE: With the `skip` gap policy, the book is emptied as soon as its data are older than the maximum interval, 
+        #         i.e. inside a gap before its next row is replayed.
+        if self.gap_policy == 'skip' and self._gap_ts is None:
+            last_ts = int(self.chunked_data.timestamp[self.chunked_index-1])
+            if int(self.simTime) - last_ts > self.max_interval:
+                handle_gap(self.gap_policy, f'No row of {self._core.instId} for {int(self.simTime) - last_ts} ms since {last_ts}, exceeding the maximum interval {self.max_interval}.')
+                self._skip_gap(last_ts, self.chunked_index)
         
         self.current_ts = int(self.simTime)
 
 
+    def _empty_core(self) -> BookCore:
+        return BookCore(self._core.instId, self._core.check_instId, self._core.array_sides, self._core.tick_size, self._core.depth)
+
+
+    def _skip_gap(self, gap_ts: int, row: int) -> None:
+        # empty the book from the gap following `gap_ts` until the next keyframe or snapshot; the rows from `row` are dropped
+        self._core = self._empty_core()
+        self._gap_ts = gap_ts
+        self.chunked_index = row
+
+
+    def _resume_after_gap(self, end: int) -> bool:
+        '''
+        Jump to the latest keyframe after the skipped gap, if it is not later than the simulation time;
+        otherwise drop the rows until `end` and keep the book empty. Return whether the book resumed.
+        '''
+        keyframes = self._keyframes
+        i = keyframes.find(int(self.simTime)) if keyframes is not None else -1
+        if i != -1 and keyframes.timestamps[i] > self._gap_ts: # type: ignore
+            self._gap_ts = None
+            self._load_keyframe(keyframes, i) # type: ignore
+            return True
+        self.chunked_index = max(self.chunked_index, end)
+        return False
+
+
+    def _touch_arrays(self, side: str) -> Tuple[np.ndarray, np.ndarray]:
+        # the rows of the last step adding a level to the side, and the running best price of these rows
+        if side not in self._touches:
+            if side not in SIDES:
+                raise Exception(f'Invalid side: {side}')
+            rows = np.empty(0, dtype=np.int64)
+            if self._window is not None:
+                start, end = self._window
+                chunk = self.chunked_data
+                mask = (chunk.side[start:end] == SIDES.index(side)) & (chunk.size[start:end] > 0)
+                rows = np.flatnonzero(mask) + start
+            prices = self.chunked_data.price[rows] if len(rows) else np.empty(0, dtype=np.float64)
+            # NOTICE: The running best is the lowest ask or the highest bid, negated to sort ascending for both sides.
+            keys = np.maximum.accumulate(-prices if side == 'ask' else prices)
+            self._touches[side] = (rows, keys)
+        return self._touches[side]
+
+
+    def window_best(self, side: str) -> float:
+        '''
+        The best price at which a level of the side was added or updated in the last step, 
+        i.e. the best price reached between the previous and the current simulation time; NaN if there is none.
+        '''
+        self.update()
+        
+        _, keys = self._touch_arrays(side)
+        if len(keys) == 0:
+            return float('nan')
+        return float(-keys[-1]) if side == 'ask' else float(keys[-1])
+
+
+    def first_touch(self, side: str, price: float) -> Optional[Tuple[int, float, int]]:
+        '''
+        Return `(timestamp, amount, row)` of the first delta of the last step offering the side at `price` or better, 
+        i.e. when a resting order at `price` taking the side was reached; None if it was not reached.
+        '''
+        self.update()
+        
+        rows, keys = self._touch_arrays(side)
+        i = int(keys.searchsorted(-price if side == 'ask' else price, side='left'))
+        if i == len(rows):
+            return None
+        row = int(rows[i])
+        return int(self.chunked_data.timestamp[row]), float(self.chunked_data.size[row]), row
+
+
+    def _find_keyframe(self) -> Optional[Tuple[Keyframes, int]]:
+        # NOTICE: The snapshot of a chunk replaces the book, so a keyframe replaces the book as well.
+        # the latest keyframe of the current chunk not later than the simulation time, and after the current timestamp
+        keyframes = self._keyframes
+        if keyframes is None:
+            return None
+        i = keyframes.find(int(self.simTime))
+        if i == -1 or keyframes.timestamps[i] <= self.current_ts:
+            return None
+        return keyframes, i
+
+
+    def _seek_keyframe(self) -> None:
+        # NOTICE: The rows skipped by the seek are checked against the gap index: the seek is not taken over a gap,
+        #         so that the gap is handled by the gap policy when the rows are replayed.
+        #         The skipped rows stay in the window of the step, so that the intra-step fills see them.
+        keyframe = self._find_keyframe()
+        if keyframe is None:
+            return
+        row = self.chunked_data.searchsorted(keyframe[0].timestamps[keyframe[1]])
+        if row - self.chunked_index < KEYFRAME_SEEK_ROWS or self._check_interval(self.chunked_index, row)[0] != -1:
+            return
+        self._core = self._empty_core()
+        self._load_keyframe(*keyframe)
 
+
+    def _load_keyframe(self, keyframes: Keyframes, i: int) -> None:
+        keyframe_ts = keyframes.timestamps[i]
+        self._core.set_many(*keyframes.levels(i))
+        self.chunked_index = self.chunked_data.searchsorted(keyframe_ts)
+        self.current_ts = keyframe_ts
+        for callback in self._subscribers:
+            callback(keyframe_ts, self._core)
+
+
+    def _check_interval(self, start: int, end: int) -> Tuple[int, str]:
+        '''
+        Check the intervals between the rows `[start, end)` and their previous rows against the gap index;
+        return the first row following a gap and the message of the gap, or -1 if there is no gap.
+        '''
+        timestamp = self.chunked_data.timestamp
+        if abs(int(timestamp[start]) - self.current_ts) > self.max_interval:
+            i, prev_ts, ts = start, self.current_ts, int(timestamp[start])
+        else:
+            i = self.chunked_data.gaps.first(start, end)
+            if i == -1:
+                return -1, ''
+            prev_ts, ts = int(timestamp[i-1]), int(timestamp[i])
+        return i, f'The time interval {abs(ts - prev_ts)} between two consecutive rows {(prev_ts, ts)} exceeds the maximum interval {self.max_interval}.'
+
+
+    def _apply(self, start: int, end: int) -> None:
+        chunk = self.chunked_data
+        if not self._subscribers:
+            bounds = [start, end]
+        else: # split into runs of the same timestamp so that the subscribers see every timestamp
+            bounds = [start] + (np.flatnonzero(np.diff(chunk.timestamp[start:end])) + start + 1).tolist() + [end]
+        
+        for run_start, run_end in zip(bounds[:-1], bounds[1:]):
+            self._core.apply_batch(
+                chunk.side[run_start:run_end],
+                chunk.price[run_start:run_end],
+                chunk.size[run_start:run_end],
+                chunk.numOrders[run_start:run_end],
+            )
+            for callback in self._subscribers:
+                callback(int(chunk.timestamp[run_end-1]), self._core)
+
+
+    @property
+    def stale(self) -> bool:
+        '''
+        Whether the current step crossed a gap in the data, with the `stale` gap policy.
+        With the `skip` gap policy, the book is empty inside the gaps instead.
+        '''
+        self.update()
+        return self._stale
     
     @property
     def asks(self) -> Asks:
@@ -113,9 +361,84 @@ class Book:
     
     @property
     def core(self) -> BookCore:
+        '''
+        A read-only snapshot of the book; use `copy()` on it to get a mutable copy.
+        '''
+        self.update()
+        
+        return self._core.snapshot()
+
+
+    @property
+    def best_ask(self) -> float:
+        '''
+        The best ask price, NaN if there is no ask; the top of the book does not copy the sides.
+        '''
+        self.update()
+        
+        return self._core.best_ask
+    
+    @property
+    def best_ask_size(self) -> float:
+        self.update()
+        
+        return self._core.best_ask_size
+    
+    @property
+    def best_bid(self) -> float:
+        self.update()
+        
+        return self._core.best_bid
+    
+    @property
+    def best_bid_size(self) -> float:
+        self.update()
+        
+        return self._core.best_bid_size
+    
+    @property
+    def mid(self) -> float:
+        self.update()
+        
+        return self._core.mid
+    
+    @property
+    def spread(self) -> float:
+        self.update()
+        
+        return self._core.spread
+    
+    @property
+    def microprice(self) -> float:
+        '''
+        The mid weighted by the size of the opposite best level.
+        '''
+        self.update()
+        
+        return self._core.microprice
+
+
+    def fill_truncated(self, side: str, amount: float, price: Optional[float] = None) -> bool:
+        '''
+        Whether the depth limit of the replay could have affected the fill of an order of `amount` taking the `side`,
+        up to the limit `price` if given; such fills are counted in `truncated_fills`.
+        '''
+        self.update()
+        
+        if self._core.fill_truncated(side, amount, price):
+            self.truncated_fills += 1
+            return True
+        return False
+
+
+    def cost_to_trade(self, side: str, amount: float) -> Tuple[float, float]:
+        '''
+        Return the amount which a market order of `amount` taking the `side` ('ask' to buy, 'bid' to sell) can fill, 
+        and its notional without fees.
+        '''
         self.update()
         
-        return deepcopy(self._core)
+        return self._core.cost_to_trade(side, amount)
 
 
     def __getitem__(self, side: str) -> Union[Asks, Bids]:
@@ -129,10 +452,12 @@ class Book:
 
 
 class Books:
-    def __init__(self, path: Path, simTime: SimTime, max_interval: int = 10000) -> None:
+    def __init__(self, path: Path, simTime: SimTime, max_interval: int = 10000, config: Optional[DataConfig] = None, catalog: Optional[Catalog] = None) -> None:
         self.path = path
         self.simTime = simTime
         self.max_interval = max_interval
+        self.config = config if config is not None else DataConfig()
+        self.catalog = catalog
         
         self._books: Dict[str, Book] = {}
     
@@ -145,6 +470,19 @@ class Books:
         instId = inst.instId
         if instId not in self._books:
             book_path = self.path/instId
-            self._books[instId] = Book(instId, self.simTime, book_path, self.max_interval)
+            index = self.catalog.index(self.path.name, instId, self.max_interval) if self.catalog is not None else None
+            self._books[instId] = Book(
+                instId, 
+                self.simTime, 
+                book_path, 
+                self.max_interval, 
+                prefetch=self.config.prefetch, 
+                cache=self.config.cache, 
+                index=index, 
+                gap_policy=self.config.gap_policy, 
+                array_sides=self.config.array_sides, 
+                tick_size=inst.tick_size if self.config.tick_prices else None,
+                depth=self.config.depth,
+            )
         
         return self._books[instId]
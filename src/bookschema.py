@@ -0,0 +1,84 @@
+import argparse
+import glob
+import os
+from pathlib import Path
+from typing import List, Optional, Sequence, Union
+
+from loguru import logger
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from src.bookcore import SIDES
+from src.chunkcache import ROW_GROUP_SIZE
+
+
+# the codes of the `action` column in the compact layout of the chunked data
+ACTION_SNAPSHOT = 0
+ACTION_UPDATE = 1
+ACTIONS = ('snapshot', 'update')
+
+
+def decode_codes(column: Union[pa.ChunkedArray, pa.Array], names: Sequence[str]) -> np.ndarray:
+    '''
+    Return the int8 codes of a `side`/`action` column, which is either already int8 codes or strings.
+
+    The unknown strings are coded as -1.
+    '''
+    if pa.types.is_dictionary(column.type):
+        column = column.cast(column.type.value_type)
+    if pa.types.is_integer(column.type):
+        return np.asarray(column.to_numpy(), dtype=np.int8)
+    codes = pc.index_in(column, value_set=pa.array(names, column.type))
+    return np.asarray(codes.fill_null(-1).to_numpy(), dtype=np.int8)
+
+
+def compact_table(table: pa.Table, float32_sizes: bool = False) -> pa.Table:
+    '''
+    Convert the book data to the compact layout:
+    `instId` is dropped (the directory implies it), `side` and `action` are int8 codes,
+    `numOrders` is int32 and optionally `size` is float32.
+
+    NOTICE: float32 sizes only keep about 7 significant digits, so they are not exact for every instrument.
+    '''
+    for name, names in (('side', SIDES), ('action', ACTIONS)):
+        codes = decode_codes(table.column(name), names)
+        if (codes < 0).any():
+            raise Exception(f'Invalid {name}: {table.column(name)[int((codes < 0).argmax())]}')
+        table = table.set_column(table.schema.get_field_index(name), name, pa.array(codes, pa.int8()))
+
+    table = table.set_column(table.schema.get_field_index('numOrders'), 'numOrders', table.column('numOrders').cast(pa.int32()))
+    if float32_sizes:
+        table = table.set_column(table.schema.get_field_index('size'), 'size', table.column('size').cast(pa.float32()))
+    if 'instId' in table.column_names:
+        table = table.drop(['instId'])
+    return table.replace_schema_metadata(None)
+
+
+def compact_chunk(path: Union[Path, str], float32_sizes: bool = False, row_group_size: int = ROW_GROUP_SIZE) -> None:
+    '''
+    Rewrite a chunked data file in the compact layout.
+    '''
+    table = compact_table(pq.read_table(path), float32_sizes)
+    temp_path = f'{path}.tmp'
+    pq.write_table(table, temp_path, row_group_size=row_group_size, write_statistics=True)
+    os.replace(temp_path, path)
+
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description='Rewrite the chunked book data files in the compact layout.')
+    parser.add_argument('paths', nargs='+', help='chunk files or directories of chunk files')
+    parser.add_argument('--float32-sizes', action='store_true', help='store the sizes as float32')
+    args = parser.parse_args(argv)
+
+    for path in args.paths:
+        files = glob.glob(os.path.join(path, 'part-*-*-*.parquet')) if os.path.isdir(path) else [path]
+        for file in sorted(files):
+            compact_chunk(file, args.float32_sizes)
+            logger.info(f'Compacted {file}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+import argparse
+import glob
+import json
+import os
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+from loguru import logger
+import pyarrow.parquet as pq
+
+from src.chunkindex import ChunkIndex
+
+
+MANIFEST_NAME = 'manifest.json'
+MANIFEST_VERSION = 1
+
+
+class Catalog:
+    '''
+    The chunked data files of a data root `<root>/<feed>/<instId>/part-x-start-end.parquet`.
+
+    The catalog is read from the manifest `<root>/manifest.json` written by `python -m src.catalog <root>`,
+    so that no directory is listed during the simulation; without a manifest, the data root is scanned once.
+    '''
+    def __init__(self, root: Union[Path, str], feeds: Dict[str, Dict[str, List[dict]]], schemas: Optional[Dict[str, Dict[str, str]]] = None) -> None:
+        self.root = Path(root)
+        self.feeds = feeds      # feed -> instId -> chunks sorted by start
+        self.schemas = schemas if schemas is not None else {}   # feed -> column -> type
+
+
+    @classmethod
+    def load(cls, root: Union[Path, str]) -> 'Catalog':
+        manifest_path = Path(root)/MANIFEST_NAME
+        if not manifest_path.exists():
+            logger.debug(f'No manifest found at {manifest_path}, scan the data root instead')
+            return cls.scan(root, with_metadata=False)
+
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        if manifest.get('version') != MANIFEST_VERSION:
+            raise Exception(f'Unsupported manifest version {manifest.get("version")} at {manifest_path}')
+        return cls(root, manifest['feeds'], manifest.get('schemas'))
+
+
+    @classmethod
+    def scan(cls, root: Union[Path, str], with_metadata: bool = True) -> 'Catalog':
+        '''
+        List the chunked data files of the data root;
+        with `with_metadata`, the row counts and the schemas are read from the parquet footers.
+        '''
+        feeds: Dict[str, Dict[str, List[dict]]] = {}
+        schemas: Dict[str, Dict[str, str]] = {}
+        for file in glob.glob(os.path.join(root, '*', '*', 'part-*-*-*.parquet')):
+            path = Path(file)
+            feed, instId = path.parent.parent.name, path.parent.name
+            start, end = path.stem.split('-')[2:]
+            chunk = {'file': path.name, 'start': int(start), 'end': int(end)}
+            if with_metadata:
+                metadata = pq.read_metadata(path)
+                chunk['num_rows'] = metadata.num_rows
+                if feed not in schemas:
+                    schema = metadata.schema.to_arrow_schema()
+                    schemas[feed] = {field.name: str(field.type) for field in schema}
+            feeds.setdefault(feed, {}).setdefault(instId, []).append(chunk)
+
+        for chunks in (chunks for insts in feeds.values() for chunks in insts.values()):
+            chunks.sort(key=lambda chunk: (chunk['start'], chunk['end']))
+        return cls(root, feeds, schemas)
+
+
+    def write(self) -> Path:
+        manifest_path = self.root/MANIFEST_NAME
+        temp_path = manifest_path.with_suffix('.tmp')
+        with open(temp_path, 'w') as f:
+            json.dump({'version': MANIFEST_VERSION, 'feeds': self.feeds, 'schemas': self.schemas}, f, indent=1)
+        os.replace(temp_path, manifest_path)
+        return manifest_path
+
+
+    def has(self, feed: str, instId: str) -> bool:
+        return len(self.feeds.get(feed, {}).get(instId, [])) != 0
+
+
+    def chunks(self, feed: str, instId: str) -> List[Tuple[int, int, str]]:
+        '''
+        Return `(start, end, file)` of the chunks of an instrument, sorted by their time periods.
+        '''
+        path = self.root/feed/instId
+        return [(chunk['start'], chunk['end'], str(path/chunk['file'])) for chunk in self.feeds.get(feed, {}).get(instId, [])]
+
+
+    def index(self, feed: str, instId: str, max_gap: Optional[int] = None) -> ChunkIndex:
+        chunks = self.feeds.get(feed, {}).get(instId, [])
+        return ChunkIndex(
+            self.root/feed/instId,
+            max_gap,
+            chunks=self.chunks(feed, instId),
+            num_rows=[chunk.get('num_rows') for chunk in chunks],
+        )
+
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description='Write the manifest of the data roots.')
+    parser.add_argument('roots', nargs='+', help='data roots containing <feed>/<instId>/part-x-start-end.parquet files')
+    args = parser.parse_args(argv)
+
+    for root in args.roots:
+        logger.info(f'Built {Catalog.scan(root).write()}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+import bisect
+import hashlib
+import os
+from pathlib import Path
+import threading
+from typing import List, Optional, Union
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+
+ROW_GROUP_SIZE = 50_000
+
+
+class ChunkCache:
+    '''
+    A local cache of the chunked data files, stored as uncompressed Arrow IPC files.
+
+    The first read of a chunk decodes the parquet file and writes the IPC file;
+    the later reads memory-map the IPC file without decompressing or copying it.
+    '''
+    def __init__(self, cache_dir: Union[Path, str]) -> None:
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+
+    def cached_path(self, path: Union[Path, str]) -> Path:
+        # NOTICE: A chunk is identified by its path, size and modification time,
+        #         so the cache is invalidated when the source file is replaced.
+        stat = os.stat(path)
+        key = f'{os.path.abspath(path)}|{stat.st_size}|{stat.st_mtime_ns}'
+        digest = hashlib.sha1(key.encode()).hexdigest()
+        return self.cache_dir/f'{Path(path).stem}-{digest[:16]}.arrow'
+
+
+    def read(self, path: Union[Path, str]) -> pa.Table:
+        cached_path = self.cached_path(path)
+        if not cached_path.exists():
+            self._write(pq.read_table(path), cached_path)
+
+        with pa.memory_map(str(cached_path), 'r') as source:
+            return pa.ipc.open_file(source).read_all()
+
+
+    def _write(self, table: pa.Table, cached_path: Path) -> None:
+        # write to a temporary file first so that a reader never sees a partial file
+        temp_path = cached_path.with_suffix(f'.{os.getpid()}-{threading.get_ident()}.tmp')
+        with pa.OSFile(str(temp_path), 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table.combine_chunks())
+        os.replace(temp_path, cached_path)
+
+
+
+def read_chunk(path: Union[Path, str], cache: Optional[ChunkCache] = None, start: Optional[int] = None, end: Optional[int] = None, keep_first: bool = False) -> pa.Table:
+    '''
+    Read the rows of a chunk which are needed to replay the period `[start, end]`.
+
+    The rows are kept from the last timestamp not later than `start`, so that the state at `start` is known, 
+    up to `end`; with `keep_first`, the leading rows sharing the first timestamp (the snapshot) are kept as well.
+    The selection is done at the row group level when reading a parquet file, so a few more rows may be returned.
+    '''
+    if cache is not None:
+        table = cache.read(path)
+        if start is None and end is None:
+            return table
+        timestamp = table.column('timestamp').to_numpy()
+        first = int(np.searchsorted(timestamp, start, side='right')) - 1 if start is not None else 0
+        last = int(np.searchsorted(timestamp, end, side='right')) if end is not None else len(timestamp)
+        first = max(first, 0)
+        if not keep_first or first == 0:
+            return table.slice(first, last - first)
+        snapshot_end = int(np.searchsorted(timestamp, timestamp[0], side='right'))
+        if snapshot_end >= first:
+            return table.slice(0, last)
+        return pa.concat_tables([table.slice(0, snapshot_end), table.slice(first, last - first)])
+
+    if start is None and end is None:
+        return pq.read_table(path)
+    parquet_file = pq.ParquetFile(path)
+    row_groups = select_row_groups(parquet_file.metadata, start, end, keep_first)
+    if row_groups is None:
+        return parquet_file.read()
+    return parquet_file.read_row_groups(row_groups)
+
+
+
+def select_row_groups(metadata: pq.FileMetaData, start: Optional[int], end: Optional[int], keep_first: bool = False) -> Optional[List[int]]:
+    '''
+    Return the row groups whose `timestamp` statistics overlap the period `[start, end]`, or None if there are no statistics.
+    '''
+    column = metadata.schema.names.index('timestamp')
+    min_ts: List[int] = []
+    for i in range(metadata.num_row_groups):
+        statistics = metadata.row_group(i).column(column).statistics
+        if statistics is None or not statistics.has_min_max:
+            return None
+        min_ts.append(statistics.min)
+
+    # the last group starting not later than `start` holds the state at `start`
+    first = max(bisect.bisect_right(min_ts, start) - 1, 0) if start is not None else 0
+    last = bisect.bisect_right(min_ts, end) if end is not None else len(min_ts)
+    row_groups = list(range(first, max(last, first + 1)))
+    if keep_first and first > 0:
+        row_groups.insert(0, 0)
+    return row_groups
+
+
+
+def write_chunk(data: Union[pd.DataFrame, pa.Table], path: Union[Path, str], row_group_size: int = ROW_GROUP_SIZE) -> None:
+    '''
+    Write a chunk sorted by `timestamp`, in row groups small enough to be skipped when reading a period of the chunk.
+    '''
+    if isinstance(data, pd.DataFrame):
+        data = pa.Table.from_pandas(data, preserve_index=False)
+    # NOTICE: The sort is stable, so the rows of a timestamp keep their order (the snapshot first).
+    table = data.take(pc.sort_indices(data, sort_keys=[('timestamp', 'ascending')]))
+    pq.write_table(table, path, row_group_size=row_group_size, write_statistics=True)
@@ -0,0 +1,79 @@
+import bisect
+import glob
+import os
+from pathlib import Path
+from typing import List, Optional, Tuple, Union
+
+from loguru import logger
+
+
+class ChunkIndex:
+    '''
+    The chunked data files `part-x-start-end.parquet` of a feed, sorted by their time periods.
+
+    The chunks `(start, end, file)` are listed from the directory unless they are given (e.g. by the `Catalog`).
+    The periods are inclusive and must not share a timestamp, not even at a boundary,
+    since every row of a timestamp has to be replayed from the same chunk.
+    '''
+    def __init__(self, path: Union[Path, str], max_gap: Optional[int] = None, chunks: Optional[List[Tuple[int, int, str]]] = None, num_rows: Optional[List[Optional[int]]] = None) -> None:
+        self.path = path
+        self.max_gap = max_gap
+
+        pattern = os.path.join(path, 'part-*-*-*.parquet')
+        if chunks is None:
+            chunks = []
+            for file in glob.glob(pattern):
+                start, end = os.path.splitext(os.path.basename(file))[0].split('-')[2:]
+                chunks.append((int(start), int(end), file))
+        if len(chunks) == 0:
+            raise Exception(f'No index files found at {pattern}')
+        if num_rows is None:
+            num_rows = [None] * len(chunks)
+        order = sorted(range(len(chunks)), key=lambda i: chunks[i]) # type: ignore
+
+        self.starts: List[int] = [chunks[i][0] for i in order]
+        self.ends: List[int] = [chunks[i][1] for i in order]
+        self.files: List[str] = [chunks[i][2] for i in order]
+        self.num_rows: List[Optional[int]] = [num_rows[i] for i in order]  # unknown when the chunks are listed from the directory
+        self.gaps: List[Tuple[int, int]] = []
+        self._validate()
+
+
+    def _validate(self) -> None:
+        for i in range(1, len(self.files)):
+            if self.starts[i] <= self.ends[i-1]:
+                # NOTICE: The chunks touching at a timestamp overlap too: the rows of the timestamp would be split between them.
+                raise Exception(f'The chunk files {self.files[i-1]} and {self.files[i]} overlap at {(self.starts[i], self.ends[i-1])}')
+            if self.max_gap is not None and self.starts[i] - self.ends[i-1] > self.max_gap:
+                self.gaps.append((self.ends[i-1], self.starts[i]))
+                logger.warning(f'Missing data between {self.ends[i-1]} and {self.starts[i]} at {self.path}')
+
+
+    def find(self, ts: int) -> int:
+        '''
+        Return the index of the chunk covering `ts`, or -1 if there is no such chunk.
+        '''
+        i = bisect.bisect_right(self.starts, ts) - 1
+        if i >= 0 and ts <= self.ends[i]:
+            return i
+        return -1
+
+
+    def seek(self, ts: int, current_index: int) -> int:
+        '''
+        Return the index of the chunk to use at `ts`; keep using the current chunk when no chunk covers `ts`.
+        '''
+        i = self.find(ts)
+        if i != -1:
+            return i
+        if current_index == -1:
+            raise Exception(f'Can not find a chunk files for the simTime {ts}')
+        return current_index
+
+
+    def __len__(self) -> int:
+        return len(self.files)
+
+
+    def __getitem__(self, i: int) -> Tuple[str, int, int]:
+        return self.files[i], self.starts[i], self.ends[i]
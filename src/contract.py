@@ -1,10 +1,14 @@
 
 from enum import Enum
-import uuid
-from uuid import UUID
+import itertools
 from src.instrument import Instrument
 
 
+# NOTICE: The contracts are numbered in the process instead of a uuid4 each, which is as large as the rest of a contract.
+#         The ids only key the maps of the positions, so they do not need to be unique across processes.
+_contract_ids = itertools.count()
+
+
 class ContRole(Enum):
     SELLER = 'SELLER'
     BUYER = 'BUYER'
@@ -19,11 +23,14 @@ class ContStatus(Enum):
 
 
 class Contract:
+    # NOTICE: A position holds a `Contract` per contract traded, so the contracts are slotted to save memory.
+    __slots__ = ('_id', 'inst', 'status', 'role')
+    
     def __init__(self, 
                 inst: Instrument, 
                 role: ContRole, 
                 ) -> None:
-        self._uuid = uuid.uuid4()
+        self._id = next(_contract_ids)
         self.inst = inst
         
         self.status = ContStatus.OPEN
@@ -35,13 +42,14 @@ class Contract:
         self.status = ContStatus.CLOSE
     
     @property
-    def uuid(self) -> UUID:
-        return self._uuid
+    def uuid(self) -> int:
+        # the id of the contract, unique in the process
+        return self._id
     
     
     def as_dict(self) -> dict:
         return {
-            'uuid': str(self._uuid),
+            'uuid': str(self._id),
             'instId': self.inst.as_dict(),
             'role': str(self.role),
             'status': str(self.status),
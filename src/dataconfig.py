@@ -0,0 +1,39 @@
+from pathlib import Path
+from typing import Optional, Union
+
+from src.chunkcache import ChunkCache
+from src.gaps import GapPolicy, validate_gap_policy
+from src.prefetch import PrefetchConfig
+
+
+class DataConfig:
+    '''
+    Options about how the market data are loaded and replayed.
+    '''
+    def __init__(self, 
+                prefetch: Optional[PrefetchConfig] = None,
+                cache_dir: Optional[Union[Path, str]] = None,
+                gap_policy: GapPolicy = 'raise',
+                array_sides: bool = False,
+                tick_prices: bool = False,
+                depth: Optional[int] = None,
+                intra_step_fills: bool = False,
+                ) -> None:
+        validate_gap_policy(gap_policy)
+        self.prefetch = prefetch
+        self.cache_dir = cache_dir
+        self.gap_policy = gap_policy
+        self.array_sides = array_sides  # store the book sides in numpy arrays (`ArrayAsks`/`ArrayBids`)
+        self.tick_prices = tick_prices  # key the book levels by int tick counts of the instrument's `tick_size`, for exact price matching
+        self.depth = depth              # only maintain the best `depth` levels of the books
+        self.intra_step_fills = intra_step_fills    # fill the resting orders reached by the deltas between two steps
+        self._cache: Optional[ChunkCache] = None
+
+
+    @property
+    def cache(self) -> Optional[ChunkCache]:
+        if self.cache_dir is None:
+            return None
+        if self._cache is None:
+            self._cache = ChunkCache(self.cache_dir)
+        return self._cache
@@ -1,20 +1,24 @@
 
 from pathlib import Path
-from typing import Dict
+from typing import Dict, Optional
+from src.dataconfig import DataConfig
 from src.exchanges import Exchange
+from src.latency import NetworkLatency
 from src.simTime import SimTime
 
 
 class Environment:
-    def __init__(self, path: str, simTime: SimTime, max_interval: int = 2000, initial_balance: Dict[str, Dict[str, float]] = {'OKX': {'USDT': 1000, 'USDC': 1000}}) -> None:
+    def __init__(self, path: str, simTime: SimTime, max_interval: int = 2000, initial_balance: Dict[str, Dict[str, float]] = {'OKX': {'USDT': 1000, 'USDC': 1000}}, data_config: Optional[DataConfig] = None, latency: Optional[Dict[str, NetworkLatency]] = None) -> None:
         self.simTime = simTime
         self.path = path
         self.exchanges: Dict[str, Exchange] = {}
         self.max_interval = max_interval
+        self.data_config = data_config
+        self.latency = {} if latency is None else latency   # the latency of every exchange, no delay by default
         if 'OKX' in initial_balance:
-            self.exchanges['OKX'] = Exchange(Path(path), simTime, initial_balance=initial_balance['OKX'], max_interval=max_interval)
+            self.exchanges['OKX'] = Exchange(Path(path), simTime, initial_balance=initial_balance['OKX'], max_interval=max_interval, data_config=data_config, latency=self.latency.get('OKX'))
         else:
-            self.exchanges['OKX'] = Exchange(Path(path), simTime, max_interval=max_interval)
+            self.exchanges['OKX'] = Exchange(Path(path), simTime, max_interval=max_interval, data_config=data_config, latency=self.latency.get('OKX'))
     
     
     def __getitem__(self, _info):
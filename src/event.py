@@ -1,3 +1,5 @@
+from typing import Iterable, Optional
+
 from src.environment import Environment
 from src.order import Order
 
@@ -8,6 +10,14 @@ class Event:
     def execute(self, env) -> bool:
         raise NotImplementedError
 
+    def delay(self, env) -> int:
+        # the time taken by the event to reach the exchange
+        return 0
+
+    def retry(self, in_flight: Iterable['Event']) -> bool:
+        # whether the event failing may still succeed later, given the events on their way; it is dropped otherwise
+        return False
+
 class CreateEvent(Event):
     def __init__(self, ts: int, exchange: str, order: Order) -> None:
         super().__init__(ts)
@@ -18,9 +28,36 @@ class CreateEvent(Event):
         env['exchanges'][self.exchange].add_order(self.order)
         return True
 
+    def delay(self, env: Environment) -> int:
+        latency = env['exchanges'][self.exchange].latency
+        return 0 if latency is None else latency.order_delay()
+
 
 class CancelOrder(Event):
-    def __init__(self, ts: int, uuid: str) -> None:
+    def __init__(self, ts: int, uuid: str, exchange: Optional[str] = None) -> None:
         super().__init__(ts)
         self.uuid = uuid
+        self.exchange = exchange # all the exchanges by default
+    
+    def execute(self, env: Environment) -> bool:
+        for name, exchange in env['exchanges'].items():
+            if self.exchange not in (None, name):
+                continue
+            if exchange.cancel_order(self.uuid):
+                return True
+        return False
+
+    def delay(self, env: Environment) -> int:
+        # NOTICE: Without the exchange, the cancellation takes the latency of the exchange holding the order when it is sent,
+        #         or of the first (default) exchange if no exchange holds it yet, e.g. when the order is still in flight.
+        exchanges = env['exchanges']
+        if self.exchange is not None:
+            exchange = exchanges[self.exchange]
+        else:
+            holding = [exchange for exchange in exchanges.values() if exchange.has_order(self.uuid)]
+            exchange = holding[0] if holding else next(iter(exchanges.values()))
+        return 0 if exchange.latency is None else exchange.latency.cancel_delay()
 
+    def retry(self, in_flight: Iterable[Event]) -> bool:
+        # the order is unknown by the exchanges, so the cancellation can only succeed once the order arrives
+        return any(isinstance(event, CreateEvent) and str(event.order.uuid) == self.uuid for event in in_flight)
@@ -1,17 +1,24 @@
 
+import heapq
+import itertools
+import math
 from pathlib import Path
-from typing import Dict, List, Literal
+from typing import Dict, List, Literal, Optional, Tuple
 from colorama import init as colorama_init
 from colorama import Fore
 from colorama import Style
 
 from loguru import logger
+import numpy as np
 from src.IdxPrice import IdxPrices
-from src.books import Books
-from src.instrument import InstType
+from src.books import Book, Books
+from src.dataconfig import DataConfig
+from src.instrument import Instrument, InstType
+from src.latency import NetworkLatency
 from src.marketdata import MarketData
+from src.orderarchive import OrderArchive
 from src.order import Order, orderAction, orderSide, orderStatus, orderType
-from src.positions import PosDirection, PosStatus, Positions
+from src.positions import PosDirection, Positions
 from src.simTime import SimTime
 
 colorama_init()
@@ -51,11 +58,64 @@ class Balance:
         return self._balance.copy()
 
 
+class RestingOrders:
+    '''
+    The resting limit orders of an instrument in a heap per side of the book they take,
+    ordered by price then time, so that an `eval` only visits the orders crossed by the top of the book.
+
+    The orders which are not open anymore (e.g. cancelled) are dropped when they reach the top of their heaps.
+    '''
+    def __init__(self) -> None:
+        # 'ask': the buy orders by the highest price, 'bid': the sell orders by the lowest price
+        # the entries are `(key, seq, ts, order)`, where `ts` is the time when the order begins to rest
+        self._heaps: Dict[str, List[Tuple[float, int, int, Order]]] = {'ask': [], 'bid': []}
+        self._seq = itertools.count()
+    
+    
+    def add(self, order: Order, side: str, ts: int) -> None:
+        key = -order.price if side == 'ask' else order.price
+        self.push(side, (key, next(self._seq), ts, order))
+    
+    
+    def push(self, side: str, entry: Tuple[float, int, int, Order]) -> None:
+        heapq.heappush(self._heaps[side], entry)
+    
+    
+    def pop_crossed(self, side: str, best_price: float, ts: int) -> List[Tuple[float, int, int, Order]]:
+        '''
+        Pop the open orders whose limit price is crossed by the best price of the `side`, by priority.
+        The orders resting from `ts` are skipped, since they have already taken the book at `ts`.
+        '''
+        heap = self._heaps[side]
+        key = -best_price if side == 'ask' else best_price
+        crossed, skipped = [], []
+        while heap and (heap[0][-1].status != orderStatus.OPEN or heap[0][0] <= key):
+            entry = heapq.heappop(heap)
+            if entry[-1].status != orderStatus.OPEN:
+                continue
+            (skipped if entry[2] == ts else crossed).append(entry)
+        for entry in skipped:
+            heapq.heappush(heap, entry)
+        return crossed
+    
+    
+    def __len__(self) -> int:
+        return len(self._heaps['ask']) + len(self._heaps['bid'])
+
+
+
 class Exchange:
-    def __init__(self, data_path: Path, simTime: SimTime, initial_balance: Dict[str, float] = {'USDT': 100, 'USDC': 100}, max_interval: int = 2000) -> None:
+    def __init__(self, data_path: Path, simTime: SimTime, initial_balance: Dict[str, float] = {'USDT': 100, 'USDC': 100}, max_interval: int = 2000, data_config: Optional[DataConfig] = None, archive_dir: Optional[Path] = None, latency: Optional[NetworkLatency] = None) -> None:
         self.simTime = simTime
-        self.marketData = MarketData(simTime, data_path, max_interval)
-        self.orders: List[Order] = []
+        self.latency = latency                          # the latency between the strategy and the exchange, None for no delay
+        self.marketData = MarketData(simTime, data_path, max_interval, data_config)
+        self._live: Dict[str, Order] = {}               # the open orders by uuid
+        self._pending: List[Order] = []                 # the orders to execute at the next `eval`
+        self._done: Dict[str, Order] = {}               # the open orders which are not open anymore, to archive at the end of `eval`
+        self._retired: List[Order] = []                 # the orders archived since the last `as_dict`
+        self._retired_reported = False                  # whether `_retired` is in an `as_dict` already
+        self.archive = OrderArchive(archive_dir)        # the orders not open anymore
+        self._resting: Dict[Instrument, RestingOrders] = {}  # the resting limit orders of every instrument
         self.balance: Balance = Balance(initial_balance)
         
         self.transaction_fee = {
@@ -63,13 +123,21 @@ class Exchange:
                 'MarketOrder': {
                     'MAKER': 0.0008,
                     'TAKER': 0.0010,
-                }
+                },
+                'LimitOrder': {
+                    'MAKER': 0.0008,
+                    'TAKER': 0.0010,
+                },
             },
             'FUTURES': {
                 'MarketOrder': {
                     'MAKER': 0.0002,
                     'TAKER': 0.0005,
-                }
+                },
+                'LimitOrder': {
+                    'MAKER': 0.0002,
+                    'TAKER': 0.0005,
+                },
             },
         }
         self.delivery_fee_rate = 0.0001
@@ -84,19 +152,60 @@ class Exchange:
         )
     
     def eval(self) -> None:
-        # TODO: Should simulate the delay of network.
+        # NOTICE: The orders and cancellations reach the exchange after the delay of `latency`, 
+        #         which is simulated by `World` before they are added.
         
         self.liquidation()
         self.delivery()
         
-        # execute orders
-        for order in self.orders:
-            if order.status == orderStatus.OPEN:
-                self.__execute(order)
+        # NOTICE: The resting limit orders take the book before the new orders.
+        self.__match_resting_orders()
+        
+        # execute the new orders; the market orders not filled yet are retried at the next step
+        pending, self._pending = self._pending, []
+        for order in pending:
+            if order.status != orderStatus.OPEN:
+                continue
+            self.__execute(order)
+            if order.status == orderStatus.OPEN and order.orderType == orderType.MARKET:
+                self._pending.append(order)
+        
+        self.__archive_orders()
+
+
+    @property
+    def orders(self) -> List[Order]:
+        '''
+        The open orders; the others are in `archive`.
+        '''
+        return list(self._live.values())
+
+
+    def __settle(self, order: Order) -> None:
+        # mark the order to archive if it is not open anymore; called where the status of an order may change
+        uuid = str(order.uuid)
+        if order.status != orderStatus.OPEN and uuid in self._live:
+            self._done[uuid] = order
+
+
+    def __archive_orders(self) -> None:
+        # NOTICE: Only the orders settled in this step are visited, not all the open orders.
+        #         The archived orders are kept in `_retired` until they are reported by `as_dict`,
+        #         since the exchange may be evaluated several times between two snapshots (e.g. at the arrivals of the orders).
+        if self._retired_reported:
+            self._retired = []
+            self._retired_reported = False
+        retired = list(self._done.values())
+        self._done = {}
+        self._retired.extend(retired)
+        for order in retired:
+            del self._live[str(order.uuid)]
+            self.archive.add(order, int(self.simTime))
 
 
     def liquidation(self) -> None:
-        for pos in filter(lambda pos: pos.STATUS == PosStatus.OPEN, self.positions):
+        # NOTICE: Only the positions whose liquidation prices are reached are checked by MarginRate.
+        for pos in self.positions.liquidation_candidates():
             if pos.MarginRate <= 1.0:
                 logger.debug(f'[{self.simTime}] {Fore.RED}Occurred liquidation at {pos.inst}{Style.RESET_ALL}')
                 logger.debug(f'MarginRate: {pos.MarginRate}')
@@ -123,8 +232,8 @@ class Exchange:
                 self.__execute(liquidate_order)
                 logger.debug(f'AOP: {pos.AOP}')
                 logger.debug(f'ACP: {pos.ACP}')
-                logger.debug(f'ask: {pos._mkPx._asks[0].price}')    # type: ignore
-                logger.debug(f'bid: {pos._mkPx._bids[0].price}')    # type: ignore
+                logger.debug(f'ask: {self.marketData["books"][pos.inst].best_ask}')    # type: ignore
+                logger.debug(f'bid: {self.marketData["books"][pos.inst].best_bid}')    # type: ignore
 
 
     def delivery(self, base: Literal['IndexPrice', 'TradePrice'] = 'IndexPrice') -> None:
@@ -135,9 +244,6 @@ class Exchange:
             basePxs: IdxPrices = self.marketData['indexprices'] # type: ignore
         else:
             raise NotImplementedError
-        opened_orders = [
-            order for order in self.orders if order.status == orderStatus.OPEN
-        ]
         for pos in self.positions:
             if pos.inst.end_ts <= self.simTime:
                 logger.debug(f'[{self.simTime}] Occurred delivery at {pos.inst}')
@@ -146,17 +252,39 @@ class Exchange:
                 self.balance[pos.inst.quote_ccy] += pos.close(basePxs[pos.inst].now, pos.OPEN_NUM)
                 self.balance[pos.inst.quote_ccy] -= fee
 
-                # Remove all Unfulfilled orders.
-                for order in opened_orders:
-                    if order == pos:
-                        self.orders.remove(order)
+                # Cancel all Unfulfilled orders.
+                for order in self._live.values():
+                    if order.inst == pos.inst and order.status == orderStatus.OPEN:
+                        order.cancel()
+                        self.__settle(order)
 
 
     def add_order(self, order: Order) -> None:
         if order.status != orderStatus.OPEN:
             raise Exception(f'Order status must be orderStatus.OPEN, instead of {order.status}')
         
-        self.orders.append(order)
+        self._live[str(order.uuid)] = order
+        self._pending.append(order)
+
+
+    def has_order(self, uuid: str) -> bool:
+        # whether the order is open on the exchange
+        return uuid in self._live
+
+
+    def cancel_order(self, uuid: str) -> bool:
+        '''
+        Cancel an open order; return whether the order is known by the exchange.
+        The cancelled orders are archived at the next `eval`, and the cancelled limit orders 
+        are dropped from the resting orders when they reach the top of their heaps.
+        '''
+        order = self._live.get(uuid)
+        if order is None:
+            return uuid in self.archive
+        if order.status == orderStatus.OPEN:
+            order.cancel()
+            self.__settle(order)
+        return True
 
 
     def __execute(self, order: Order):
@@ -168,10 +296,112 @@ class Exchange:
             logger.debug(f'balance: {self.balance.as_dict()}')
         else:
             raise Exception(f'Unsupported order type: {order.orderType}')
+        self.__settle(order)
+
+
+    def __book_side(self, order: Order) -> str:
+        # the side of the book which the order takes: 'ask' to buy, 'bid' to sell
+        if order.side not in (orderSide.BUYLONG, orderSide.SELLSHORT):
+            raise Exception(f'Unsupported order side: {order.side}')
+        buy = order.side == orderSide.BUYLONG
+        if order.inst.type == InstType.FUTURES and order.action == orderAction.CLOSE:
+            buy = not buy   # close long(sell) -> bid, close short(buy) -> ask
+        return 'ask' if buy else 'bid'
+
+
+    def __fee_rate(self, order: Order, role: Literal['MAKER', 'TAKER']) -> float:
+        inst_type = 'SPOT' if order.inst.type == InstType.SPOT else 'FUTURES'
+        order_type = 'LimitOrder' if order.orderType == orderType.LIMIT else 'MarketOrder'
+        return self.transaction_fee[inst_type][order_type][role]
 
 
     def __execute_limit_order(self, order: Order):
-        raise NotImplementedError()
+        if order.price <= 0:
+            raise Exception(f'Invalid limit price: {order.price}')
+        if order.inst.type == InstType.SWAP:
+            raise NotImplementedError()
+        
+        # NOTICE: The part of a new order crossing the book is filled at once at the book prices as a taker, 
+        #         and the rest rests on the exchange as a maker.
+        side = self.__book_side(order)
+        books: Books = self.marketData['books'] # type: ignore
+        levels = books[order.inst][side]
+        self.__check_depth(books[order.inst], side, order, order.leftAmount, order.price)
+        amount = min(order.leftAmount, levels.depth_at(order.price))
+        if order.inst.type == InstType.FUTURES:
+            amount = float(int(amount))
+        if amount > 0:
+            fee_rate = self.__fee_rate(order, 'TAKER')
+            prices, amounts = levels.fills(amount)
+            for price, exec_amount in zip(prices.tolist(), amounts.tolist()):
+                if not self.__fill(order, price, exec_amount, fee_rate):
+                    break
+        
+        if order.status == orderStatus.OPEN:
+            if order.inst not in self._resting:
+                self._resting[order.inst] = RestingOrders()
+            self._resting[order.inst].add(order, side, int(self.simTime))
+
+
+    def __match_resting_orders(self) -> None:
+        '''
+        Fill the resting limit orders crossed by the top of the books at their limit prices, as makers.
+        
+        Only the orders at the top of the heaps are visited, and an order takes the amount of the levels at its price or better, 
+        minus the amount taken by the orders before it in this step.
+        
+        With `DataConfig.intra_step_fills`, the orders reached by the deltas between the previous and the current step are also filled, 
+        at the first delta reaching their prices, taking the amount of that delta.
+        '''
+        books: Books = self.marketData['books'] # type: ignore
+        intra_step = self.marketData.config.intra_step_fills
+        for inst, resting in self._resting.items():
+            if not resting:
+                continue
+            book = books[inst]
+            for side, best_price in (('ask', book.best_ask), ('bid', book.best_bid)):
+                if intra_step: # the best price reached within the step, ignoring NaN
+                    best_price = float((np.fmin if side == 'ask' else np.fmax)(best_price, book.window_best(side)))
+                if math.isnan(best_price):
+                    continue
+                crossed = resting.pop_crossed(side, best_price, int(self.simTime))
+                if not crossed:
+                    continue
+                
+                levels = book[side]
+                taken = 0.0
+                taken_rows: Dict[int, float] = {}   # the amount taken from the deltas within the step
+                for entry in crossed:
+                    order = entry[-1]
+                    touch = book.first_touch(side, order.price) if intra_step else None
+                    if touch is not None:
+                        ts, available, row = touch
+                        amount = min(order.leftAmount, available - taken_rows.get(row, 0.0))
+                    else:
+                        ts, row = int(self.simTime), -1
+                        self.__check_depth(book, side, order, order.leftAmount + taken, order.price)
+                        amount = min(order.leftAmount, levels.depth_at(order.price) - taken)
+                    if inst.type == InstType.FUTURES:
+                        amount = float(int(amount))
+                    if amount > 0 and self.__fill(order, order.price, amount, self.__fee_rate(order, 'MAKER'), ts):
+                        if row == -1:
+                            taken += amount
+                        else:
+                            taken_rows[row] = taken_rows.get(row, 0.0) + amount
+                        logger.debug(f'[{self.simTime}] filled {amount} of the limit order {order} at {ts}')
+                    if order.status == orderStatus.OPEN:
+                        resting.push(side, entry)
+                    else:
+                        self.__settle(order)
+
+
+    def __fill(self, order: Order, price: float, amount: float, fee_rate: float, ts: Optional[int] = None) -> bool:
+        if order.inst.type == InstType.SPOT:
+            return self.__fill_spot(order, price, amount, fee_rate, ts)
+        elif order.inst.type == InstType.FUTURES:
+            return self.__fill_futures(order, price, amount, fee_rate, ts)
+        else:
+            raise Exception(f'Unsupported instrument type: {order.inst.type}')
 
 
     def __execute_market_order(self, order: Order):
@@ -187,130 +417,128 @@ class Exchange:
             raise Exception(f'Unsupported instrument type: {order.inst.type}')
 
 
+    def __check_depth(self, book: Book, side: str, order: Order, amount: float, price: Optional[float] = None) -> None:
+        # `amount` of the side is taken by the order, up to the limit `price` of a limit order
+        if book.fill_truncated(side, amount, price):
+            logger.warning(f'[{self.simTime}] The fill of {order} goes beyond the {book.depth} levels maintained by the replay; the levels beyond them are ignored')
+
+
     def __execute_market_order_spot(self, order: Order):
-        fee_rate = self.transaction_fee['SPOT']['MarketOrder']['TAKER']
+        fee_rate = self.__fee_rate(order, 'TAKER')
         inst = order.inst
         books: Books = self.marketData['books'] # type: ignore
+        side = self.__book_side(order)
+        # NOTICE: The filled levels are resolved at once from the cumulative depth of the book.
+        self.__check_depth(books[inst], side, order, order.leftAmount)
+        prices, amounts = books[inst][side].fills(order.leftAmount)
+        for price, exec_amount in zip(prices.tolist(), amounts.tolist()):
+            if not self.__fill_spot(order, price, exec_amount, fee_rate):
+                break
+        if order.side == orderSide.SELLSHORT and order.leftAmount > 0:
+            order.insufficient()
+            logger.warning(f'[{self.simTime}] Insufficient liquidity for {order}')
+
+
+    def __fill_spot(self, order: Order, price: float, exec_amount: float, fee_rate: float, ts: Optional[int] = None) -> bool:
+        # fill `exec_amount` of the order at `price`; return False if the balance is insufficient
         if order.side == orderSide.BUYLONG:
-            for bl in books[inst]['ask']:
-                if order.leftAmount == 0:
-                    break
-                
-                exec_amount = min(order.leftAmount, bl.amount)
-                cost = bl.price * exec_amount
-                if cost > self.balance[order.quote_ccy]:
-                    order.insufficient()
-                    print(f'[{self.marketData.simTime}] Insufficient balance: {self.balance[order.quote_ccy]} < {cost}')
-                    break
-                
-                self.balance[order.quote_ccy] -= cost
-                self.balance[order.base_ccy] += exec_amount * (1 - fee_rate)
-                order.exe(bl.price, exec_amount, exec_amount * fee_rate)
+            cost = price * exec_amount
+            if cost > self.balance[order.quote_ccy]:
+                order.insufficient()
+                print(f'[{self.marketData.simTime}] Insufficient balance: {self.balance[order.quote_ccy]} < {cost}')
+                return False
+            
+            self.balance[order.quote_ccy] -= cost
+            self.balance[order.base_ccy] += exec_amount * (1 - fee_rate)
+            order.exe(price, exec_amount, exec_amount * fee_rate, ts)
         elif order.side == orderSide.SELLSHORT:
-            for bl in books[inst]['bid']:
-                if order.leftAmount == 0:
-                    break
-                exec_amount = min(order.leftAmount, bl.amount)
-                if order.leftAmount > self.balance[order.base_ccy]:
-                    order.insufficient()
-                    print(f'[{self.marketData.simTime}] Insufficient balance: {self.balance[order.base_ccy]} < {exec_amount}')
-                    break
-                
-                self.balance[order.base_ccy] -= exec_amount
-                get_amount = exec_amount * bl.price
-                self.balance[order.quote_ccy] += get_amount * (1 - fee_rate)
-                order.exe(bl.price, exec_amount, get_amount * fee_rate)
-            if order.leftAmount > 0:
+            if order.leftAmount > self.balance[order.base_ccy]:
                 order.insufficient()
-                logger.warning(f'[{self.simTime}] Insufficient liquidity for {order}')
+                print(f'[{self.marketData.simTime}] Insufficient balance: {self.balance[order.base_ccy]} < {exec_amount}')
+                return False
+            
+            self.balance[order.base_ccy] -= exec_amount
+            get_amount = exec_amount * price
+            self.balance[order.quote_ccy] += get_amount * (1 - fee_rate)
+            order.exe(price, exec_amount, get_amount * fee_rate, ts)
         else:
             raise Exception(f'Unsupported order side: {order.side}')
-
+        return True
 
 
     def __execute_market_order_futures(self, order: Order):
         # NOTICE: ONLY support `USDT/USDC Contracts`.
         
-        fee_rate = self.transaction_fee['FUTURES']['MarketOrder']['TAKER']
+        fee_rate = self.__fee_rate(order, 'TAKER')
         inst = order.inst
         books: Books = self.marketData['books'] # type: ignore
+        if order.action not in (orderAction.OPEN, orderAction.CLOSE):
+            raise Exception(f'Invalid order action: {order.action}')
+        side = self.__book_side(order)
+        
+        self.__check_depth(books[inst], side, order, order.leftAmount)
+        prices, amounts = books[inst][side].fills(order.leftAmount)
+        for price, exec_amount in zip(prices.tolist(), amounts.tolist()):
+            if not self.__fill_futures(order, price, exec_amount, fee_rate):
+                break
+
+
+    def __fill_futures(self, order: Order, price: float, exec_amount: float, fee_rate: float, ts: Optional[int] = None) -> bool:
+        # fill `exec_amount` contracts of the order at `price`; return False if the balance is insufficient
+        pos_direct = PosDirection.BUYLONG if order.side == orderSide.BUYLONG else PosDirection.SELLSHORT
         if order.action == orderAction.OPEN:
-            if order.side == orderSide.BUYLONG:
-                pos_direct = PosDirection.BUYLONG
-                bls = books[inst]['ask'] # open long(buy) -> ask
-            elif order.side == orderSide.SELLSHORT:
-                pos_direct = PosDirection.SELLSHORT
-                bls = books[inst]['bid'] # open short(sell) -> bid
-            else:
-                raise Exception(f'Unsupported order side: {order.side}')
+            fee = price * exec_amount * order.inst.contract_size * fee_rate # FIXME: Haven't consider the contract multiplier here
+            margin = price * exec_amount * order.inst.contract_size / order.leverage
+            cost = margin + fee # total cost
+            if cost > self.balance[order.quote_ccy]:
+                order.insufficient()
+                print(f'[{self.marketData.simTime}] Insufficient balance: {self.balance[order.quote_ccy]} < {cost}')
+                return False
             
-            for bl in bls:
-                if order.leftAmount == 0:
-                    break
-                
-                exec_amount = min(order.leftAmount, bl.amount)
-                fee = bl.price * exec_amount * order.inst.contract_size * fee_rate # FIXME: Haven't consider the contract multiplier here
-                margin = bl.price * exec_amount * order.inst.contract_size / order.leverage
-                cost = margin + fee # total cost
-                if cost > self.balance[order.quote_ccy]:
-                    order.insufficient()
-                    print(f'[{self.marketData.simTime}] Insufficient balance: {self.balance[order.quote_ccy]} < {cost}')
-                    break
-                
-                self.positions.open(
-                    order.inst, pos_direct, 
-                    order.leverage, 
-                    bl.price, int(exec_amount)
-                )
-                
-                # Deducting
-                self.balance[order.quote_ccy] -= cost
-                order.exe(bl.price, exec_amount, fee)
+            self.positions.open(
+                order.inst, pos_direct, 
+                order.leverage, 
+                price, int(exec_amount)
+            )
+            
+            # Deducting
+            self.balance[order.quote_ccy] -= cost
+            order.exe(price, exec_amount, fee, ts)
         elif order.action == orderAction.CLOSE:
-            if order.side == orderSide.BUYLONG:
-                pos_direct = PosDirection.BUYLONG
-                bls = books[inst]['bid'] # close long(sell) -> bid
-            elif order.side == orderSide.SELLSHORT:
-                pos_direct = PosDirection.SELLSHORT
-                bls = books[inst]['ask'] # close short(buy) -> aks
-            else:
-                raise Exception(f'Unsupported order side: {order.side}')
+            fee = price * exec_amount * order.inst.contract_size * fee_rate
             
-            for bl in bls:
-                if order.leftAmount == 0:
-                    break
-                
-                exec_amount = min(order.leftAmount, bl.amount)
-                fee = bl.price * exec_amount * order.inst.contract_size * fee_rate
-                
-                # NOTICE: The fee is only deducted from the balance; 
-                # when the balance cannot cover the fee, 
-                # the operation cannot be carried out, regardless of the income.
-                # ! FIXME: We should consider the fee is not enough where the position is closed because liquidation.
-                if self.balance[order.quote_ccy] - fee < 0:
-                    order.insufficient()
-                    break
-                
-                return_value = self.positions.close(
-                    order.inst, pos_direct, 
-                    order.leverage, 
-                    bl.price, int(exec_amount)
-                )
-                logger.debug(f'returned: {return_value-fee}')
-                self.balance[order.quote_ccy] += return_value - fee
-                
-                order.exe(bl.price, exec_amount, fee)
+            # NOTICE: The fee is only deducted from the balance; 
+            # when the balance cannot cover the fee, 
+            # the operation cannot be carried out, regardless of the income.
+            # ! FIXME: We should consider the fee is not enough where the position is closed because liquidation.
+            if self.balance[order.quote_ccy] - fee < 0:
+                order.insufficient()
+                return False
+            
+            return_value = self.positions.close(
+                order.inst, pos_direct, 
+                order.leverage, 
+                price, int(exec_amount)
+            )
+            logger.debug(f'returned: {return_value-fee}')
+            self.balance[order.quote_ccy] += return_value - fee
+            
+            order.exe(price, exec_amount, fee, ts)
         else: 
             raise Exception(f'Invalid order action: {order.action}')
+        return True
 
 
     def __hash__(self) -> int:
-        return hash((tuple(self.orders), self.balance, self.positions))
+        # the archived orders do not change anymore, so only their number is hashed
+        return hash((tuple(self._live.values()), len(self.archive), self.balance, self.positions))
     
     def as_dict(self) -> dict:
+        self._retired_reported = True
         return {
             'simTime': int(self.simTime),
-            'orders': [o.as_dict() for o in self.orders],
+            'orders': [o.as_dict() for o in self._retired] + [o.as_dict() for o in self._live.values()],
+            'archived': len(self.archive),
             'balance': self.balance.as_dict(),
             'positions': self.positions.as_dict()
         }
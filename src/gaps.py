@@ -0,0 +1,53 @@
+from typing import Literal
+
+from loguru import logger
+import numpy as np
+
+
+# What to do when the data have a gap longer than the maximum interval:
+#   raise:  raise an exception (default);
+#   ignore: replay across the gap as if there were no gap;
+#   skip:   report no data inside the gap window; a book resumes at the first keyframe or snapshot after the gap;
+#   stale:  replay across the gap, and mark the feed stale until the next step.
+GapPolicy = Literal['raise', 'ignore', 'skip', 'stale']
+GAP_POLICIES = ('raise', 'ignore', 'skip', 'stale')
+
+
+def validate_gap_policy(policy: str) -> None:
+    if policy not in GAP_POLICIES:
+        raise ValueError(f"Invalid gap policy: {policy}, must be one of {GAP_POLICIES}.")
+
+
+
+class GapIndex:
+    '''
+    The rows of a chunk following a gap longer than `max_interval`, computed once when the chunk is loaded.
+    '''
+    def __init__(self, timestamp: np.ndarray, max_interval: int) -> None:
+        self.max_interval = max_interval
+        self.rows: np.ndarray = np.flatnonzero(np.diff(timestamp) > max_interval) + 1
+
+
+    def first(self, start: int, end: int) -> int:
+        '''
+        Return the first row in `(start, end)` following a gap, or -1 if there is no such row.
+        '''
+        i = int(self.rows.searchsorted(start, side='right'))
+        if i < len(self.rows) and self.rows[i] < end:
+            return int(self.rows[i])
+        return -1
+
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+
+
+def handle_gap(policy: GapPolicy, message: str) -> bool:
+    '''
+    Apply the gap policy; return whether the step is stale.
+    '''
+    if policy == 'raise':
+        raise Exception(message)
+    logger.debug(message)
+    return policy == 'stale'
@@ -0,0 +1,268 @@
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import gzip
+import io
+import json
+import os
+from pathlib import Path
+import tarfile
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+import zipfile
+
+from loguru import logger
+import numpy as np
+import pyarrow as pa
+
+from src.bookcore import SIDE_ASK, SIDE_BID, BookCore
+from src.bookschema import ACTION_SNAPSHOT, ACTION_UPDATE
+from src.catalog import Catalog
+from src.chunkcache import ROW_GROUP_SIZE, write_chunk
+
+
+CHUNK_MS = 60 * 60 * 1000   # one chunk per hour of data
+MAX_CHUNK_ROWS = 2_000_000
+
+
+def iter_lines(archive: Union[Path, str]) -> Iterator[str]:
+    '''
+    Stream the lines of a raw dump, which is a `.7z`, `.zip`, `.tar.gz`, `.gz` archive or a plain text file.
+    '''
+    archive = str(archive)
+    if archive.endswith('.7z'):
+        import py7zr # NOTICE: only needed for the 7z archives.
+        with py7zr.SevenZipFile(archive, 'r') as z:
+            # NOTICE: py7zr decompresses the members in memory, one at a time.
+            for name in sorted(name for name in z.getnames() if not name.endswith('/')):
+                z.reset()
+                for member in z.read([name]).values():
+                    yield from io.TextIOWrapper(member, encoding='utf-8')
+    elif archive.endswith('.zip'):
+        with zipfile.ZipFile(archive) as z:
+            for name in sorted(name for name in z.namelist() if not name.endswith('/')):
+                with z.open(name) as member:
+                    yield from io.TextIOWrapper(member, encoding='utf-8')
+    elif archive.endswith('.tar.gz') or archive.endswith('.tgz'):
+        with tarfile.open(archive, 'r|gz') as tar:
+            for member in tar:
+                file = tar.extractfile(member) if member.isfile() else None
+                if file is not None:
+                    yield from io.TextIOWrapper(file, encoding='utf-8')
+    elif archive.endswith('.gz'):
+        with gzip.open(archive, 'rt', encoding='utf-8') as f:
+            yield from f
+    else:
+        with open(archive, 'r', encoding='utf-8') as f:
+            yield from f
+
+
+def iter_messages(archive: Union[Path, str]) -> Iterator[dict]:
+    '''
+    Stream the messages of an OKX L2 order book dump, one json object per line:
+    `{"instId": ..., "action": "snapshot"|"update", "ts": ..., "asks": [[px, sz, ..., numOrders], ...], "bids": [...]}`.
+    '''
+    for line in iter_lines(archive):
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+
+class ChunkWriter:
+    '''
+    Split the messages of an instrument into chunks, each starting with a snapshot of the book.
+
+    The book is replayed to know the snapshot at the beginning of every chunk,
+    and only the rows of the current chunk are held in memory.
+    '''
+    def __init__(self, instId: str, path: Union[Path, str], chunk_ms: int = CHUNK_MS, max_rows: int = MAX_CHUNK_ROWS, row_group_size: int = ROW_GROUP_SIZE) -> None:
+        self.instId = instId
+        self.path = Path(path)
+        self.chunk_ms = chunk_ms
+        self.max_rows = max_rows
+        self.row_group_size = row_group_size
+        self.path.mkdir(parents=True, exist_ok=True)
+
+        self._core = BookCore(instId, check_instId=False)
+        self._window = -1
+        self._chunk_start = -1
+        self._last_ts = -1      # the timestamp of the last message written
+        self._late = 0
+        self._columns: Dict[str, list] = self._empty_columns()
+        self.files: List[Path] = []
+
+
+    @staticmethod
+    def _empty_columns() -> Dict[str, list]:
+        return {'timestamp': [], 'side': [], 'price': [], 'size': [], 'numOrders': [], 'action': []}
+
+
+    def write(self, message: dict) -> None:
+        ts = int(message['ts'])
+        action = message.get('action', 'update')
+        if self._window == -1 and action != 'snapshot':
+            raise Exception(f'The dump of {self.instId} must begin with a snapshot, but get {action} at ts {ts}')
+
+        # NOTICE: The chunks must not share a timestamp (see `ChunkIndex`), so a chunk is never split
+        #         in the middle of the messages of a timestamp, even once it has `max_rows` rows.
+        if ts > self._last_ts and (ts // self.chunk_ms > self._window or len(self._columns['timestamp']) >= self.max_rows):
+            self.flush()
+            self._window = max(self._window, ts // self.chunk_ms)
+            self._chunk_start = ts
+            self._snapshot(ts) # the book before the message; it is empty at the beginning of the dump
+        if ts < self._last_ts:
+            # NOTICE: The book is replayed in the order of arrival, so a late message (e.g. from the previous window)
+            #         is moved to the timestamp of the last message, to be replayed from the chunk in the same order.
+            self._late += 1
+            ts = self._last_ts
+        self._last_ts = ts
+
+        # NOTICE: Only the leading rows of a chunk are replayed as a snapshot,
+        #         so the levels removed by a snapshot message in the middle of a chunk are written as deletes.
+        action_code = ACTION_SNAPSHOT if len(self._columns['timestamp']) == 0 else ACTION_UPDATE
+        if action == 'snapshot':
+            self._delete_missing(message, ts)
+            self._core = BookCore(self.instId, check_instId=False)
+        self._apply(message)
+        self._append_rows(message, ts, action_code)
+
+
+    def _apply(self, message: dict) -> None:
+        for side, key in ((SIDE_ASK, 'asks'), (SIDE_BID, 'bids')):
+            levels = message.get(key, [])
+            self._core.set_many([side] * len(levels), [float(level[0]) for level in levels], [float(level[1]) for level in levels], [int(level[-1]) for level in levels])
+
+
+    def _delete_missing(self, message: dict, ts: int) -> None:
+        columns = self._columns
+        for side, key, levels in ((SIDE_ASK, 'asks', self._core.asks), (SIDE_BID, 'bids', self._core.bids)):
+            prices = {float(level[0]) for level in message.get(key, [])}
+            for level in levels:
+                if level.price not in prices:
+                    columns['timestamp'].append(ts)
+                    columns['side'].append(side)
+                    columns['price'].append(level.price)
+                    columns['size'].append(0.0)
+                    columns['numOrders'].append(0)
+                    columns['action'].append(ACTION_UPDATE)
+
+
+    def _append_rows(self, message: dict, ts: int, action: int) -> None:
+        columns = self._columns
+        for side, key in ((SIDE_ASK, 'asks'), (SIDE_BID, 'bids')):
+            for level in message.get(key, []):
+                columns['timestamp'].append(ts)
+                columns['side'].append(side)
+                columns['price'].append(float(level[0]))
+                columns['size'].append(float(level[1]))
+                columns['numOrders'].append(int(level[-1]))
+                columns['action'].append(action)
+
+
+    def _snapshot(self, ts: int) -> None:
+        columns = self._columns
+        for side, levels in ((SIDE_ASK, self._core.asks), (SIDE_BID, self._core.bids)):
+            for level in levels:
+                columns['timestamp'].append(ts)
+                columns['side'].append(side)
+                columns['price'].append(level.price)
+                columns['size'].append(level.amount)
+                columns['numOrders'].append(level.count)
+                columns['action'].append(ACTION_SNAPSHOT)
+
+
+    def flush(self) -> Optional[Path]:
+        columns = self._columns
+        if len(columns['timestamp']) == 0:
+            return None
+        if self._late:
+            logger.warning(f'{self._late} late messages of {self.instId} are moved to the timestamp of the message before them in the chunk from {self._chunk_start}')
+
+        table = pa.table({
+            'timestamp': pa.array(columns['timestamp'], pa.int64()),
+            'side': pa.array(columns['side'], pa.int8()),
+            'price': pa.array(columns['price'], pa.float64()),
+            'size': pa.array(columns['size'], pa.float64()),
+            'numOrders': pa.array(columns['numOrders'], pa.int32()),
+            'action': pa.array(columns['action'], pa.int8()),
+        })
+        timestamp = np.asarray(columns['timestamp'])
+        path = self.path/f'part-{len(self.files)}-{self._chunk_start}-{int(timestamp.max())}.parquet'
+        write_chunk(table, path, self.row_group_size)
+        self.files.append(path)
+
+        self._columns = self._empty_columns()
+        self._late = 0
+        return path
+
+
+
+def ingest_archive(archive: Union[Path, str], output: Union[Path, str], chunk_ms: int = CHUNK_MS, max_rows: int = MAX_CHUNK_ROWS) -> List[Path]:
+    '''
+    Convert a raw dump to `<output>/books/<instId>/part-x-start-end.parquet` chunks.
+    '''
+    writers: Dict[str, ChunkWriter] = {}
+    stem = Path(archive).name.split('.')[0]
+    for message in iter_messages(archive):
+        instId = message['instId']
+        if instId not in writers:
+            # the chunks are prefixed by the archive name so that the dumps of the same instrument do not collide
+            writers[instId] = ChunkWriter(instId, Path(output)/'books'/instId/stem, chunk_ms, max_rows)
+        writers[instId].write(message)
+
+    files: List[Path] = []
+    for writer in writers.values():
+        writer.flush()
+        files.extend(writer.files)
+    return files
+
+
+def ingest(archives: List[Union[Path, str]], output: Union[Path, str], chunk_ms: int = CHUNK_MS, max_rows: int = MAX_CHUNK_ROWS, max_workers: Optional[int] = None) -> List[Path]:
+    '''
+    Convert the raw dumps in parallel, one archive per process, and write the manifest of the output.
+
+    Every dump must begin with a snapshot of its instruments (e.g. the daily dumps of OKX).
+    The memory of a process is bounded by a chunk of rows per instrument of its archive.
+    '''
+    files: List[Path] = []
+    with ProcessPoolExecutor(max_workers) as executor:
+        futures = [executor.submit(ingest_archive, archive, output, chunk_ms, max_rows) for archive in archives]
+        for archive, future in zip(archives, futures):
+            archive_files = future.result()
+            logger.info(f'Ingested {archive} into {len(archive_files)} chunks')
+            files.extend(archive_files)
+
+    _collect(Path(output), files)
+    Catalog.scan(output).write()
+    return files
+
+
+def _collect(output: Path, files: List[Path]) -> None:
+    # move the chunks of every archive up to `books/<instId>/` and renumber them by time
+    by_inst: Dict[Path, List[Tuple[int, Path]]] = {}
+    for file in files:
+        start = int(file.stem.split('-')[2])
+        by_inst.setdefault(file.parent.parent, []).append((start, file))
+    for inst_path, chunks in by_inst.items():
+        offset = len(list(inst_path.glob('part-*-*-*.parquet')))
+        for i, (_, file) in enumerate(sorted(chunks)):
+            _, _, start, end = file.stem.split('-')
+            os.replace(file, inst_path/f'part-{offset + i}-{start}-{end}.parquet')
+        for archive_dir in {file.parent for _, file in chunks}:
+            archive_dir.rmdir()
+
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description='Convert raw OKX L2 order book dumps to the chunked book data files.')
+    parser.add_argument('archives', nargs='+', help='.7z, .zip, .tar.gz, .gz or plain text dumps, one json message per line')
+    parser.add_argument('-o', '--output', required=True, help='the data root to write books/<instId>/part-x-start-end.parquet to')
+    parser.add_argument('--chunk-ms', type=int, default=CHUNK_MS, help='the time span of a chunk in milliseconds')
+    parser.add_argument('--max-rows', type=int, default=MAX_CHUNK_ROWS, help='start a new chunk at the next timestamp once a chunk has this many rows')
+    parser.add_argument('--workers', type=int, default=None, help='the number of processes')
+    args = parser.parse_args(argv)
+
+    ingest(args.archives, args.output, args.chunk_ms, args.max_rows, args.workers)
+
+
+if __name__ == '__main__':
+    main()
@@ -7,6 +7,8 @@ from pybacktest.src.simTime import SimTime
 
 
 class Pair:
+    __slots__ = ('_base_ccy', '_quote_ccy')
+    
     def __init__(self,
                 base_ccy: str,
                 quote_ccy: str,
@@ -34,6 +36,8 @@ class InstType:
     SWAP = 'SWAP'
 
 class Instrument:
+    __slots__ = ('pair', 'instId', 'type', '_listTime', '_expTime', '_contract_size', '_tick_size')
+    
     def __init__(self, 
                 pair: Pair,
                 instId: str,
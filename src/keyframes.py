@@ -0,0 +1,149 @@
+import argparse
+import bisect
+import glob
+import os
+from pathlib import Path
+from typing import List, Optional, Tuple, Union
+
+from loguru import logger
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from src.bookcore import BookCore, SIDE_ASK, SIDE_BID, SIDES
+from src.bookschema import decode_codes
+from src.chunkcache import ChunkCache, read_chunk
+
+
+KEYFRAMES_DIR = 'keyframes'
+
+
+def keyframes_path(chunk_path: Union[Path, str]) -> Path:
+    '''
+    The sidecar file of a chunk is stored as `<chunk dir>/keyframes/<chunk filename>`.
+    '''
+    chunk_path = Path(chunk_path)
+    return chunk_path.parent/KEYFRAMES_DIR/chunk_path.name
+
+
+
+class Keyframes:
+    '''
+    Full snapshots of the book at some timestamps of a chunk.
+
+    The keyframe at `ts` is the state of the book after replaying all the rows with a timestamp not greater than `ts`.
+    '''
+    def __init__(self, table: pa.Table) -> None:
+        keyframe_ts = table.column('keyframe_ts').to_numpy()
+        self.side: np.ndarray = decode_codes(table.column('side'), SIDES)
+        self.price: np.ndarray = np.asarray(table.column('price').to_numpy(), dtype=np.float64)
+        self.size: np.ndarray = np.asarray(table.column('size').to_numpy(), dtype=np.float64)
+        self.numOrders: np.ndarray = np.asarray(table.column('numOrders').to_numpy(), dtype=np.int32)
+
+        # the rows of each keyframe are contiguous
+        bounds = np.flatnonzero(np.diff(keyframe_ts)) + 1
+        self.starts: List[int] = [0] + bounds.tolist()
+        self.ends: List[int] = bounds.tolist() + [len(keyframe_ts)]
+        self.timestamps: List[int] = [int(keyframe_ts[i]) for i in self.starts] if len(keyframe_ts) else []
+
+
+    @classmethod
+    def load(cls, chunk_path: Union[Path, str], cache: Optional[ChunkCache] = None, num_rows: Optional[int] = None) -> Optional['Keyframes']:
+        path = keyframes_path(chunk_path)
+        if not path.exists():
+            return None
+        table = read_chunk(path, cache)
+        source_rows = (table.schema.metadata or {}).get(b'source_rows')
+        if num_rows is None:
+            num_rows = pq.read_metadata(chunk_path).num_rows
+        if source_rows is None or int(source_rows) != num_rows:
+            logger.warning(f'Ignore the keyframes {path} which do not match the chunk {chunk_path}')
+            return None
+        return cls(table)
+
+
+    def find(self, ts: int) -> int:
+        '''
+        Return the index of the latest keyframe not later than `ts`, or -1 if there is no such keyframe.
+        '''
+        return bisect.bisect_right(self.timestamps, ts) - 1
+
+
+    def levels(self, i: int) -> Tuple[List[int], List[float], List[float], List[int]]:
+        start, end = self.starts[i], self.ends[i]
+        return (
+            self.side[start:end].tolist(),
+            self.price[start:end].tolist(),
+            self.size[start:end].tolist(),
+            self.numOrders[start:end].tolist(),
+        )
+
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+
+
+def build_keyframes(chunk_path: Union[Path, str], every_ms: Optional[int] = None, every_rows: Optional[int] = None) -> Path:
+    '''
+    Replay a chunk and write a keyframe every `every_ms` milliseconds of data or every `every_rows` rows.
+    '''
+    if every_ms is None and every_rows is None:
+        raise ValueError("Either every_ms or every_rows must be given.")
+
+    table = pq.read_table(chunk_path)
+    timestamp = table.column('timestamp').to_numpy()
+    side = decode_codes(table.column('side'), SIDES).tolist()
+    price = table.column('price').to_numpy().tolist()
+    size = table.column('size').to_numpy().tolist()
+    numOrders = table.column('numOrders').to_numpy().tolist()
+
+    core = BookCore('', check_instId=False)
+    columns = {'keyframe_ts': [], 'side': [], 'price': [], 'size': [], 'numOrders': []}
+    bounds = [0] + (np.flatnonzero(np.diff(timestamp)) + 1).tolist() + [len(timestamp)]
+    last_ts, last_row = int(timestamp[0]), 0
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        core.set_many(side[start:end], price[start:end], size[start:end], numOrders[start:end])
+        ts = int(timestamp[start])
+        if start == 0 or end == len(timestamp): # the snapshot is already in the chunk
+            continue
+        if (every_ms is not None and ts - last_ts >= every_ms) or \
+            (every_rows is not None and end - last_row >= every_rows):
+            for side_code, levels in ((SIDE_ASK, core.asks), (SIDE_BID, core.bids)):
+                for level in levels:
+                    columns['keyframe_ts'].append(ts)
+                    columns['side'].append(side_code)
+                    columns['price'].append(level.price)
+                    columns['size'].append(level.amount)
+                    columns['numOrders'].append(level.count)
+            last_ts, last_row = ts, end
+
+    path = keyframes_path(chunk_path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    keyframes = pa.table({
+        'keyframe_ts': pa.array(columns['keyframe_ts'], pa.int64()),
+        'side': pa.array(columns['side'], pa.int8()),
+        'price': pa.array(columns['price'], pa.float64()),
+        'size': pa.array(columns['size'], pa.float64()),
+        'numOrders': pa.array(columns['numOrders'], pa.int32()),
+    }).replace_schema_metadata({'source_rows': str(len(timestamp))})
+    pq.write_table(keyframes, path)
+    return path
+
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description='Write the keyframes of the chunked book data files.')
+    parser.add_argument('paths', nargs='+', help='chunk files or directories of chunk files')
+    parser.add_argument('--every-ms', type=int, default=None, help='write a keyframe every N milliseconds of data')
+    parser.add_argument('--every-rows', type=int, default=None, help='write a keyframe every M rows')
+    args = parser.parse_args(argv)
+
+    for path in args.paths:
+        files = glob.glob(os.path.join(path, 'part-*-*-*.parquet')) if os.path.isdir(path) else [path]
+        for file in sorted(files):
+            logger.info(f'Built {build_keyframes(file, args.every_ms, args.every_rows)}')
+
+
+if __name__ == '__main__':
+    main()
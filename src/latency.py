@@ -0,0 +1,123 @@
+import heapq
+import itertools
+from typing import Generic, Iterator, List, Optional, Sequence, Tuple, TypeVar
+
+import numpy as np
+
+
+T = TypeVar('T')
+
+
+class LatencyModel:
+    '''
+    The one-way delay of a message in milliseconds.
+    '''
+    def sample(self) -> int:
+        raise NotImplementedError
+
+
+
+class ConstantLatency(LatencyModel):
+    def __init__(self, ms: int) -> None:
+        if ms < 0:
+            raise ValueError(f'Latency must be non-negative, but get {ms}')
+        self.ms = int(ms)
+
+
+    def sample(self) -> int:
+        return self.ms
+
+
+
+class EmpiricalLatency(LatencyModel):
+    '''
+    Draw the delays from observed ones, e.g. the round trips measured against an exchange halved.
+    '''
+    def __init__(self, samples: Sequence[float], seed: Optional[int] = None) -> None:
+        self.samples = np.asarray(samples, dtype=np.float64)
+        if len(self.samples) == 0 or (self.samples < 0).any():
+            raise ValueError('Latency samples must be non-empty and non-negative')
+        self._rng = np.random.default_rng(seed)
+
+
+    def sample(self) -> int:
+        return int(round(self.samples[self._rng.integers(len(self.samples))]))
+
+
+
+class RandomLatency(LatencyModel):
+    '''
+    A fixed delay plus a random jitter drawn from an exponential distribution of mean `jitter`,
+    so that the delays are mostly close to `base` with a long tail.
+    '''
+    def __init__(self, base: int, jitter: float, seed: Optional[int] = None) -> None:
+        if base < 0 or jitter < 0:
+            raise ValueError(f'Latency must be non-negative, but get base {base} and jitter {jitter}')
+        self.base = int(base)
+        self.jitter = jitter
+        self._rng = np.random.default_rng(seed)
+
+
+    def sample(self) -> int:
+        return self.base + int(round(self._rng.exponential(self.jitter))) if self.jitter > 0 else self.base
+
+
+
+class NetworkLatency:
+    '''
+    The latency between the strategy and an exchange.
+
+    `order` delays the new orders and `cancel` the cancellations (the same as `order` by default).
+    `market_data` is the age of the market data seen by the strategy: since the data are replayed on the exchange clock,
+    an action decided at a step leaves `market_data` later, then takes `order` or `cancel` to arrive.
+    '''
+    def __init__(self, order: LatencyModel, cancel: Optional[LatencyModel] = None, market_data: Optional[LatencyModel] = None) -> None:
+        self.order = order
+        self.cancel = order if cancel is None else cancel
+        self.market_data = ConstantLatency(0) if market_data is None else market_data
+
+
+    def order_delay(self) -> int:
+        return self.market_data.sample() + self.order.sample()
+
+
+    def cancel_delay(self) -> int:
+        return self.market_data.sample() + self.cancel.sample()
+
+
+
+class InFlight(Generic[T]):
+    '''
+    The messages on their way, in a heap by arrival time then by sending order.
+    '''
+    def __init__(self) -> None:
+        self._heap: List[Tuple[int, int, T]] = []
+        self._seq = itertools.count()
+
+
+    def push(self, message: T, arrival: int) -> None:
+        heapq.heappush(self._heap, (arrival, next(self._seq), message))
+
+
+    def next_arrival(self) -> Optional[int]:
+        return self._heap[0][0] if self._heap else None
+
+
+    def pop_arrived(self, ts: int) -> List[T]:
+        '''
+        Pop the messages arrived by `ts`, by arrival time.
+        '''
+        heap = self._heap
+        arrived = []
+        while heap and heap[0][0] <= ts:
+            arrived.append(heapq.heappop(heap)[-1])
+        return arrived
+
+
+    def __iter__(self) -> Iterator[T]:
+        # the messages on their way, in no particular order
+        return (message for _, _, message in self._heap)
+
+
+    def __len__(self) -> int:
+        return len(self._heap)
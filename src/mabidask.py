@@ -1,18 +1,15 @@
 
 from collections import deque
-import glob
-import os
 from pathlib import Path
-from typing import Deque, Dict, List, Tuple
+from typing import Deque, Dict, Optional
 
-import pandas as pd
 from src.instrument import Instrument
 from src.simTime import SimTime
-from src.books import Asks, Bids
+from src.books import Book, BookCore, Books
 
 
 class mabidask:
-    def __init__(self, instId: str, simTime: SimTime, path: Path, window: int = 1, max_interval: int = 2000) -> None:
+    def __init__(self, instId: str, simTime: SimTime, path: Path, window: int = 1, max_interval: int = 2000, book: Optional[Book] = None) -> None:
         self.instId = instId
         self.simTime = simTime
         self.path = path
@@ -24,98 +21,33 @@ class mabidask:
             # ! NOTICE: There is a bug where the `window` parameter is bigger than 1. 
             raise Exception('The window parameter is not supported yet.')
         
-        # initialize the index
-        self.index_files: List[str] = glob.glob(str(self.path/'part-*-*-*.parquet'))
-        if len(self.index_files) == 0:
-            raise Exception('No index files found.')
-        self.index_timePeriods: List[Tuple[int, int]] = []
-        for file in self.index_files:
-            start, end = os.path.splitext(os.path.basename(file))[0].split('-')[2:]
-            self.index_timePeriods.append((int(start), int(end)))
-        
-        self.current_index = -1
-        # self._update_index()
-        # self.chunked_data = pd.read_parquet(self.index_files[self.current_index])
-
+        # NOTICE: Share the replay stream of the `Book` when it is given, 
+        #         so that the data files are decoded and the book is maintained only once.
         self.current_ts = -1
-        self.chunked_index = 0
-        self._asks: Asks = Asks()
-        self._bids: Bids = Bids()
+        self._book = book if book is not None else Book(instId, simTime, path, max_interval, check_instId=False)
+        self._book.subscribe(self.__on_book_update)
         
         self.update()
 
 
-    def _update_index(self) -> bool:
-        for i, (start, end) in enumerate(self.index_timePeriods):
-            if start <= self.simTime <= end:
-                if self.current_index != i:
-                    self.current_index = i
-                    return True
-        
-        if self.current_index == -1:
-            raise Exception(f'Can not find a chunk files for the simTime {int(self.simTime)}')
-        
-        return False
-
-
     def update(self):
         if self.current_ts == self.simTime:
             return
         
-        if self._update_index(): # update the chunked data; reset the book
-            self.chunked_data = pd.read_parquet(self.index_files[self.current_index])
-            
-            # ensure the `action` field is correct in the first row
-            # NOTICE: MUST ensure that each chunked data file have a snapshot at the beginning.
-            if self.chunked_data.iloc[0]['action'] != 'snapshot':
-                raise Exception('The first row of the chunked data must be a snapshot.')
-            
-            initial_ts: int = self.chunked_data.iloc[0]['timestamp']
-            
-            # load snapshot; iterate through each row and update the book
-            self.chunked_index = 0
-            for _, row in self.chunked_data.iterrows():
-                if row['action'] != 'snapshot' or row['timestamp'] != initial_ts: # finish loading the snapshot
-                    break
-                
-                self.__set(row)
-                
-                self.chunked_index += 1
-        
-            self.current_ts = initial_ts
-            self._hist.append((self._asks[0].price + self._bids[0].price) / 2)
-        
-        if self.simTime < self.current_ts:
-            raise Exception('Current chunked data is ahead of the simulation time.')
-        
-        # iterate through each row and update the book until the simulation time is reached
-        while self.simTime >= self.current_ts:
-            if self.chunked_index >= len(self.chunked_data):
-                break
-            row = self.chunked_data.iloc[self.chunked_index]
-            if row['timestamp'] > self.simTime:
-                break
-
-            if abs(row['timestamp'] - self.current_ts) > self.max_interval and self.current_ts != -1:
-                raise Exception(f'The time interval between two consecutive rows {(row["timestamp"], self.current_ts)} exceeds the maximum interval.')
-            
-            self.__set(row)
-            if row['timestamp'] != self.current_ts and len(self._asks)!=0 and len(self._bids)!=0:
-                self.current_ts = row['timestamp']
-                self._hist.append((self._asks[0].price + self._bids[0].price) / 2)
-            self.chunked_index += 1
-        self._hist.append((self._asks[0].price + self._bids[0].price) / 2)
+        self._book.update()
+        self._hist.append(self._book.mid)
         self.current_ts = int(self.simTime)
 
 
-    def __set(self, row: pd.Series) -> None:
-        if row['side'] == 'ask':
-            self._asks.set(row['price'], row['size'], row['numOrders'])
-        elif row['side'] == 'bid':
-            self._bids.set(row['price'], row['size'], row['numOrders'])
-        else:
-            raise Exception(f'Invalid side: {row["side"]}')
-        
+    def __on_book_update(self, ts: int, core: BookCore) -> None:
+        if core.depth_asks != 0 and core.depth_bids != 0:
+            self._hist.append(core.mid)
+
+
+    @property
+    def book(self) -> Book:
+        return self._book
+
 
     @property
     def now(self) -> float:
@@ -167,10 +99,11 @@ class mabidask:
 
 
 class MABidAsks:
-    def __init__(self, path: Path, simTime: SimTime, max_interval: int = 10000) -> None:
+    def __init__(self, path: Path, simTime: SimTime, max_interval: int = 10000, books: Optional[Books] = None) -> None:
         self.path = path
         self.simTime = simTime
         self.max_interval = max_interval
+        self.books = books
         
         self._mabidasks: Dict[str, mabidask] = {}
     
@@ -183,6 +116,7 @@ class MABidAsks:
         instId = inst.instId
         if instId not in self._mabidasks:
             book_path = self.path / instId
-            self._mabidasks[instId] = mabidask(instId, self.simTime, book_path, max_interval=self.max_interval)
+            book = self.books[inst] if self.books is not None else None
+            self._mabidasks[instId] = mabidask(instId, self.simTime, book_path, max_interval=self.max_interval, book=book)
         
         return self._mabidasks[instId]
@@ -1,21 +1,35 @@
 import os
 from pathlib import Path
-from typing import Literal, Union
+from typing import Literal, Optional, Union
 
 from src.IdxPrice import IdxPrices
 from src.books import Books
+from src.catalog import Catalog
+from src.dataconfig import DataConfig
+from src.instrument import Instrument
 from src.markprices import MarkPrices
 from src.mabidask import MABidAsks
 from src.simTime import SimTime
 
 class MarketData:
-    def __init__(self, simTime: SimTime, path: Path, max_interval: int = 2000):
+    def __init__(self, simTime: SimTime, path: Path, max_interval: int = 2000, config: Optional[DataConfig] = None):
         self.simTime = simTime
         self.path = path
-        self._books = Books(path/'books', simTime, max_interval)
-        self._markPrices = MarkPrices(path/'markprices', simTime, max_interval)
-        self._mabidasks = MABidAsks(path/'books', simTime, max_interval) # use the books data.
-        self._idxPxs = IdxPrices(path/'indexprices', simTime, max_interval)
+        self.config = config if config is not None else DataConfig()
+        self.catalog = Catalog.load(path) # NOTICE: The data root is only listed once; the feeds look up their chunks here.
+        self._books = Books(path/'books', simTime, max_interval, self.config, self.catalog)
+        self._markPrices = MarkPrices(path/'markprices', simTime, max_interval, self.config, self.catalog)
+        self._mabidasks = MABidAsks(path/'books', simTime, max_interval, self._books) # share the replay stream of the books.
+        self._idxPxs = IdxPrices(path/'indexprices', simTime, max_interval, self.config, self.catalog)
+    
+    
+    def has(self, data_type: Literal['books', 'markprices', 'mabidasks', 'indexprices'], inst: Instrument) -> bool:
+        '''
+        Whether there are data files of `data_type` for `inst`; `mabidasks` are computed from the books.
+        '''
+        if data_type == 'mabidasks':
+            data_type = 'books'
+        return self.catalog.has(data_type, inst.instId)
     
     
     def __getitem__(self, data_type: Literal['books', 'markprices', 'mabidasks', 'indexprices']) -> Union[Books, MarkPrices, MABidAsks, IdxPrices]:
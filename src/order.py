@@ -32,6 +32,8 @@ class orderAction(Enum):
         return self.value
 
 class TransDetail:
+    __slots__ = ('ts', 'price', 'amount', 'fee')
+    
     def __init__(self,
                 ts: int, price: float,
                 amount: float, fee: float,
@@ -55,6 +57,11 @@ class TransDetail:
         return hash((self.ts, self.price, self.amount, self.fee))
 
 class Order:
+    __slots__ = (
+        'uuid', 'inst', 'orderType', 'side', 'create_ts', 'simTime', 'price', 
+        'leverage', 'action', 'amount', 'status', 'detail', '_filled',
+    )
+    
     def __init__(self,
                 inst: Instrument, orderType: orderType, 
                 side: orderSide, simTime: SimTime, 
@@ -73,6 +80,7 @@ class Order:
         self.amount = amount
         self.status = orderStatus.OPEN
         self.detail: List[TransDetail] = []
+        self._filled = 0.0 # the running total of `detail` amounts
     
     @property
     def ATP(self) -> float:
@@ -89,7 +97,7 @@ class Order:
     @property
     def leftAmount(self) -> float:
         # The amount that has not been executed
-        return self.amount - sum([d.amount for d in self.detail])
+        return self.amount - self._filled
     
     @property
     def base_ccy(self) -> str:
@@ -99,24 +107,31 @@ class Order:
     def quote_ccy(self) -> str:
         return self.inst.quote_ccy
     
-    def exe(self, price: float, amount: float, fee: float) -> None:
+    def exe(self, price: float, amount: float, fee: float, ts: Optional[int] = None) -> None:
+        # `ts` is the time of the fill, the simulation time by default
         if self.status != orderStatus.OPEN:
             raise Exception('Order is not open')
         if self.leftAmount < amount:
             raise Exception('Amount exceeds the left amount')
         self.detail.append(
             TransDetail(
-                ts = int(self.simTime),
+                ts = int(self.simTime) if ts is None else ts,
                 price = price,
                 amount = amount,
                 fee = fee,
             )
         )
+        self._filled += amount
         if self.leftAmount == 0: # TODO: Consider the precision
             self.status = orderStatus.CLOSED
         
     def insufficient(self) -> None:
         self.status = orderStatus.INSUFFICIENT
+    
+    def cancel(self) -> None:
+        if self.status != orderStatus.OPEN:
+            raise Exception('Order is not open')
+        self.status = orderStatus.CANCELED
 
     def __hash__(self) -> int:
         return hash((self.status, tuple(self.detail)))
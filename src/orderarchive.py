@@ -0,0 +1,154 @@
+from pathlib import Path
+from typing import Dict, Optional, Union
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from src.order import Order
+
+
+ORDER_SCHEMA = pa.schema([
+    ('uuid', pa.string()),
+    ('instrument', pa.string()),
+    ('orderType', pa.string()),
+    ('side', pa.string()),
+    ('ts', pa.int64()),
+    ('close_ts', pa.int64()),
+    ('price', pa.float64()),
+    ('amount', pa.float64()),
+    ('filled', pa.float64()),
+    ('leverage', pa.int64()),
+    ('action', pa.string()),
+    ('status', pa.string()),
+])
+
+FILL_SCHEMA = pa.schema([
+    ('uuid', pa.string()),
+    ('ts', pa.int64()),
+    ('price', pa.float64()),
+    ('amount', pa.float64()),
+    ('fee', pa.float64()),
+])
+
+MAX_ROWS = 100_000
+
+
+class OrderArchive:
+    '''
+    The orders in a terminal status (closed, cancelled or insufficient), stored column by column:
+    a row per order, and a row per fill of the orders.
+
+    With `spill_dir`, the rows are written to `<spill_dir>/orders-x.parquet` and `<spill_dir>/fills-x.parquet`
+    once `max_rows` orders are held in memory.
+    '''
+    def __init__(self, spill_dir: Optional[Union[Path, str]] = None, max_rows: int = MAX_ROWS) -> None:
+        self.spill_dir = None if spill_dir is None else Path(spill_dir)
+        self.max_rows = max_rows
+        if self.spill_dir is not None:
+            self.spill_dir.mkdir(parents=True, exist_ok=True)
+
+        self._orders: Dict[str, list] = self._empty_columns(ORDER_SCHEMA)
+        self._fills: Dict[str, list] = self._empty_columns(FILL_SCHEMA)
+        self._spills = 0    # the number of files spilled per table
+        self._status: Dict[str, str] = {}   # the status of every archived order by uuid, kept in memory
+
+
+    @staticmethod
+    def _empty_columns(schema: pa.Schema) -> Dict[str, list]:
+        return {name: [] for name in schema.names}
+
+
+    def add(self, order: Order, close_ts: int) -> None:
+        uuid = str(order.uuid)
+        columns = self._orders
+        columns['uuid'].append(uuid)
+        columns['instrument'].append(str(order.inst))
+        columns['orderType'].append(str(order.orderType))
+        columns['side'].append(str(order.side))
+        columns['ts'].append(order.create_ts)
+        columns['close_ts'].append(close_ts)
+        columns['price'].append(float(order.price))
+        columns['amount'].append(float(order.amount))
+        columns['filled'].append(order._filled)
+        columns['leverage'].append(int(order.leverage))
+        columns['action'].append(str(order.action))
+        columns['status'].append(str(order.status))
+
+        fills = self._fills
+        for d in order.detail:
+            fills['uuid'].append(uuid)
+            fills['ts'].append(int(d.ts))
+            fills['price'].append(float(d.price))
+            fills['amount'].append(float(d.amount))
+            fills['fee'].append(float(d.fee))
+
+        self._status[uuid] = str(order.status)
+        if self.spill_dir is not None and len(columns['uuid']) >= self.max_rows:
+            self.spill()
+
+
+    def spill(self) -> None:
+        '''
+        Write the orders held in memory to the spill directory.
+        '''
+        if self.spill_dir is None:
+            raise Exception('The archive has no spill directory')
+        if len(self._orders['uuid']) == 0:
+            return
+        pq.write_table(pa.table(self._orders, schema=ORDER_SCHEMA), self.spill_dir/f'orders-{self._spills}.parquet')
+        pq.write_table(pa.table(self._fills, schema=FILL_SCHEMA), self.spill_dir/f'fills-{self._spills}.parquet')
+        self._spills += 1
+        self._orders = self._empty_columns(ORDER_SCHEMA)
+        self._fills = self._empty_columns(FILL_SCHEMA)
+
+
+    def _read(self, name: str, schema: pa.Schema, columns: Dict[str, list]) -> pa.Table:
+        tables = [pq.read_table(self.spill_dir/f'{name}-{i}.parquet') for i in range(self._spills)] # type: ignore
+        tables.append(pa.table(columns, schema=schema))
+        return pa.concat_tables(tables)
+
+
+    def orders(self) -> pa.Table:
+        '''
+        The table of the archived orders, one row per order.
+        '''
+        return self._read('orders', ORDER_SCHEMA, self._orders)
+
+
+    def fills(self) -> pa.Table:
+        '''
+        The table of the fills of the archived orders, one row per fill.
+        '''
+        return self._read('fills', FILL_SCHEMA, self._fills)
+
+
+    def get(self, uuid: str) -> Optional[dict]:
+        '''
+        The archived order in the form of `Order.as_dict`, or None if the order is not archived.
+        '''
+        if uuid not in self._status:
+            return None
+        orders = self.orders()
+        order = orders.filter(pc.equal(orders['uuid'], uuid)).to_pylist()[0]
+        fills = self.fills()
+        fills = fills.filter(pc.equal(fills['uuid'], uuid)).to_pylist()
+        order['simTime'] = order.pop('close_ts')
+        del order['filled']
+        order['detail'] = [{'ts': d['ts'], 'price': d['price'], 'amount': d['amount'], 'fee': d['fee']} for d in fills]
+        return order
+
+
+    def status(self, uuid: str) -> Optional[str]:
+        '''
+        The status of an archived order, without reading the spilled files; None if the order is not archived.
+        '''
+        return self._status.get(uuid)
+
+
+    def __contains__(self, uuid: str) -> bool:
+        return uuid in self._status
+
+
+    def __len__(self) -> int:
+        return len(self._status)
@@ -1,6 +1,6 @@
 from typing import Dict, List, Literal, Tuple, Union
 from enum import Enum
-from uuid import UUID
+import math
 import uuid
 
 from loguru import logger
@@ -12,6 +12,10 @@ from src.marketdata import MarketData
 from src.markprices import MarkPrice
 from src.order import Order, orderSide
 
+# the relative margin of the liquidation prices, under which MarginRate is computed to decide the liquidation exactly
+LIQ_TOLERANCE = 1e-6
+
+
 class PosDirection(Enum):
     BUYLONG = 'BUYLONG'
     SELLSHORT = 'SELLSHORT'
@@ -57,21 +61,22 @@ class Position:
         self._leverage = leverage
         self._direct = direction
         # self._marketData = marketData
-        try:
+        if marketData.has('markprices', inst):
             self._mkPx = marketData['markprices'][inst]
-        except Exception as e:
-            if 'No index files found' in str(e):
-                logger.debug(f'No data files for markprice {inst}, use mabidask instead')
-                self._mkPx = marketData['mabidasks'][inst]
+        else:
+            logger.debug(f'No data files for markprice {inst}, use mabidask instead')
+            self._mkPx = marketData['mabidasks'][inst]
         self._mmr = mmr
         self._fee_rate = fee_rate
         
         self._conts: List[Contract] = []
-        self._margin: Dict[UUID, float] = {}
-        self._loan: Dict[UUID, float] = {}
-        self._open_price: Dict[UUID, float] = {}
-        self._close_price: Dict[UUID, float] = {}
+        self._margin: Dict[int, float] = {}
+        self._loan: Dict[int, float] = {}
+        self._open_price: Dict[int, float] = {}
+        self._close_price: Dict[int, float] = {}
         self._uuid = uuid.uuid4()
+        self._open_num = 0              # the number of the open contracts
+        self._liq_price = math.nan      # the mark price where MarginRate reaches 1, NaN without open contracts
 
 
     def open(self, entry_price: float, entry_num: int):
@@ -93,6 +98,7 @@ class Position:
             self._margin[cont.uuid] = margin
             self._loan[cont.uuid] = loan
         self._conts.extend(new_conts)
+        self.__update_liquidation_price()
 
 
     def profit(self, base: Literal['Mark', 'Commission'] = 'Mark') -> float:
@@ -147,12 +153,43 @@ class Position:
             return_value += self._margin[cont.uuid] + delta_p * self.inst.contract_size * 1
             del self._loan[cont.uuid] # Repay the loan.
             del self._margin[cont.uuid]
+        self.__update_liquidation_price()
         
         if return_value < 0:
             raise ValueError(f'Failed to closed {close_num} conts at {close_price}: return_value({return_value}) should not be less than 0; When equal to 0, it will be Forced to liquidation')
         return return_value
 
 
+    def __update_liquidation_price(self) -> None:
+        # NOTICE: `MarginRate <= 1` is solved for the mark price when the position changes,
+        #         i.e. (Margin + cs*N*(mkPx - AOP)) <= cs*N*mkPx*rate for the long positions 
+        #         and (Margin + cs*N*(AOP - mkPx)) <= cs*N*mkPx*rate for the short ones, 
+        #         where N and AOP are the number and the average open price of the open contracts.
+        open_prices = [self._open_price[cont.uuid] for cont in self._conts if cont.status == ContStatus.OPEN]
+        self._open_num = len(open_prices)
+        if self._open_num == 0:
+            self._liq_price = math.nan
+            return
+        rate = self._mmr+self._fee_rate
+        aop = sum(open_prices)/len(open_prices)
+        margin_per_price = self.Margin/(self.inst.contract_size*self._open_num)
+        if self._direct == PosDirection.BUYLONG:
+            self._liq_price = (aop - margin_per_price)/(1 - rate) if rate < 1 else math.inf
+        else:
+            self._liq_price = (aop + margin_per_price)/(1 + rate)
+
+
+    def may_liquidate(self, mkPx: float) -> bool:
+        '''
+        Whether the mark price reaches the liquidation price, within `LIQ_TOLERANCE`;
+        the liquidation is decided by `MarginRate` for these positions only.
+        '''
+        tolerance = LIQ_TOLERANCE*abs(self._liq_price)
+        if self._direct == PosDirection.BUYLONG:
+            return mkPx <= self._liq_price + tolerance
+        return mkPx >= self._liq_price - tolerance
+
+
     def as_dict(self) -> dict:
         return {
             'uuid': str(self._uuid),
@@ -192,6 +229,17 @@ class Position:
             return PosStatus.CLOSE
 
 
+    # Liquidation Price
+    @property
+    def LiqPx(self) -> float:
+        return self._liq_price
+
+
+    @property
+    def mark_price(self) -> float:
+        return float(self._mkPx) # type: ignore
+
+
     @property
     def OPEN_NUM(self) -> int:
         return len([cont for cont in self._conts if cont.status == ContStatus.OPEN])
@@ -266,6 +314,7 @@ class Positions:
                  ) -> None:
         self._pos: List[Position] = []          # opened positions
         self._closed_pos: List[Position] = []   # closed positions
+        self._by_inst: Dict[Instrument, List[Position]] = {}    # the positions in `_pos` by instrument
         self._mmr = maintain_margin_rate
         self._fr = fee_rate
         self._marketData = marketData
@@ -288,12 +337,15 @@ class Positions:
         if len(target_positions) == 0: # Create the position
             pos = Position(inst, leverage, direct, self._marketData, self._mmr, self._fr)
             self._pos.append(pos)
+            self._by_inst.setdefault(inst, []).append(pos)
         else:
             pos = target_positions[0]
         if pos.STATUS == PosStatus.CLOSE: # Replace the closed position
             self._pos.remove(pos)
+            self._by_inst[inst].remove(pos)
             pos = Position(inst, leverage, direct, self._marketData, self._mmr, self._fr)
             self._pos.append(pos)
+            self._by_inst[inst].append(pos)
         
         return pos
 
@@ -304,6 +356,7 @@ class Positions:
             if pos.STATUS == PosStatus.CLOSE:
                 self._closed_pos.append(pos)
                 self._pos.remove(pos)
+                self._by_inst[pos.inst].remove(pos)
 
 
     def open(self, 
@@ -326,6 +379,21 @@ class Positions:
         return return_value
 
 
+    def liquidation_candidates(self) -> List[Position]:
+        '''
+        The open positions whose liquidation prices are reached by the mark price.
+        The mark price of an instrument is read once for all its positions.
+        '''
+        candidates: List[Position] = []
+        for positions in self._by_inst.values():
+            opened = [pos for pos in positions if pos._open_num > 0]
+            if not opened:
+                continue
+            mkPx = opened[0].mark_price
+            candidates.extend(pos for pos in opened if pos.may_liquidate(mkPx))
+        return candidates
+
+
     def __getitem__(self, key: Tuple[Instrument, PosDirection, int]) -> Position:
         return self.__get(key[0], key[1], key[2])
 
@@ -0,0 +1,82 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Generic, Optional, TypeVar
+
+T = TypeVar('T')
+
+
+class PrefetchConfig:
+    def __init__(self, lookahead: int = 1, max_bytes: Optional[int] = 512 * 1024 * 1024, max_workers: int = 2) -> None:
+        if lookahead <= 0:
+            raise ValueError("Lookahead must be greater than zero.")
+        if max_bytes is not None and max_bytes <= 0:
+            raise ValueError("Max bytes must be greater than zero.")
+        if max_workers <= 0:
+            raise ValueError("Max workers must be greater than zero.")
+        self.lookahead = lookahead
+        self.max_bytes = max_bytes
+        self.max_workers = max_workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        # NOTICE: The executor is shared by all the feeds using this config,
+        #         so that the number of loading threads stays bounded.
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix='prefetch')
+        return self._executor
+
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+
+class ChunkPrefetcher(Generic[T]):
+    '''
+    Load the chunks following the current one in background threads.
+
+    pyarrow releases the GIL while reading and decoding parquet files,
+    so the next chunks are ready by the time the simulation crosses the chunk boundary.
+    '''
+    def __init__(self, loader: Callable[[int], T], num_chunks: int, config: PrefetchConfig, sizeof: Callable[[T], int] = lambda x: getattr(x, 'nbytes', 0)) -> None:
+        self.loader = loader
+        self.num_chunks = num_chunks
+        self.config = config
+        self.sizeof = sizeof
+        self._pending: Dict[int, Future] = {}
+        self._chunk_bytes = 0   # the size of the last loaded chunk, used to estimate the next ones
+
+
+    def get(self, i: int) -> T:
+        future = self._pending.pop(i, None)
+        chunk = future.result() if future is not None else self.loader(i)
+        self._chunk_bytes = self.sizeof(chunk)
+
+        # drop the chunks which are not ahead of the current one anymore
+        for j in list(self._pending.keys()):
+            if not (i < j <= i + self.config.lookahead):
+                self._pending.pop(j).cancel()
+
+        self.schedule(i)
+        return chunk
+
+
+    def schedule(self, i: int) -> None:
+        '''
+        Start loading the chunks following the chunk `i`.
+        '''
+        for j in range(i + 1, min(i + self.config.lookahead, self.num_chunks - 1) + 1):
+            if j in self._pending:
+                continue
+            if self.config.max_bytes is not None and \
+                (len(self._pending) + 2) * self._chunk_bytes > self.config.max_bytes: # the current chunk is also in memory
+                break
+            self._pending[j] = self.config.executor.submit(self.loader, j)
+
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
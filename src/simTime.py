@@ -32,6 +32,14 @@ class SimTime:
             raise ValueError(f"Timestamp {new_ts} must be greater than the current timestamp {self.__ts}.")
         self.__ts = new_ts
 
+    @property
+    def start(self) -> int:
+        return self.__start
+
+    @property
+    def end(self) -> int:
+        return self.__end
+
     def to_Timestamp(self) -> pd.Timestamp:
         return pd.Timestamp(self.__ts, unit='ms')
 
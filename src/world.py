@@ -1,25 +1,30 @@
+from typing import Dict, List, Optional
 
-from typing import List
-
+from src.dataconfig import DataConfig
 from src.event import Event
 from src.environment import Environment
 from src.backtest import Backtest
 from src.history import History
+from src.latency import InFlight, NetworkLatency
 from src.simTime import SimTime
 
 
 class World:
-    def __init__(self, path: str, max_interval: int = 2000) -> None:
+    def __init__(self, path: str, max_interval: int = 2000, data_config: Optional[DataConfig] = None, latency: Optional[Dict[str, NetworkLatency]] = None) -> None:
         self.events: List[Event] = []
+        self.in_flight: InFlight[Event] = InFlight()  # the events sent but not arrived yet
         self.path = path
         self.simTime = SimTime(0, 1)
         self.env = None
         self.max_interval = max_interval
+        self.data_config = data_config
+        self.latency = latency
 
 
     def run(self, backtest: Backtest) -> History:
         self.simTime = SimTime(backtest.start, backtest.end)
-        self.env = Environment(self.path, self.simTime, self.max_interval, backtest.initial_balance)
+        self.env = Environment(self.path, self.simTime, self.max_interval, backtest.initial_balance, self.data_config, self.latency)
+        self.in_flight = InFlight()
         
         history = History(backtest.hist_level)
         strategy = backtest.strategy
@@ -35,14 +40,29 @@ class World:
                 print(f'Backtest finished at {self.simTime}')
                 break
             
-            self.events.extend(strategy.eval(self.env))
-            
-            for event in self.events:
-                if event.execute(self.env):
-                    self.events.remove(event)
+            now = int(self.simTime)
+            for event in strategy.eval(self.env):
+                self.in_flight.push(event, now + event.delay(self.env))
+            self.__deliver(now)
             
-            self.env.eval()
+            # NOTICE: The events arriving between two steps are executed at their arrival times,
+            #         and the exchanges are evaluated at these times too.
+            next_ts = min(now + eval_step, backtest.end)
+            arrival = self.in_flight.next_arrival()
+            while arrival is not None and arrival < next_ts:
+                self.simTime.set(arrival)
+                self.__deliver(arrival)
+                arrival = self.in_flight.next_arrival()
             
-            self.simTime.add(eval_step)
+            self.simTime.set(next_ts)
         
-        return history
\ No newline at end of file
+        return history
+
+
+    def __deliver(self, ts: int) -> None:
+        # execute the events arrived by `ts`, then the events failed before; the events failing are retried
+        # at the next delivery while they may still succeed (e.g. a cancellation arrived before its order), and dropped otherwise
+        events = self.in_flight.pop_arrived(ts) + self.events
+        failed = [event for event in events if not event.execute(self.env)]
+        self.events = [event for event in failed if event.retry(self.in_flight)]
+        self.env.eval() # type: ignore
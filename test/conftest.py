@@ -0,0 +1,14 @@
+from pathlib import Path
+
+import pytest
+
+
+@pytest.fixture
+def data_root() -> Path:
+    # the data root bundled with the tests, with `books/TEST-USDT` and `books/TRIANGLE-USDT`
+    return Path(__file__).parent/'test_exchanges'
+
+
+@pytest.fixture
+def test_usdt_books(data_root: Path) -> Path:
+    return data_root/'books'/'TEST-USDT'
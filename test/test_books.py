@@ -1,7 +1,11 @@
 from pathlib import Path
 import sys
 sys.path.insert(0, sys.path[0]+"/../")
+import copy
+import math
 import os
+import pickle
+import random
 import shutil
 import tempfile
 
@@ -10,7 +14,8 @@ import pandas as pd
 from src.simTime import SimTime
 import pytest
 
-from src.books import Book, BookLevel, Asks, Bids
+from src.books import Book, BookCore, BookLevel, Asks, Bids, ArrayAsks, ArrayBids, tick_decimals, tick_units, to_ticks
+from src.keyframes import Keyframes, build_keyframes
 
 class TestBookLevel:
     def test_init(self):
@@ -93,6 +98,19 @@ class TestAsks:
         assert asks[0].amount == 20.0
         assert asks[0].count == 2
 
+    def test_delete_and_truncate(self):
+        asks = Asks(3)
+        for price in (103.0, 101.0, 102.0, 104.0): # 104.0 is beyond the max depth
+            asks.set(price, 1.0, 1)
+        assert [level.price for level in asks] == [101.0, 102.0, 103.0]
+        asks.set(100.0, 1.0, 1) # the worst level is dropped
+        assert [level.price for level in asks] == [100.0, 101.0, 102.0]
+        asks.set(105.0, 0.0, 0) # not in the book
+        asks.set(101.0, 0.0, 0)
+        assert [level.price for level in asks] == [100.0, 102.0]
+        asks.set(101.5, 2.0, 1)
+        assert [level.price for level in asks] == [100.0, 101.5, 102.0]
+
 
 class TestBids:
     def test_set(self):
@@ -127,6 +145,147 @@ class TestBids:
         assert bids[0].amount == 30.0
         assert bids[0].count == 3
 
+    def test_delete_and_truncate(self):
+        bids = Bids(3)
+        for price in (97.0, 99.0, 98.0, 96.0): # 96.0 is beyond the max depth
+            bids.set(price, 1.0, 1)
+        assert [level.price for level in bids] == [99.0, 98.0, 97.0]
+        bids.set(100.0, 1.0, 1) # the worst level is dropped
+        assert [level.price for level in bids] == [100.0, 99.0, 98.0]
+        bids.set(95.0, 0.0, 0) # not in the book
+        bids.set(99.0, 0.0, 0)
+        assert [level.price for level in bids] == [100.0, 98.0]
+        bids.set(98.5, 2.0, 1)
+        assert [level.price for level in bids] == [100.0, 98.5, 98.0]
+
+
+class TestArraySides:
+    def test_set(self):
+        rng = random.Random(0)
+        for list_side, array_side in ((Asks(20), ArrayAsks(20)), (Bids(20), ArrayBids(20))):
+            for _ in range(5000):
+                price = float(rng.randint(90, 130))
+                amount = rng.choice([0.0, float(rng.randint(1, 9))])
+                count = rng.randint(1, 5)
+                list_side.set(price, amount, count)
+                array_side.set(price, amount, count)
+                assert array_side == list_side
+                assert len(array_side) == len(list_side) <= 20
+            assert list(array_side) == list(list_side)
+            assert array_side[1:4] == list_side[1:4]
+            assert array_side[-1].true_eq(list_side[len(list_side) - 1])
+        
+        with pytest.raises(ValueError):
+            ArrayAsks().set(-1.0, 1.0, 1)
+        with pytest.raises(ValueError):
+            ArrayBids().set(1.0, -1.0, 1)
+        with pytest.raises(IndexError):
+            ArrayAsks()[0]
+
+
+    def test_top(self):
+        asks, bids = ArrayAsks(), ArrayBids()
+        for price in (103.0, 101.0, 102.0):
+            asks.set(price, price - 100, 1)
+            bids.set(price - 10, price - 100, 2)
+        assert asks.prices(2).tolist() == [101.0, 102.0]
+        assert asks.amounts().tolist() == [1.0, 2.0, 3.0]
+        assert bids.prices(5).tolist() == [93.0, 92.0, 91.0]
+        assert bids.counts(1).tolist() == [2]
+        
+        prices = asks.prices()
+        asks.set(101.0, 0.0, 0)
+        assert prices.tolist() == [101.0, 102.0, 103.0] # a copy
+        assert asks.prices().tolist() == [102.0, 103.0]
+
+
+class TestSnapshots:
+    def test_level_immutable(self):
+        level = BookLevel(100.0, 10.0, 1)
+        with pytest.raises(AttributeError):
+            level.amount = 5.0 # type: ignore
+        assert not hasattr(level, '__dict__')
+        assert pickle.loads(pickle.dumps(level)).true_eq(level)
+        assert copy.copy(level).true_eq(level)
+    
+    
+    @pytest.mark.parametrize('side_type', [Asks, Bids, ArrayAsks, ArrayBids])
+    def test_copy_on_write(self, side_type):
+        side = side_type()
+        side.set(100.0, 10.0, 1)
+        side.set(101.0, 10.0, 1)
+        snapshot = side.snapshot()
+        
+        side.set(100.0, 0.0, 0)
+        side.set(101.0, 20.0, 2)
+        assert len(side) == 1 and side[0] == (101.0, 20.0, 2)
+        assert len(snapshot) == 2 and snapshot[0].amount == 10.0 and snapshot[1].amount == 10.0
+        
+        with pytest.raises(Exception, match='read-only'):
+            snapshot.set(102.0, 1.0, 1)
+        
+        owned = snapshot.copy()
+        owned.set(102.0, 1.0, 1)
+        assert len(owned) == 3 and len(snapshot) == 2
+    
+    
+    def test_book_core(self):
+        core = BookCore('TEST-USDT')
+        core.set({'side': 'ask', 'price': 100.0, 'size': 1.0, 'numOrders': 1})
+        snapshot = core.snapshot()
+        asks = core.asks
+        core.set({'side': 'ask', 'price': 100.0, 'size': 2.0, 'numOrders': 1})
+        assert snapshot.asks[0].amount == asks[0].amount == 1.0
+        assert core.asks[0].amount == 2.0
+        with pytest.raises(Exception, match='read-only'):
+            snapshot.set({'side': 'ask', 'price': 101.0, 'size': 1.0, 'numOrders': 1})
+        
+        owned = snapshot.copy()
+        owned.set({'side': 'ask', 'price': 101.0, 'size': 1.0, 'numOrders': 1})
+        assert owned.depth_asks == 2 and snapshot.depth_asks == 1
+
+
+class TestTicks:
+    def test_tick_decimals(self):
+        assert tick_decimals(0.1) == 1
+        assert tick_decimals(0.25) == 2
+        assert tick_decimals(1.0) == 0
+        assert tick_decimals(0.00001) == 5
+    
+    
+    @pytest.mark.parametrize('tick_size', [0.1, 0.25, 0.01, 1.0, 5.0, 0.0001])
+    def test_to_ticks(self, tick_size):
+        # the same prices as rounding `ticks * tick_size` to the decimals of the tick size
+        decimals = tick_decimals(tick_size)
+        scale, units = tick_units(tick_size)
+        rng = random.Random(0)
+        for _ in range(10000):
+            price = rng.uniform(0.01, 100000)
+            ticks, rounded = to_ticks(price, tick_size, scale, units)
+            assert ticks == round(price / tick_size)
+            assert rounded == round(ticks * tick_size, decimals)
+    
+    
+    @pytest.mark.parametrize('side_type', [Asks, Bids, ArrayAsks, ArrayBids])
+    def test_set(self, side_type):
+        side = side_type(tick_size=0.1)
+        side.set(0.1 * 1001, 1.0, 1)   # 100.10000000000001
+        side.set(100.1, 2.0, 2)         # the same level
+        assert len(side) == 1
+        assert side[0] == (100.1, 2.0, 2)
+        side.set(100.09999999, 0.0, 0)
+        assert len(side) == 0
+        
+        rng = random.Random(0)
+        float_side = side_type(20)
+        tick_side = side_type(20, tick_size=0.1)
+        for _ in range(2000):
+            price = rng.randint(900, 1100) / 10
+            amount = rng.choice([0.0, float(rng.randint(1, 9))])
+            float_side.set(price, amount, 1)
+            tick_side.set(price, amount, 1)
+            assert tick_side == float_side
+
 
 def setup_book() -> Path:
     temp_dir = tempfile.mkdtemp()
@@ -173,6 +332,155 @@ def clear_book(path: Path) -> None:
     shutil.rmtree(path)
 
 
+class TestBatches:
+    @pytest.mark.parametrize('side_type', [Asks, Bids, ArrayAsks, ArrayBids])
+    @pytest.mark.parametrize('tick_size', [None, 0.1])
+    def test_set_many(self, side_type, tick_size):
+        random.seed(11)
+        for max_depth in (5, 20, 400): # the small depths truncate levels in between
+            merged = side_type(max_depth, tick_size)
+            sequential = side_type(max_depth, tick_size)
+            for _ in range(100):
+                batch = [(round(random.uniform(90, 110), 1), random.choice([0.0, 0.0, 1.0, 2.5]), random.randint(1, 3)) for _ in range(random.randint(1, 40))]
+                merged.set_many(*zip(*batch))
+                for price, amount, count in batch:
+                    sequential.set(price, amount, count)
+                assert merged == sequential and len(merged) == len(sequential)
+    
+    def test_apply_batch(self):
+        core = BookCore('TEST', check_instId=False)
+        core.apply_batch([1, 1, 0, 1], [10.0, 9.0, 11.0, 9.0], [1.0, 1.0, 2.0, 0.0], [1, 1, 1, 0])
+        assert [level.price for level in core.bids] == [10.0]
+        assert [level.price for level in core.asks] == [11.0]
+        with pytest.raises(Exception):
+            core.apply_batch([2], [10.0], [1.0], [1])
+
+
+class TestTopOfBook:
+    @pytest.mark.parametrize('array_sides', [False, True])
+    def test_top(self, array_sides):
+        core = BookCore('TEST', check_instId=False, array_sides=array_sides)
+        assert math.isnan(core.best_ask) and math.isnan(core.mid)
+        random.seed(5)
+        for _ in range(500):
+            side = random.choice(['ask', 'bid'])
+            price = round(random.uniform(100, 110) if side == 'ask' else random.uniform(90, 100), 1)
+            core.set({'side': side, 'price': price, 'size': random.choice([0.0, 1.0, 3.0]), 'numOrders': 1})
+            if random.random() < 0.1:
+                core.apply_batch([0, 1], [100.5, 99.5], [random.choice([0.0, 2.0])] * 2, [1, 1])
+            asks, bids = list(core.asks), list(core.bids)
+            if asks and bids:
+                ask, bid = asks[0], bids[0]
+                assert (core.best_ask, core.best_ask_size, core.best_bid, core.best_bid_size) == (ask.price, ask.amount, bid.price, bid.amount)
+                assert core.mid == (ask.price + bid.price) / 2
+                assert core.spread == ask.price - bid.price
+                assert core.microprice == pytest.approx((bid.price * ask.amount + ask.price * bid.amount) / (ask.amount + bid.amount))
+        
+        # the copies keep their own top of the book
+        copied = core.copy()
+        best_ask = core.best_ask
+        copied.set({'side': 'ask', 'price': best_ask, 'size': 0.0, 'numOrders': 0})
+        assert core.best_ask == best_ask and copied.best_ask != best_ask
+
+
+class TestDepthLimited:
+    @pytest.mark.parametrize('array_sides', [False, True])
+    @pytest.mark.parametrize('tick_size', [None, 0.1])
+    def test_top_levels(self, array_sides, tick_size):
+        random.seed(3)
+        full = BookCore('TEST', check_instId=False, array_sides=array_sides, tick_size=tick_size)
+        limited = BookCore('TEST', check_instId=False, array_sides=array_sides, tick_size=tick_size, depth=5)
+        for _ in range(300):
+            n = random.randint(1, 20)
+            prices = [round(random.uniform(100, 103), 1) for _ in range(n)]
+            sizes = [random.choice([0.0, 0.0, 1.0, 2.0]) for _ in range(n)]
+            sides = [0] * n
+            full.apply_batch(sides, prices, sizes, [1] * n)
+            limited.apply_batch(sides, prices, sizes, [1] * n)
+            assert list(limited.asks) == list(full.asks)[:5]
+            assert all(a.true_eq(b) for a, b in zip(limited.asks, full.asks))
+            assert limited.best_ask == full.best_ask or math.isnan(full.best_ask)
+        
+        copied = limited.copy()
+        assert list(copied.asks) == list(limited.asks)
+    
+    def test_fill_truncated(self):
+        core = BookCore('TEST', check_instId=False, depth=2)
+        core.apply_batch([0, 0, 0], [100.0, 101.0, 102.0], [1.0, 1.0, 1.0], [1, 1, 1])
+        assert core.depth_asks == 2
+        assert not core.fill_truncated('ask', 2.0)
+        assert core.fill_truncated('ask', 2.5)
+        # a limit order only takes the levels up to its price
+        assert not core.fill_truncated('ask', 2.5, 101.0)
+        assert core.fill_truncated('ask', 2.5, 101.5)
+        assert not core.fill_truncated('ask', 2.0, 101.5)
+        core.set({'side': 'ask', 'price': 100.0, 'size': 0.0, 'numOrders': 0})
+        assert [level.price for level in core.asks] == [101.0, 102.0] # refilled from the shadow store
+        assert not core.fill_truncated('ask', 2.5) # no level is hidden
+        assert not BookCore('TEST').fill_truncated('ask', 100.0)
+    
+    def test_book(self, test_usdt_books: Path):
+        simTime = SimTime(0, 628000)
+        path = test_usdt_books
+        book = Book('TEST-USDT', simTime, path)
+        limited = Book('TEST-USDT', simTime, path, depth=3)
+        for ts in range(0, 628001, 500):
+            if ts > 0:
+                simTime.set(ts)
+            assert limited.asks == book.asks[:3] and len(limited.asks) == min(3, len(book.asks))
+            assert limited.bids == book.bids[:3] and len(limited.bids) == min(3, len(book.bids))
+
+
+class TestCumulativeDepth:
+    @staticmethod
+    def walk(side, amount):
+        # walk the levels one by one as the exchange used to do
+        prices, amounts = [], []
+        for bl in side:
+            if amount == 0:
+                break
+            exec_amount = min(amount, bl.amount)
+            prices.append(bl.price)
+            amounts.append(exec_amount)
+            amount -= exec_amount
+        return prices, amounts
+    
+    @pytest.mark.parametrize('side_type', [Asks, Bids, ArrayAsks, ArrayBids])
+    def test_fills(self, side_type):
+        random.seed(7)
+        side = side_type(50)
+        for _ in range(200):
+            side.set(round(random.uniform(90, 110), 1), random.choice([0.0, 0.5, 1.0, 2.5]), 1)
+        total = sum(bl.amount for bl in side)
+        for amount in [0.0, 0.1, 0.5, 1.0, 3.0, 7.25, total, total + 1]:
+            prices, amounts = side.fills(amount)
+            assert (prices.tolist(), amounts.tolist()) == self.walk(side, amount)
+    
+    def test_cost_to_trade(self):
+        asks = Asks()
+        assert asks.cost_to_trade(1.0) == (0.0, 0.0)
+        asks.set(100.0, 1.0, 1)
+        asks.set(101.0, 2.0, 1)
+        assert asks.cost_to_trade(0.5) == (0.5, 50.0)
+        assert asks.cost_to_trade(2.0) == (2.0, 201.0)
+        assert asks.cost_to_trade(5.0) == (3.0, 302.0) # not enough liquidity
+        
+        # the cumulative depth is rebuilt after the book changes
+        asks.set(99.0, 1.0, 1)
+        assert asks.cost_to_trade(2.0) == (2.0, 199.0)
+        snapshot = asks.snapshot()
+        asks.set(99.0, 0.0, 1)
+        assert asks.cost_to_trade(2.0) == (2.0, 201.0)
+        assert snapshot.cost_to_trade(2.0) == (2.0, 199.0)
+        
+        core = BookCore('TEST', check_instId=False)
+        core.set({'side': 'bid', 'price': 10.0, 'size': 1.0, 'numOrders': 1})
+        core.set({'side': 'bid', 'price': 9.0, 'size': 1.0, 'numOrders': 1})
+        assert core.cost_to_trade('bid', 1.5) == (1.5, 14.5)
+        with pytest.raises(Exception):
+            core.cost_to_trade('buy', 1.0)
+
+
 class TestBook:
     def test_init(self):
         path = setup_book()
@@ -940,5 +1248,73 @@ class TestBook:
         assert book.bids[3] == (1011.9, 1, 1)
         assert book.bids[4] == (1010.9, 1, 1)
 
+    def test_replay_matches_rows(self, test_usdt_books: Path):
+        simTime = SimTime(0, 628000)
+        path = test_usdt_books
+        book = Book('TEST-USDT', simTime, path)
+        
+        # replay the same rows one by one as the reference
+        df = pd.read_parquet(next(path.glob('part-*-*-*.parquet')))
+        core = BookCore('TEST-USDT')
+        i = 0
+        for ts in range(0, 628001, 500):
+            if ts > 0:
+                simTime.set(ts)
+            while i < len(df) and df['timestamp'].iloc[i] <= ts:
+                core.set(dict(df.iloc[i]))
+                i += 1
+            assert book.asks == core.asks
+            assert book.bids == core.bids
+    def test_gap_policy(self):
+        path = setup_book()
+        for policy in ('raise', 'ignore', 'skip', 'stale'):
+            st = SimTime(1687420840901, 1687420841301)
+            book = Book('1INCH-USDT-SWAP', st, path, max_interval=50, gap_policy=policy) # type: ignore
+            assert len(book.chunked_data.gaps) == 2
+            st.set(1687420841201)
+            if policy == 'raise':
+                with pytest.raises(Exception, match='exceeds the maximum interval'):
+                    book.update()
+                continue
+            if policy == 'skip': # no keyframe after the gaps
+                assert len(book.asks) == 0 and len(book.bids) == 0
+                assert math.isnan(book.best_ask)
+                assert not book.stale
+                continue
+            reference = Book('1INCH-USDT-SWAP', SimTime(1687420841201, 1687420841301), path)
+            assert book.asks == reference.asks
+            assert book.bids == reference.bids
+            assert book.stale == (policy == 'stale')
+            st.set(1687420841301)
+            assert not book.stale
+        
+        with pytest.raises(ValueError):
+            Book('1INCH-USDT-SWAP', SimTime(1687420840901, 1687420841201), path, gap_policy='drop') # type: ignore
+        clear_book(path)
+
+    def test_skip_gap(self, tmp_path: Path, test_usdt_books: Path):
+        # shift the rows from 300000 to open a gap (299000, 350000) in the data
+        df = pd.read_parquet(next(test_usdt_books.glob('part-*-*-*.parquet')))
+        df.loc[df['timestamp'] >= 300000, 'timestamp'] += 50000
+        chunk = tmp_path/'part-0-0-678000.parquet'
+        df.to_parquet(chunk, index=False)
+        build_keyframes(chunk, every_rows=1500)
+        keyframes = Keyframes.load(chunk)
+        resume_ts = next(ts for ts in keyframes.timestamps if ts > 299000) # type: ignore
+        assert resume_ts > 350000
+        
+        st = SimTime(290000, 678000)
+        book = Book('TEST-USDT', st, tmp_path, max_interval=10000, gap_policy='skip')
+        reference_time = SimTime(290000, 678000)
+        reference = Book('TEST-USDT', reference_time, tmp_path, max_interval=10000, gap_policy='ignore')
+        for ts in range(291000, resume_ts + 20000, 1000):
+            st.set(ts)
+            reference_time.set(ts)
+            if 299000 + 10000 < ts < resume_ts: # inside the gap or before the next keyframe
+                assert len(book.asks) == 0 and len(book.bids) == 0
+            else:
+                assert book.asks == reference.asks
+                assert book.bids == reference.bids
+
 if __name__ == "__main__":
     pytest.main()
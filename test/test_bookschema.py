@@ -0,0 +1,57 @@
+from pathlib import Path
+import shutil
+import sys
+sys.path.insert(0, sys.path[0]+"/../")
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from src.bookcore import SIDE_ASK, SIDE_BID, SIDES
+from src.books import Book
+from src.bookschema import ACTIONS, compact_chunk, compact_table, decode_codes
+from src.simTime import SimTime
+
+
+class TestBookSchema:
+    def test_decode_codes(self):
+        assert decode_codes(pa.array(['ask', 'bid', 'ask']), SIDES).tolist() == [SIDE_ASK, SIDE_BID, SIDE_ASK]
+        assert decode_codes(pa.array(['bid', 'ask']).dictionary_encode(), SIDES).tolist() == [SIDE_BID, SIDE_ASK]
+        assert decode_codes(pa.array([1, 0], pa.int8()), SIDES).tolist() == [1, 0]
+        assert decode_codes(pa.array(['ask', 'foo']), SIDES).tolist() == [SIDE_ASK, -1]
+
+
+    def test_compact_table(self, test_usdt_books: Path):
+        source = next(test_usdt_books.glob('part-*-*-*.parquet'))
+        table = pq.read_table(source)
+        compact = compact_table(table)
+        assert 'instId' not in compact.column_names
+        assert compact.schema.field('side').type == pa.int8()
+        assert compact.schema.field('action').type == pa.int8()
+        assert compact.schema.field('numOrders').type == pa.int32()
+        assert compact.schema.field('size').type == pa.float64()
+        assert [SIDES[i] for i in compact.column('side').to_pylist()] == table.column('side').to_pylist()
+        assert [ACTIONS[i] for i in compact.column('action').to_pylist()] == table.column('action').to_pylist()
+        assert compact_table(table, float32_sizes=True).schema.field('size').type == pa.float32()
+
+        with pytest.raises(Exception, match='Invalid side'):
+            compact_table(table.set_column(table.schema.get_field_index('side'), 'side', pa.array(['foo'] * table.num_rows)))
+
+
+    def test_book(self, tmp_path: Path, test_usdt_books: Path):
+        for source in test_usdt_books.glob('part-*-*-*.parquet'):
+            shutil.copy(source, tmp_path/source.name)
+            compact_chunk(tmp_path/source.name)
+
+        st = SimTime(0, 628000)
+        book = Book('TEST-USDT', st, test_usdt_books)
+        compact = Book('TEST-USDT', st, tmp_path)
+        # both layouts are decoded to the same compact arrays
+        assert compact.chunked_data.nbytes == book.chunked_data.nbytes == 30 * len(book.chunked_data)
+        assert compact.chunked_data.side.dtype == book.chunked_data.side.dtype == np.int8
+        for ts in range(0, 628001, 4000):
+            if ts > 0:
+                st.set(ts)
+            assert book.asks == compact.asks
+            assert book.bids == compact.bids
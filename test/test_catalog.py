@@ -0,0 +1,56 @@
+from pathlib import Path
+import shutil
+import sys
+sys.path.insert(0, sys.path[0]+"/../")
+
+import pytest
+
+from src.catalog import MANIFEST_NAME, Catalog
+from src.chunkindex import ChunkIndex
+from src.instrument import Instrument, Pair
+from src.marketdata import MarketData
+from src.simTime import SimTime
+
+
+class TestCatalog:
+    def test_scan(self, data_root: Path):
+        catalog = Catalog.scan(data_root)
+        assert catalog.has('books', 'TEST-USDT')
+        assert catalog.has('books', 'TRIANGLE-USDT')
+        assert not catalog.has('markprices', 'TEST-USDT')
+        assert not catalog.has('books', 'FOO-USDT')
+        assert catalog.schemas['books']['timestamp'] == 'int64'
+
+        index = catalog.index('books', 'TRIANGLE-USDT')
+        glob_index = ChunkIndex(data_root/'books'/'TRIANGLE-USDT')
+        assert index.starts == glob_index.starts
+        assert index.ends == glob_index.ends
+        assert [Path(file) for file in index.files] == [Path(file) for file in glob_index.files]
+        assert all(num_rows is not None and num_rows > 0 for num_rows in index.num_rows)
+
+        with pytest.raises(Exception, match='No index files found'):
+            catalog.index('markprices', 'TEST-USDT')
+
+
+    def test_manifest(self, tmp_path: Path, data_root: Path):
+        shutil.copytree(data_root/'books', tmp_path/'books')
+        catalog = Catalog.scan(tmp_path)
+        assert catalog.write() == tmp_path/MANIFEST_NAME
+
+        # the manifest is used even when the files are gone
+        shutil.rmtree(tmp_path/'books'/'TEST-USDT')
+        loaded = Catalog.load(tmp_path)
+        assert loaded.feeds == catalog.feeds
+        assert loaded.schemas == catalog.schemas
+        assert loaded.has('books', 'TEST-USDT')
+
+
+    def test_marketdata(self, tmp_path: Path, data_root: Path):
+        shutil.copytree(data_root/'books', tmp_path/'books')
+        Catalog.scan(tmp_path).write()
+        marketData = MarketData(SimTime(0, 628000), tmp_path)
+        inst = Instrument(Pair('TEST', 'USDT'), 'TEST-USDT', 'SWAP')
+        assert marketData.has('books', inst)
+        assert marketData.has('mabidasks', inst)
+        assert not marketData.has('markprices', inst)
+        assert marketData['books'][inst].index.num_rows[0] is not None
@@ -0,0 +1,85 @@
+import os
+from pathlib import Path
+import sys
+sys.path.insert(0, sys.path[0]+"/../")
+
+import pyarrow.parquet as pq
+
+from src.books import Book
+from src.chunkcache import ChunkCache, read_chunk, select_row_groups, write_chunk
+from src.simTime import SimTime
+
+
+class TestChunkCache:
+    def test_read(self, tmp_path: Path, test_usdt_books: Path):
+        source = next(test_usdt_books.glob('part-*-*-*.parquet'))
+        cache = ChunkCache(tmp_path/'cache')
+
+        cold = cache.read(source)
+        cached_files = list((tmp_path/'cache').glob('*.arrow'))
+        assert len(cached_files) == 1
+        warm = cache.read(source)
+        assert cold.equals(warm)
+        assert warm.equals(pq.read_table(source))
+        assert read_chunk(source).equals(warm)
+
+
+    def test_invalidate(self, tmp_path: Path, test_usdt_books: Path):
+        source = tmp_path/'part-0-0-628000.parquet'
+        source.write_bytes(next(test_usdt_books.glob('part-*-*-*.parquet')).read_bytes())
+        cache = ChunkCache(tmp_path/'cache')
+        first = cache.cached_path(source)
+        cache.read(source)
+
+        os.utime(source, ns=(0, 0))
+        assert cache.cached_path(source) != first
+
+
+    def test_book(self, tmp_path: Path, test_usdt_books: Path):
+        st = SimTime(0, 628000)
+        book = Book('TEST-USDT', st, test_usdt_books)
+        cached = Book('TEST-USDT', st, test_usdt_books, cache=ChunkCache(tmp_path))
+        warm = Book('TEST-USDT', st, test_usdt_books, cache=ChunkCache(tmp_path))
+
+        for ts in range(0, 628001, 4000):
+            if ts > 0:
+                st.set(ts)
+            assert book.asks == cached.asks == warm.asks
+            assert book.bids == cached.bids == warm.bids
+
+
+    def test_row_groups(self, tmp_path: Path, test_usdt_books: Path):
+        source = next(test_usdt_books.glob('part-*-*-*.parquet'))
+        path = tmp_path/source.name
+        write_chunk(pq.read_table(source).to_pandas(), path, row_group_size=1000)
+        metadata = pq.read_metadata(path)
+        assert metadata.num_row_groups > 2
+
+        row_groups = select_row_groups(metadata, 300000, 310000, keep_first=True)
+        assert row_groups is not None
+        assert row_groups[0] == 0 and len(row_groups) < metadata.num_row_groups
+        assert row_groups == sorted(row_groups)
+
+        full = pq.read_table(path).column('timestamp').to_numpy()
+        needed = full[(full >= full[full <= 300000].max()) & (full <= 310000)]
+        for cache in (None, ChunkCache(tmp_path/'cache')):
+            table = read_chunk(path, cache, 300000, 310000, keep_first=True)
+            timestamp = table.column('timestamp').to_numpy()
+            assert table.num_rows < metadata.num_rows
+            assert timestamp[0] == full[0]
+            assert (timestamp[1:] >= timestamp[:-1]).all()
+            assert set(needed) <= set(timestamp)
+
+
+    def test_book_row_groups(self, tmp_path: Path, test_usdt_books: Path):
+        for source in test_usdt_books.glob('part-*-*-*.parquet'):
+            write_chunk(pq.read_table(source).to_pandas(), tmp_path/source.name, row_group_size=1000)
+
+        st = SimTime(0, 628000)
+        book = Book('TEST-USDT', st, test_usdt_books)
+        pruned = Book('TEST-USDT', st, tmp_path)
+        for ts in range(0, 628001, 4000):
+            if ts > 0:
+                st.set(ts)
+            assert book.asks == pruned.asks
+            assert book.bids == pruned.bids
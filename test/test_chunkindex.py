@@ -0,0 +1,63 @@
+from pathlib import Path
+import sys
+sys.path.insert(0, sys.path[0]+"/../")
+
+import pytest
+
+from src.chunkindex import ChunkIndex
+
+
+def touch_chunks(path: Path, periods) -> None:
+    for i, (start, end) in enumerate(periods):
+        (path/f'part-{i}-{start}-{end}.parquet').touch()
+
+
+class TestChunkIndex:
+    def test_find(self, tmp_path: Path):
+        touch_chunks(tmp_path, [(2000, 2999), (0, 999), (1000, 1999)])
+        index = ChunkIndex(tmp_path)
+
+        assert len(index) == 3
+        assert index.starts == [0, 1000, 2000]
+        assert index.ends == [999, 1999, 2999]
+        assert index.find(0) == 0
+        assert index.find(999) == 0
+        assert index.find(1000) == 1
+        assert index.find(2999) == 2
+        assert index.find(3000) == -1
+        assert index.find(-1) == -1
+        assert index[1][0].endswith('part-2-1000-1999.parquet')
+
+
+    def test_seek(self, tmp_path: Path):
+        touch_chunks(tmp_path, [(0, 999), (5000, 5999)])
+        index = ChunkIndex(tmp_path)
+
+        with pytest.raises(Exception):
+            index.seek(3000, -1)
+        assert index.seek(500, -1) == 0
+        assert index.seek(3000, 0) == 0 # keep the current chunk in the gap
+        assert index.seek(5500, 0) == 1
+
+
+    def test_validate(self, tmp_path: Path):
+        with pytest.raises(Exception, match='No index files found'):
+            ChunkIndex(tmp_path)
+
+        touch_chunks(tmp_path, [(0, 999), (1100, 1999), (5000, 5999)])
+        index = ChunkIndex(tmp_path, max_gap=200)
+        assert index.gaps == [(1999, 5000)]
+
+        (tmp_path/'part-3-1500-2500.parquet').touch()
+        with pytest.raises(Exception, match='overlap'):
+            ChunkIndex(tmp_path)
+
+
+    def test_boundary(self, tmp_path: Path):
+        touch_chunks(tmp_path, [(0, 999), (1000, 1999)])
+        assert ChunkIndex(tmp_path).find(1000) == 1
+
+        # the chunks sharing a boundary timestamp are rejected
+        (tmp_path/'part-2-1999-2999.parquet').touch()
+        with pytest.raises(Exception, match=r'overlap at \(1999, 1999\)'):
+            ChunkIndex(tmp_path)
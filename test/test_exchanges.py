@@ -1,3 +1,4 @@
+import math
 from math import isclose
 from distutils import dir_util
 import os
@@ -7,6 +8,8 @@ sys.path.insert(0, sys.path[0]+"/../")
 
 import pytest
 
+from src.books import Book
+from src.dataconfig import DataConfig
 from src.history import History
 from src.instrument import Instrument, InstType, Pair
 from src.order import Order, orderAction, orderSide, orderStatus, orderType
@@ -430,3 +433,227 @@ def test_case3(datadir: Path) -> None:
     # hist.save('./out/test_case3.json')
 
 
+
+# test spot limit orders
+def test_limit_orders(datadir: Path) -> None:
+    original_USDT = 200000
+    simTime = SimTime(0, 999000)
+    exch = Exchange(
+        datadir, simTime,
+        initial_balance= {
+            'USDT': original_USDT
+        },
+        max_interval=10_000,
+        )
+    inst = Instrument(
+        Pair('TRIANGLE', 'USDT'),
+        'TRIANGLE-USDT',
+        InstType.SPOT,
+        0,
+        999000,
+        0.1,
+        0.1,
+    )
+    
+    # ts: 0 | 901.0:899.0
+    # the part crossing the book is filled at once as a taker, the rest rests at 902.5
+    buy = Order(inst, orderType.LIMIT, orderSide.BUYLONG, simTime, amount=3, price=902.5)
+    exch.add_order(buy)
+    exch.eval()
+    correct_balance_USDT = original_USDT - 901.0 - 902.0
+    correct_balance_TRIANGLE = 2 * (1 - 0.0010)
+    assert buy.status == orderStatus.OPEN and buy.leftAmount == 1
+    assert exch.balance['USDT'] == correct_balance_USDT
+    assert exch.balance['TRIANGLE'] == correct_balance_TRIANGLE
+    
+    # a resting order never crossed is cancelled
+    never = Order(inst, orderType.LIMIT, orderSide.SELLSHORT, simTime, amount=0.5, price=2000)
+    exch.add_order(never)
+    exch.eval()
+    assert never.status == orderStatus.OPEN and len(never.detail) == 0
+    assert exch.cancel_order(str(never.uuid))
+    assert never.status == orderStatus.CANCELED
+    assert not exch.cancel_order('unknown')
+    
+    # ts: 100000 | 1021.1:1019.1
+    simTime.set(100000)
+    sell = Order(inst, orderType.LIMIT, orderSide.SELLSHORT, simTime, amount=1, price=1080)
+    exch.add_order(sell)
+    exch.eval()
+    assert sell.status == orderStatus.OPEN and len(sell.detail) == 0
+    
+    # ts: 177000 | 1088.4:1086.4, the resting sell order is filled at its price as a maker
+    simTime.set(177000)
+    exch.eval()
+    correct_balance_USDT += 1080 * (1 - 0.0008)
+    correct_balance_TRIANGLE -= 1
+    assert sell.status == orderStatus.CLOSED
+    assert exch.balance['USDT'] == correct_balance_USDT
+    assert exch.balance['TRIANGLE'] == correct_balance_TRIANGLE
+    
+    for ts in (277000, 377000, 677000):
+        simTime.set(ts)
+        exch.eval()
+        assert buy.leftAmount == 1
+    
+    # ts: 999000 | 901.0:899.0, the rest of the buy order is filled as a maker
+    simTime.set(999000)
+    exch.eval()
+    correct_balance_USDT -= 902.5
+    correct_balance_TRIANGLE += 1 * (1 - 0.0008)
+    assert buy.status == orderStatus.CLOSED
+    assert [(d.price, d.amount) for d in buy.detail] == [(901.0, 1.0), (902.0, 1.0), (902.5, 1.0)]
+    assert exch.balance['USDT'] == correct_balance_USDT
+    assert exch.balance['TRIANGLE'] == correct_balance_TRIANGLE
+    assert never.status == orderStatus.CANCELED
+
+# test the fills of the resting orders between two steps
+@pytest.mark.parametrize('intra_step_fills', [False, True])
+def test_intra_step_fills(datadir: Path, intra_step_fills: bool) -> None:
+    simTime = SimTime(0, 999000)
+    exch = Exchange(
+        datadir, simTime,
+        initial_balance= {
+            'USDT': 0,
+            'TRIANGLE': 10,
+        },
+        max_interval=10_000,
+        data_config=DataConfig(intra_step_fills=intra_step_fills),
+        )
+    inst = Instrument(Pair('TRIANGLE', 'USDT'), 'TRIANGLE-USDT', InstType.SPOT, 0, 999000, 0.1, 0.1)
+    
+    # ts: 100000 | 1021.1:1019.1
+    simTime.set(100000)
+    sell = Order(inst, orderType.LIMIT, orderSide.SELLSHORT, simTime, amount=0.5, price=1080)
+    exch.add_order(sell)
+    exch.eval()
+    
+    # ts: 200000 | 1060.8:1058.8, the bids reached 1080 at about 177000 in between
+    simTime.set(200000)
+    exch.eval()
+    if not intra_step_fills:
+        assert sell.status == orderStatus.OPEN and len(sell.detail) == 0
+        return
+    
+    # the first time when the best bid reached 1080, with the steps of 1 second
+    reference = Book('TRIANGLE-USDT', SimTime(100000, 200000), datadir/'books'/'TRIANGLE-USDT', 10_000)
+    for ts in range(101000, 200001, 1000):
+        reference.simTime.set(ts)
+        if reference.best_bid >= 1080:
+            break
+    assert sell.status == orderStatus.CLOSED
+    assert len(sell.detail) == 1
+    assert ts - 1000 < sell.detail[0].ts <= ts
+    assert sell.detail[0].price == 1080
+    assert exch.balance['USDT'] == 1080 * 0.5 * (1 - 0.0008)
+
+# test the archive of the orders not open anymore
+def test_order_archive(datadir: Path, tmp_path: Path) -> None:
+    simTime = SimTime(0, 999000)
+    exch = Exchange(
+        datadir, simTime,
+        initial_balance= {
+            'USDT': 200000
+        },
+        max_interval=10_000,
+        archive_dir=tmp_path/'archive',
+        )
+    exch.archive.max_rows = 2
+    inst = Instrument(Pair('TRIANGLE', 'USDT'), 'TRIANGLE-USDT', InstType.SPOT, 0, 999000, 0.1, 0.1)
+    
+    # ts: 0 | 901.0:899.0
+    market = Order(inst, orderType.MARKET, orderSide.BUYLONG, simTime, amount=1)
+    limit = Order(inst, orderType.LIMIT, orderSide.BUYLONG, simTime, amount=1, price=800)
+    cancelled = Order(inst, orderType.LIMIT, orderSide.SELLSHORT, simTime, amount=0.5, price=2000)
+    for order in (market, limit, cancelled):
+        exch.add_order(order)
+    exch.eval()
+    assert market.status == orderStatus.CLOSED
+    assert exch.orders == [limit, cancelled]
+    assert len(exch.archive) == 1
+    assert [o['uuid'] for o in exch.as_dict()['orders']] == [str(o.uuid) for o in (market, limit, cancelled)]
+    
+    h = hash(exch)
+    assert exch.cancel_order(str(cancelled.uuid))
+    simTime.set(1000)
+    exch.eval()
+    assert hash(exch) != h
+    assert exch.orders == [limit]
+    assert len(exch.archive) == 2
+    assert (tmp_path/'archive'/'orders-0.parquet').exists()   # spilled at 2 orders
+    assert [o['uuid'] for o in exch.as_dict()['orders']] == [str(o.uuid) for o in (cancelled, limit)]
+    
+    h = hash(exch)
+    simTime.set(2000)
+    exch.eval()
+    assert hash(exch) == h
+    assert [o['uuid'] for o in exch.as_dict()['orders']] == [str(limit.uuid)]
+    
+    # the archived orders are still known and queryable
+    assert exch.cancel_order(str(market.uuid))
+    assert not exch.cancel_order('unknown')
+    archived = exch.archive.get(str(market.uuid))
+    expected = market.as_dict()
+    expected['simTime'] = 0
+    assert archived == expected
+    assert exch.archive.get(str(cancelled.uuid))['status'] == 'CANCELED'
+    assert exch.archive.status(str(cancelled.uuid)) == 'CANCELED'
+    assert str(market.uuid) in exch.archive and str(limit.uuid) not in exch.archive
+    assert exch.archive.get(str(limit.uuid)) is None
+    assert exch.archive.orders().column('uuid').to_pylist() == [str(market.uuid), str(cancelled.uuid)]
+    assert exch.archive.fills().num_rows == len(market.detail)
+
+# test the liquidation by the liquidation prices
+@pytest.mark.parametrize('leverage, liquidated_at', [(50, (14000, 329000)), (20, (46000, 360000))])
+def test_liquidation_price(datadir: Path, leverage: int, liquidated_at: tuple) -> None:
+    simTime = SimTime(0, 628000)
+    exch = Exchange(
+        datadir, simTime,
+        initial_balance= {
+            'USDT': 200
+        },
+        max_interval=10_000_000,
+        )
+    inst = Instrument(Pair('TEST','USDT'), 'TEST-USDT', InstType.FUTURES, 0, 628000, 0.1, 0.1)
+    for side in (orderSide.SELLSHORT, orderSide.BUYLONG):
+        exch.add_order(Order(inst, orderType.MARKET, side, simTime, 2, leverage=leverage, action=orderAction.OPEN))
+    exch.eval()
+    short = exch.positions[(inst, PosDirection.SELLSHORT, leverage)]
+    long = exch.positions[(inst, PosDirection.BUYLONG, leverage)]
+    
+    closed_at = {}
+    while simTime < 627000:
+        simTime.add(1000)
+        for pos in (short, long):
+            if pos.OPEN_NUM > 0:
+                # the threshold never misses a position to liquidate
+                assert pos.may_liquidate(pos.mark_price) or pos.MarginRate > 1.0
+                assert (pos in exch.positions.liquidation_candidates()) == pos.may_liquidate(pos.mark_price)
+        exch.eval()
+        for pos in (short, long):
+            if pos.OPEN_NUM == 0 and pos.direct not in closed_at:
+                closed_at[pos.direct] = int(simTime)
+                assert math.isnan(pos.LiqPx)
+    assert (closed_at[PosDirection.SELLSHORT], closed_at[PosDirection.BUYLONG]) == liquidated_at
+
+# test the depth limit guard of the limit orders
+def test_limit_order_depth(datadir: Path) -> None:
+    simTime = SimTime(0, 999000)
+    exch = Exchange(
+        datadir, simTime,
+        initial_balance= {
+            'USDT': 200000
+        },
+        max_interval=10_000,
+        data_config=DataConfig(depth=1),
+        )
+    inst = Instrument(Pair('TRIANGLE', 'USDT'), 'TRIANGLE-USDT', InstType.SPOT, 0, 999000, 0.1, 0.1)
+    book = exch.marketData['books'][inst] # type: ignore
+    
+    # ts: 0 | 901.0:899.0, only the best level is maintained
+    exch.add_order(Order(inst, orderType.LIMIT, orderSide.BUYLONG, simTime, amount=3, price=901))
+    exch.eval()
+    assert book.truncated_fills == 0
+    exch.add_order(Order(inst, orderType.LIMIT, orderSide.BUYLONG, simTime, amount=3, price=902.5))
+    exch.eval()
+    assert book.truncated_fills == 1
@@ -0,0 +1,132 @@
+import gzip
+import json
+from pathlib import Path
+import random
+import sys
+sys.path.insert(0, sys.path[0]+"/../")
+
+import pytest
+
+from src.bookcore import SIDE_ASK, SIDE_BID, BookCore
+from src.books import Book
+from src.catalog import Catalog
+from src.chunkindex import ChunkIndex
+from src.ingest import ChunkWriter, ingest, iter_messages
+from src.simTime import SimTime
+
+
+def make_messages(instId: str, start: int, num: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    levels = lambda n, base: [[f'{base + i:.1f}', f'{rng.randint(1, 9)}', '0', f'{rng.randint(1, 3)}'] for i in range(n)]
+    messages = [{'instId': instId, 'action': 'snapshot', 'ts': str(start), 'asks': levels(20, 1001), 'bids': levels(20, 980)}]
+    for k in range(1, num):
+        ts = start + k * 100
+        if k == num // 2: # the exchange resets the book with fewer levels
+            messages.append({'instId': instId, 'action': 'snapshot', 'ts': str(ts), 'asks': levels(5, 1003), 'bids': levels(5, 990)})
+            continue
+        asks = [[f'{rng.randint(1001, 1025):.1f}', f'{rng.choice([0, rng.randint(1, 9)])}', '0', '1'] for _ in range(rng.randint(0, 3))]
+        bids = [[f'{rng.randint(975, 999):.1f}', f'{rng.choice([0, rng.randint(1, 9)])}', '0', '1'] for _ in range(rng.randint(0, 3))]
+        messages.append({'instId': instId, 'action': 'update', 'ts': str(ts), 'asks': asks, 'bids': bids})
+    return messages
+
+
+def replay(messages: list, ts: int) -> BookCore:
+    core = BookCore('', check_instId=False)
+    for message in messages:
+        if int(message['ts']) > ts:
+            break
+        if message['action'] == 'snapshot':
+            core = BookCore('', check_instId=False)
+        for side, key in ((SIDE_ASK, 'asks'), (SIDE_BID, 'bids')):
+            levels = message[key]
+            core.set_many([side] * len(levels), [float(l[0]) for l in levels], [float(l[1]) for l in levels], [int(l[-1]) for l in levels])
+    return core
+
+
+class TestIngest:
+    def test_iter_messages(self, tmp_path: Path):
+        messages = make_messages('TEST-USDT', 0, 10)
+        text = '\n'.join(json.dumps(message) for message in messages) + '\n'
+        (tmp_path/'dump.data').write_text(text)
+        with gzip.open(tmp_path/'dump.data.gz', 'wt') as f:
+            f.write(text)
+        assert list(iter_messages(tmp_path/'dump.data')) == messages
+        assert list(iter_messages(tmp_path/'dump.data.gz')) == messages
+
+
+    def test_chunk_writer(self, tmp_path: Path):
+        with pytest.raises(Exception, match='must begin with a snapshot'):
+            ChunkWriter('TEST-USDT', tmp_path).write({'instId': 'TEST-USDT', 'action': 'update', 'ts': '0', 'asks': [], 'bids': []})
+
+
+    def test_ingest(self, tmp_path: Path):
+        messages = make_messages('TEST-USDT', 0, 400)
+        other = make_messages('TEST-USDT', 50000, 400, seed=1) # the next dump of the same instrument
+        for name, dump in (('day0', messages), ('day1', other)):
+            with gzip.open(tmp_path/f'{name}.data.gz', 'wt') as f:
+                f.write('\n'.join(json.dumps(message) for message in dump))
+
+        files = ingest([tmp_path/'day0.data.gz', tmp_path/'day1.data.gz'], tmp_path/'data', chunk_ms=7000, max_workers=2)
+        assert len(files) > 2
+        catalog = Catalog.load(tmp_path/'data')
+        assert len(catalog.chunks('books', 'TEST-USDT')) == len(files)
+
+        st = SimTime(0, 89900)
+        book = Book('TEST-USDT', st, tmp_path/'data'/'books'/'TEST-USDT', max_interval=10000)
+        for ts in range(0, 89901, 300):
+            if ts > 0:
+                st.set(ts)
+            expected = replay(messages if ts < 50000 else other, ts)
+            assert book.asks == expected.asks
+            assert book.bids == expected.bids
+
+
+    def test_late_messages(self, tmp_path: Path):
+        message = lambda ts, action, asks: {'instId': 'TEST-USDT', 'action': action, 'ts': str(ts), 'asks': asks, 'bids': [['990.0', '1', '0', '1']] if action == 'snapshot' else []}
+        messages = [
+            message(1000, 'snapshot', [['1001.0', '1', '0', '1']]),
+            message(3599000, 'update', [['1002.0', '2', '0', '1']]),
+            message(3600500, 'update', [['1003.0', '3', '0', '1']]),
+            message(3599900, 'update', [['1003.0', '4', '0', '1']]),   # late, from the previous hour
+            message(3601000, 'update', [['1004.0', '5', '0', '1']]),
+            message(3600800, 'update', [['1004.0', '6', '0', '1']]),   # late, within the hour
+        ]
+        writer = ChunkWriter('TEST-USDT', tmp_path/'books'/'TEST-USDT', chunk_ms=3600000)
+        for m in messages:
+            writer.write(m)
+        writer.flush()
+        assert [file.name for file in writer.files] == ['part-0-1000-3599000.parquet', 'part-1-3600500-3601000.parquet']
+
+        Catalog.scan(tmp_path).write()
+        st = SimTime(1000, 3700000)
+        book = Book('TEST-USDT', st, tmp_path/'books'/'TEST-USDT', max_interval=3600000)
+        # the level added at 3600500 is not in the book before
+        st.set(3600000)
+        assert [(level.price, level.amount) for level in book.asks] == [(1001.0, 1.0), (1002.0, 2.0)]
+        # the late messages are replayed after the messages before them
+        st.set(3600500)
+        assert [(level.price, level.amount) for level in book.asks] == [(1001.0, 1.0), (1002.0, 2.0), (1003.0, 4.0)]
+        st.set(3700000)
+        assert [(level.price, level.amount) for level in book.asks] == [(1001.0, 1.0), (1002.0, 2.0), (1003.0, 4.0), (1004.0, 6.0)]
+
+
+    def test_max_rows(self, tmp_path: Path):
+        messages = make_messages('TEST-USDT', 0, 200)
+        for k, message in enumerate(messages[1:], 1): # the messages come in pairs of the same timestamp
+            message['ts'] = str((k + 1) // 2 * 100)
+        with gzip.open(tmp_path/'day0.data.gz', 'wt') as f:
+            f.write('\n'.join(json.dumps(message) for message in messages))
+
+        files = ingest([tmp_path/'day0.data.gz'], tmp_path/'data', max_rows=45, max_workers=1)
+        assert len(files) > 2
+        index = ChunkIndex(tmp_path/'data'/'books'/'TEST-USDT')
+        assert all(start > end for start, end in zip(index.starts[1:], index.ends[:-1]))
+
+        st = SimTime(0, 10000)
+        book = Book('TEST-USDT', st, tmp_path/'data'/'books'/'TEST-USDT', max_interval=10000)
+        for ts in range(0, 10001, 100):
+            if ts > 0:
+                st.set(ts)
+            expected = replay(messages, ts)
+            assert book.asks == expected.asks
+            assert book.bids == expected.bids
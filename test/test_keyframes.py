@@ -0,0 +1,113 @@
+from pathlib import Path
+import shutil
+import sys
+sys.path.insert(0, sys.path[0]+"/../")
+
+import pandas as pd
+import pytest
+
+from src.books import Book
+from src.chunkcache import write_chunk
+from src.keyframes import Keyframes, build_keyframes, keyframes_path
+from src.simTime import SimTime
+
+
+@pytest.fixture
+def chunk_dir(tmp_path: Path, test_usdt_books: Path) -> Path:
+    source = next(test_usdt_books.glob('part-*-*-*.parquet'))
+    shutil.copy(source, tmp_path)
+    return tmp_path
+
+
+class TestKeyframes:
+    def test_build(self, chunk_dir: Path):
+        chunk = next(chunk_dir.glob('part-*-*-*.parquet'))
+        path = build_keyframes(chunk, every_ms=50000)
+        assert path == keyframes_path(chunk)
+
+        keyframes = Keyframes.load(chunk)
+        assert keyframes is not None
+        assert keyframes.timestamps[:3] == [50000, 100000, 150000]
+        assert keyframes.find(49999) == -1
+        assert keyframes.find(120000) == 1
+
+        build_keyframes(chunk, every_ms=50000)
+        write_chunk(pd.read_parquet(chunk).iloc[:100], chunk)
+        assert Keyframes.load(chunk) is None # do not match the chunk
+
+        with pytest.raises(ValueError):
+            build_keyframes(chunk)
+
+
+    def test_seek(self, chunk_dir: Path):
+        build_keyframes(next(chunk_dir.glob('part-*-*-*.parquet')), every_rows=700)
+
+        for start in [0, 1000, 50500, 333333, 600000]:
+            reference_time = SimTime(0, 628000)
+            reference = Book('TEST-USDT', reference_time, chunk_dir)
+            simTime = SimTime(start, 628000)
+            book = Book('TEST-USDT', simTime, chunk_dir)
+            if start > 0:
+                reference_time.set(start)
+                assert book.chunked_index > book.chunked_data.snapshot_end
+            
+            for ts in range(start, min(start + 20000, 628000), 900):
+                if ts > start:
+                    simTime.set(ts)
+                    reference_time.set(ts)
+                assert book.asks == reference.asks
+                assert book.bids == reference.bids
+
+
+    def test_seek_forward(self, chunk_dir: Path):
+        build_keyframes(next(chunk_dir.glob('part-*-*-*.parquet')), every_rows=700)
+
+        simTime = SimTime(0, 628000)
+        book = Book('TEST-USDT', simTime, chunk_dir)
+        applied = []
+        apply = book._apply
+        def counted_apply(start: int, end: int) -> None:
+            applied.append(end - start)
+            apply(start, end)
+        book._apply = counted_apply # type: ignore
+        
+        # a long seek on a non-empty book jumps to the latest keyframe
+        start = book.chunked_index
+        simTime.set(600000)
+        reference = Book('TEST-USDT', SimTime(600000, 628000), chunk_dir)
+        assert book.asks == reference.asks
+        assert book.bids == reference.bids
+        assert sum(applied) < 700
+        # the skipped rows are still in the window of the step
+        assert book._window == (start, book.chunked_data.searchsorted(600000))
+        
+        # the short steps replay the rows
+        for ts in range(601000, 628000, 900):
+            simTime.set(ts)
+            reference.simTime.set(ts)
+            assert book.asks == reference.asks
+            assert book.bids == reference.bids
+
+
+    def test_seek_gap(self, chunk_dir: Path):
+        chunk = next(chunk_dir.glob('part-*-*-*.parquet'))
+        df = pd.read_parquet(chunk)
+        df.loc[df['timestamp'] > 300000, 'timestamp'] += 10000 # a gap after 300000
+        write_chunk(df, chunk)
+        build_keyframes(chunk, every_rows=700)
+
+        # a long seek does not skip a gap
+        simTime = SimTime(0, 638000)
+        book = Book('TEST-USDT', simTime, chunk_dir)
+        simTime.set(600000)
+        with pytest.raises(Exception, match='exceeds the maximum interval'):
+            book.update()
+
+        simTime = SimTime(0, 638000)
+        book = Book('TEST-USDT', simTime, chunk_dir, gap_policy='stale')
+        simTime.set(600000)
+        book.update()
+        assert book.stale
+        reference = Book('TEST-USDT', SimTime(600000, 638000), chunk_dir)
+        assert book.asks == reference.asks
+        assert book.bids == reference.bids
@@ -0,0 +1,202 @@
+from pathlib import Path
+import sys
+from typing import List
+sys.path.insert(0, sys.path[0]+"/../")
+
+import pytest
+
+from src.backtest import Backtest
+from src.environment import Environment
+from src.event import CancelOrder, CreateEvent, Event
+from src.history import HistLevel
+from src.instrument import Instrument, InstType, Pair
+from src.latency import ConstantLatency, EmpiricalLatency, InFlight, NetworkLatency, RandomLatency
+from src.order import Order, orderSide, orderStatus, orderType
+from src.strategy import CustomStrategy
+from src.world import World
+
+
+class TestLatencyModels:
+    def test_constant(self):
+        assert ConstantLatency(25).sample() == 25
+        with pytest.raises(ValueError):
+            ConstantLatency(-1)
+
+    def test_empirical(self):
+        samples = [10, 12, 30]
+        model = EmpiricalLatency(samples, seed=1)
+        drawn = [model.sample() for _ in range(100)]
+        assert set(drawn) == set(samples)
+        model = EmpiricalLatency(samples, seed=1)
+        assert [model.sample() for _ in range(100)] == drawn   # the same seed gives the same delays
+        with pytest.raises(ValueError):
+            EmpiricalLatency([])
+
+    def test_random(self):
+        drawn = [RandomLatency(20, 5, seed=7).sample() for _ in range(3)]
+        assert len(set(drawn)) == 1   # the same seed gives the same delays
+        model = RandomLatency(20, 5, seed=7)
+        drawn = [model.sample() for _ in range(1000)]
+        assert min(drawn) >= 20
+        assert 23 < sum(drawn) / len(drawn) < 27
+        assert RandomLatency(20, 0).sample() == 20
+
+    def test_network(self):
+        latency = NetworkLatency(ConstantLatency(10), market_data=ConstantLatency(3))
+        assert latency.order_delay() == 13
+        assert latency.cancel_delay() == 13
+        assert NetworkLatency(ConstantLatency(10), ConstantLatency(4)).cancel_delay() == 4
+
+
+class TestInFlight:
+    def test_order(self):
+        in_flight: InFlight[str] = InFlight()
+        for message, arrival in (('c', 30), ('a', 10), ('b', 20), ('a2', 10)):
+            in_flight.push(message, arrival)
+        assert len(in_flight) == 4
+        assert in_flight.next_arrival() == 10
+        assert in_flight.pop_arrived(5) == []
+        assert in_flight.pop_arrived(20) == ['a', 'a2', 'b']
+        assert in_flight.next_arrival() == 30
+        assert in_flight.pop_arrived(100) == ['c']
+        assert in_flight.next_arrival() is None
+
+
+# the orders are executed when they arrive, between the steps
+def test_world_latency(data_root: Path):
+    inst = Instrument(Pair('TRIANGLE', 'USDT'), 'TRIANGLE-USDT', InstType.SPOT, 0, 999000, 0.1, 0.1)
+    orders: List[Order] = []
+
+    def eval_func(env: Environment) -> List[Event]:
+        if env.simTime == 0:
+            orders.append(Order(inst, orderType.MARKET, orderSide.BUYLONG, env.simTime, 1))
+            orders.append(Order(inst, orderType.LIMIT, orderSide.SELLSHORT, env.simTime, 0.5, price=2000))
+            return [CreateEvent(0, 'OKX', order) for order in orders]
+        if env.simTime == 2000:
+            return [CancelOrder(2000, str(orders[1].uuid))]
+        return []
+
+    latency = NetworkLatency(ConstantLatency(1200), cancel=ConstantLatency(200), market_data=ConstantLatency(300))
+    world = World(str(data_root), 10_000, latency={'OKX': latency})
+    backtest = Backtest(
+        CustomStrategy('custom', ['TRIANGLE-USDT'], eval_func),
+        0, 5000,
+        HistLevel.DEBUG,
+        ['OKX'],
+        initial_balance={'OKX': {'USDT': 200000}},
+    )
+    world.run(backtest)
+
+    market, limit = orders
+    assert market.status == orderStatus.CLOSED
+    assert market.detail[0].ts == 1500
+    assert limit.status == orderStatus.CANCELED
+    exchange = world.env['exchanges']['OKX'] # type: ignore
+    assert exchange.archive.get(str(limit.uuid))['simTime'] == 2500
+    assert len(world.in_flight) == 0
+
+
+# a cancellation sent before its order arrives still takes the cancel latency
+def test_world_cancel_in_flight(data_root: Path):
+    inst = Instrument(Pair('TRIANGLE', 'USDT'), 'TRIANGLE-USDT', InstType.SPOT, 0, 999000, 0.1, 0.1)
+    orders: List[Order] = []
+
+    def eval_func(env: Environment) -> List[Event]:
+        if env.simTime == 0:
+            orders.append(Order(inst, orderType.LIMIT, orderSide.SELLSHORT, env.simTime, 0.5, price=2000))
+            return [CreateEvent(0, 'OKX', orders[0])]
+        if env.simTime == 1000:   # the order arrives at 1500
+            return [CancelOrder(1000, str(orders[0].uuid))]
+        return []
+
+    latency = NetworkLatency(ConstantLatency(1500), cancel=ConstantLatency(700))
+    world = World(str(data_root), 10_000, latency={'OKX': latency})
+    backtest = Backtest(
+        CustomStrategy('custom', ['TRIANGLE-USDT'], eval_func),
+        0, 5000,
+        HistLevel.DEBUG,
+        ['OKX'],
+        initial_balance={'OKX': {'USDT': 200000}},
+    )
+    world.run(backtest)
+
+    assert orders[0].status == orderStatus.CANCELED
+    exchange = world.env['exchanges']['OKX'] # type: ignore
+    assert exchange.archive.get(str(orders[0].uuid))['simTime'] == 1700
+    assert world.events == []
+
+
+# the orders closed at an arrival between two steps are in the next snapshot, even if the exchange is evaluated again
+def test_world_retired_orders(data_root: Path):
+    inst = Instrument(Pair('TRIANGLE', 'USDT'), 'TRIANGLE-USDT', InstType.SPOT, 0, 999000, 0.1, 0.1)
+    orders: List[Order] = []
+
+    def eval_func(env: Environment) -> List[Event]:
+        if env.simTime == 0:
+            orders.append(Order(inst, orderType.MARKET, orderSide.BUYLONG, env.simTime, 1))
+            orders.append(Order(inst, orderType.LIMIT, orderSide.SELLSHORT, env.simTime, 0.5, price=2000))
+            return [CreateEvent(0, 'OKX', order) for order in orders]
+        if env.simTime == 1000:   # the orders arrive at 1200, the cancellation at 1500
+            return [CancelOrder(1000, str(orders[1].uuid))]
+        return []
+
+    latency = NetworkLatency(ConstantLatency(1200), cancel=ConstantLatency(500))
+    world = World(str(data_root), 10_000, latency={'OKX': latency})
+    backtest = Backtest(
+        CustomStrategy('custom', ['TRIANGLE-USDT'], eval_func),
+        0, 3000,
+        HistLevel.DEBUG,
+        ['OKX'],
+        initial_balance={'OKX': {'USDT': 200000}},
+    )
+    history = world.run(backtest)
+
+    snapshot = [h for h in history if h['simTime'] == 2000][0]
+    statuses = {o['uuid']: o['status'] for o in snapshot['exchanges']['OKX']['orders']}
+    assert statuses == {str(orders[0].uuid): 'CLOSED', str(orders[1].uuid): 'CANCELED'}
+    # the orders are reported once
+    assert all(h['exchanges']['OKX']['orders'] == [] for h in history if h['simTime'] > 2000)
+    assert world.env['exchanges']['OKX'].as_dict()['orders'] == [] # type: ignore
+
+
+class CountedCancel(CancelOrder):
+    def __init__(self, ts: int, uuid: str) -> None:
+        super().__init__(ts, uuid)
+        self.executed = 0
+
+    def execute(self, env: Environment) -> bool:
+        self.executed += 1
+        return super().execute(env)
+
+
+# a cancellation arrived before its order is retried until the order arrives, and a cancellation of an unknown order is dropped
+def test_world_cancel_retry(data_root: Path):
+    inst = Instrument(Pair('TRIANGLE', 'USDT'), 'TRIANGLE-USDT', InstType.SPOT, 0, 999000, 0.1, 0.1)
+    orders: List[Order] = []
+    cancels: List[CountedCancel] = []
+
+    def eval_func(env: Environment) -> List[Event]:
+        if env.simTime == 0:
+            orders.append(Order(inst, orderType.LIMIT, orderSide.SELLSHORT, env.simTime, 0.5, price=2000))
+            cancels.append(CountedCancel(0, str(orders[0].uuid)))  # arrives at 700, before the order at 1500
+            cancels.append(CountedCancel(0, 'unknown'))
+            return [CreateEvent(0, 'OKX', orders[0])] + cancels # type: ignore
+        return []
+
+    latency = NetworkLatency(ConstantLatency(1500), cancel=ConstantLatency(700))
+    world = World(str(data_root), 10_000, latency={'OKX': latency})
+    backtest = Backtest(
+        CustomStrategy('custom', ['TRIANGLE-USDT'], eval_func),
+        0, 5000,
+        HistLevel.DEBUG,
+        ['OKX'],
+        initial_balance={'OKX': {'USDT': 200000}},
+    )
+    world.run(backtest)
+
+    assert orders[0].status == orderStatus.CANCELED
+    exchange = world.env['exchanges']['OKX'] # type: ignore
+    assert exchange.archive.get(str(orders[0].uuid))['simTime'] == 1500
+    assert cancels[0].executed == 3  # at 700, at the step 1000 and at 1500
+    assert cancels[1].executed == 1
+    assert world.events == []
@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 import sys
 sys.path.insert(0, sys.path[0]+"/../")
@@ -59,9 +60,17 @@ class TestMabidask:
         assert _mabidask.now == 1034.25
 
 
-
-
-
-
-
-
+    def test_shared_book(self):
+        simTime = SimTime(0, 628000)
+        cur_dir = Path(os.getenv('PYTEST_CURRENT_TEST').split(':')[0]).parent # type: ignore
+        path = cur_dir/Path('./test_exchanges/books/TEST-USDT')
+        book = Book('TEST-USDT', simTime, path)
+        shared = mabidask('TEST-USDT', simTime, path, book=book)
+        standalone = mabidask('TEST-USDT', simTime, path)
+        assert shared.book is book
+        
+        for ts in range(0, 628000, 700):
+            if ts > 0:
+                simTime.set(ts)
+            assert shared.now == standalone.now
+            assert shared.now == (book.asks[0].price + book.bids[0].price) / 2
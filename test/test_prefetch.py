@@ -0,0 +1,73 @@
+from pathlib import Path
+import sys
+import threading
+sys.path.insert(0, sys.path[0]+"/../")
+
+import pandas as pd
+import pytest
+
+from src.books import Book
+from src.prefetch import ChunkPrefetcher, PrefetchConfig
+from src.simTime import SimTime
+
+
+class Chunk:
+    def __init__(self, i: int) -> None:
+        self.i = i
+        self.nbytes = 100
+        self.thread = threading.current_thread().name
+
+
+def setup_chunks(path: Path, num_chunks: int = 4, chunk_span: int = 1000) -> None:
+    for k in range(num_chunks):
+        start = k * chunk_span
+        rows = []
+        for i in range(5):
+            rows.append((100.0 + k + i, 1.0 + i, 1, 'ask', 'snapshot', start))
+            rows.append((99.0 + k - i, 1.0 + i, 1, 'bid', 'snapshot', start))
+        for ts in range(start + 100, start + chunk_span, 100):
+            rows.append((100.0 + k + ts % 7, float(ts % 5), 2, 'ask', 'update', ts))
+            rows.append((99.0 + k - ts % 7, float(ts % 3), 2, 'bid', 'update', ts))
+        df = pd.DataFrame(rows, columns=['price', 'size', 'numOrders', 'side', 'action', 'timestamp'])
+        df.to_parquet(path/f'part-{k}-{start}-{start + chunk_span - 100}.parquet', index=False)
+
+
+class TestChunkPrefetcher:
+    def test_get(self):
+        loaded = []
+        def loader(i: int) -> Chunk:
+            loaded.append(i)
+            return Chunk(i)
+        prefetcher = ChunkPrefetcher(loader, 5, PrefetchConfig(lookahead=2))
+
+        assert prefetcher.get(0).i == 0
+        assert prefetcher.pending == 2
+        chunk = prefetcher.get(1)
+        assert chunk.i == 1
+        assert chunk.thread.startswith('prefetch')
+        assert prefetcher.get(4).i == 4
+        assert prefetcher.pending == 0
+        assert loaded.count(1) == 1
+
+
+    def test_max_bytes(self):
+        prefetcher = ChunkPrefetcher(Chunk, 10, PrefetchConfig(lookahead=4, max_bytes=250))
+        prefetcher.get(0)
+        assert prefetcher.pending == 1
+
+        with pytest.raises(ValueError):
+            PrefetchConfig(lookahead=0)
+
+
+class TestBookPrefetch:
+    def test_same_state(self, tmp_path: Path):
+        setup_chunks(tmp_path)
+        st = SimTime(0, 3900)
+        book = Book('TEST-USDT', st, tmp_path)
+        prefetched = Book('TEST-USDT', st, tmp_path, prefetch=PrefetchConfig(lookahead=2))
+
+        for ts in range(0, 3901, 300):
+            if ts > 0:
+                st.set(ts)
+            assert book.asks == prefetched.asks
+            assert book.bids == prefetched.bids
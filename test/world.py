@@ -10,6 +10,7 @@ import pandas as pd
 
 
 sys.path.insert(0, sys.path[0]+"/../")
+from src.chunkcache import write_chunk
 from src.instrument import Instrument, Pair
 from src.history import HistLevel
 from src.order import Order, orderSide, orderType
@@ -30,53 +31,40 @@ def metabacktest(file: Path) -> tuple:
     
     temp_dir = tempfile.mkdtemp()
     
-    df = pd.DataFrame(columns=['instId', 'price', 'size', 'numOrders', 'side', 'timestamp', 'action'])
+    rows: List[dict] = []
     instId = list(data['books'].keys())[0]
     start_ts, end_ts = data['bt_period']
     
     slices = list(data['books'].values())[0]['slices']
-    len_slices = len(slices)
 
-    for i in range(len_slices):
-        ts, asks_bids = list(slices.items())[i]
+    for i, (ts, asks_bids) in enumerate(slices.items()):
         timestamp = int(ts)
         if i == 0:
             action = 'snapshot'
         else:
             action = 'update'
         
-        for ask in asks_bids['asks']:
-            params = ask.split(':')
-            price = float(params[0])
-            size = float(params[1])
-            df.loc[len(df)] = pd.Series({ # type: ignore
-                'instId': instId, 
-                'price': price, 
-                'size': size, 
-                'numOrders': 1, 
-                'side': 'ask', 
-                'timestamp': timestamp, 
-                'action': action,
-            })
-        for bid in asks_bids['bids']:
-            params = bid.split(':')
-            price = float(params[0])
-            size = float(params[1])
-            df.loc[len(df)] = pd.Series({ # type: ignore
-                'instId': instId, 
-                'price': price, 
-                'size': size, 
-                'numOrders': 1, 
-                'side': 'bid', 
-                'timestamp': timestamp, 
-                'action': action,
-            })
+        for side, levels in (('ask', asks_bids['asks']), ('bid', asks_bids['bids'])):
+            for level in levels:
+                params = level.split(':')
+                price = float(params[0])
+                size = float(params[1])
+                rows.append({
+                    'instId': instId, 
+                    'price': price, 
+                    'size': size, 
+                    'numOrders': 1, 
+                    'side': side, 
+                    'timestamp': timestamp, 
+                    'action': action,
+                })
+    df = pd.DataFrame(rows, columns=['instId', 'price', 'size', 'numOrders', 'side', 'timestamp', 'action'])
     
     path = os.path.join(temp_dir, 'books', instId)
     if not os.path.exists(path):
         os.makedirs(path)
     
-    df.to_parquet(os.path.join(path, f'part-0-{start_ts}-{end_ts}.parquet'))
+    write_chunk(df, os.path.join(path, f'part-0-{start_ts}-{end_ts}.parquet'))
 
     # strategy
     def eval_func(env: Environment) -> List[Event]: